@@ -0,0 +1,148 @@
+"""
+async_f29.py — API asyncio de generar_f29_excel, con el trabajo fuera del event loop.
+
+El cálculo y el render corren en un executor (hilos por defecto, o un
+ProcessPoolExecutor para usar varios núcleos) y el loop solo espera. Un
+semáforo limita los F29 en curso; cancelar la tarea detiene la generación
+al terminar la etapa en curso (ETAPAS de generar_f29), y `progreso` recibe
+en el loop el evento de cada etapa a medida que termina.
+
+Uso:
+    from scripts.async_f29 import GeneradorF29Async, generar_f29_excel_async
+
+    codigos = await generar_f29_excel_async(datos, "F29.xlsx", progreso=print)
+
+    gen = GeneradorF29Async(concurrencia=4)          # uno por servicio
+    codigos = await gen.generar(datos, buf, motor="xml")
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+from scripts.calculo_f29 import generar_f29_bytes, generar_f29_excel
+
+
+class _Cancelado(Exception):
+    """Lanzada dentro del executor, entre etapas, cuando la tarea se canceló."""
+
+
+def _generar_en_hilo(datos, output_path, opciones, cancelar, avisar):
+    metricas = opciones.pop("metricas", None)
+
+    def por_etapa(evento):
+        if metricas:
+            metricas(evento)
+        avisar(evento)
+        if cancelar.is_set():
+            raise _Cancelado()
+
+    try:
+        return generar_f29_excel(datos, output_path, metricas=por_etapa, **opciones)
+    except _Cancelado:
+        if isinstance(output_path, (str, os.PathLike)) and os.path.exists(output_path):
+            os.remove(output_path)  # xlsx a medio escribir (motor="xml" abre el zip al inicio)
+        raise
+
+
+def _generar_en_proceso(datos, output_path, opciones):
+    """En un proceso del pool: sin callbacks (no se serializan); los eventos vuelven con el resultado."""
+    eventos = []
+    if isinstance(output_path, (str, os.PathLike)):
+        return generar_f29_excel(datos, output_path, metricas=eventos.append, **opciones), eventos, None
+    codigos, contenido = generar_f29_bytes(datos, metricas=eventos.append, **opciones)
+    return codigos, eventos, contenido
+
+
+class GeneradorF29Async:
+    """
+    Generador asíncrono con a lo más `concurrencia` F29 en curso (por defecto
+    los núcleos). executor: None = executor por defecto del loop (hilos).
+    Con un ProcessPoolExecutor el render corre en paralelo de verdad, pero la
+    cancelación solo alcanza a los F29 que no empezaron y los eventos de
+    progreso llegan juntos al final.
+    """
+
+    def __init__(self, executor=None, concurrencia=None):
+        self.executor = executor
+        self.concurrencia = concurrencia or os.cpu_count() or 1
+        self._cupos = None
+        self.en_curso = 0
+
+    def _semaforo(self):
+        # Se crea en el loop que lo usa (en 3.8/3.9 el semáforo queda atado al loop)
+        if self._cupos is None:
+            self._cupos = asyncio.Semaphore(self.concurrencia)
+        return self._cupos
+
+    async def generar(self, datos, output_path, progreso=None, **opciones):
+        """
+        Como generar_f29_excel (mismas opciones), sin bloquear el loop. output_path
+        puede ser una ruta o un archivo binario abierto. progreso: callable(evento),
+        o corrutina, llamado en el loop al terminar cada etapa.
+        """
+        loop = asyncio.get_running_loop()
+
+        def avisar(evento):
+            if progreso is not None:
+                loop.call_soon_threadsafe(_llamar, progreso, evento)
+
+        async with self._semaforo():
+            self.en_curso += 1
+            try:
+                if isinstance(self.executor, ProcessPoolExecutor):
+                    return await self._en_proceso(loop, datos, output_path, dict(opciones), progreso)
+                cancelar = threading.Event()
+                trabajo = functools.partial(_generar_en_hilo, datos, output_path, dict(opciones),
+                                            cancelar, avisar)
+                futuro = loop.run_in_executor(self.executor, trabajo)
+                try:
+                    return await asyncio.shield(futuro)
+                except asyncio.CancelledError:
+                    cancelar.set()
+                    # El cupo se libera cuando el hilo realmente se detiene
+                    await asyncio.wait([futuro])
+                    if not futuro.cancelled():
+                        futuro.exception()  # _Cancelado esperado: no dejarla sin recuperar
+                    raise
+            finally:
+                self.en_curso -= 1
+
+    async def _en_proceso(self, loop, datos, output_path, opciones, progreso):
+        metricas = opciones.pop("metricas", None)
+        futuro = loop.run_in_executor(self.executor, _generar_en_proceso, datos, output_path, opciones)
+        codigos, eventos, contenido = await futuro
+        for evento in eventos:
+            if metricas:
+                metricas(evento)
+            if progreso is not None:
+                _llamar(progreso, evento)
+        if contenido is not None:
+            output_path.write(contenido)
+        return codigos
+
+
+def _llamar(progreso, evento):
+    resultado = progreso(evento)
+    if asyncio.iscoroutine(resultado):
+        asyncio.ensure_future(resultado)
+
+
+# Un generador por defecto por event loop (el semáforo no se comparte entre loops)
+_POR_LOOP = weakref.WeakKeyDictionary()
+
+
+async def generar_f29_excel_async(datos, output_path, progreso=None, **opciones):
+    """
+    generar_f29_excel sin bloquear el loop, con el generador por defecto del
+    loop (hilos, concurrencia = núcleos). Para otro executor o límite, crear
+    un GeneradorF29Async propio.
+    """
+    loop = asyncio.get_running_loop()
+    generador = _POR_LOOP.get(loop)
+    if generador is None:
+        generador = _POR_LOOP[loop] = GeneradorF29Async()
+    return await generador.generar(datos, output_path, progreso=progreso, **opciones)
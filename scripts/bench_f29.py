@@ -0,0 +1,283 @@
+"""
+bench_f29.py — Benchmark de calcular_f29 y de los escritores de cada hoja.
+
+Genera `datos` sintéticos con 0 a 1M de documentos y mide por separado
+calcular_f29, _write_f29, _write_detalle, _write_alertas y wb.save: tiempo,
+RSS pico y tamaño del xlsx. Cada tamaño corre en un subproceso propio para
+que el RSS pico de uno no contamine al siguiente. Los resultados se guardan en
+JSON para comparar versiones antes y después de tocar las rutas calientes.
+
+Uso:
+    python -m scripts.bench_f29 -o bench_base.json
+    python -m scripts.bench_f29 --tamanos 0 1000 100000 -o bench_nuevo.json --comparar bench_base.json
+    python -m scripts.bench_f29 --modo streaming --tamanos 1000000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sin RSS pico
+    resource = None
+
+TAMANOS = [0, 1_000, 10_000, 100_000, 1_000_000]
+MODOS = ("normal", "compilado", "streaming", "xml")
+
+# Reparto de documentos entre líneas: (línea, proporción, rango del neto)
+REPARTO = [
+    ("linea_10", 0.55, (1_000, 60_000)),       # boletas
+    ("linea_7", 0.20, (50_000, 5_000_000)),    # facturas emitidas
+    ("linea_13", 0.02, (10_000, 500_000)),     # NC emitidas
+    ("linea_28", 0.18, (20_000, 3_000_000)),   # facturas recibidas
+    ("linea_32", 0.01, (5_000, 200_000)),      # NC recibidas
+    ("linea_61", 0.04, (100_000, 2_000_000)),  # honorarios
+]
+TASA_HONORARIOS = 0.1525
+
+
+def datos_sinteticos(n_docs, semilla=0):
+    """`datos` en modo cálculo con n_docs documentos repartidos según REPARTO."""
+    rnd = random.Random(semilla)
+    documentos = {}
+    asignados = 0
+    for i, (lk, proporcion, (lo, hi)) in enumerate(REPARTO):
+        n = n_docs - asignados if i == len(REPARTO) - 1 else int(n_docs * proporcion)
+        asignados += n
+        docs = []
+        for folio in range(1, n + 1):
+            neto = rnd.randint(lo, hi)
+            fecha = f"2026-01-{rnd.randint(1, 31):02d}"
+            rut = f"{rnd.randint(1_000_000, 99_999_999)}-{rnd.choice('0123456789K')}"
+            if lk == "linea_61":
+                ret = round(neto * TASA_HONORARIOS)
+                docs.append({"numero": folio, "fecha": fecha, "rut": rut, "razon_social": f"Prestador {folio}",
+                             "descripcion": "Servicios profesionales", "bruto": neto,
+                             "retencion": ret, "liquido": neto - ret})
+            else:
+                iva = round(neto * 0.19)
+                docs.append({"numero": folio, "fecha": fecha, "rut": rut, "razon_social": f"Empresa {folio} SpA",
+                             "descripcion": "", "neto": neto, "iva": iva, "total": neto + iva})
+        if docs:
+            documentos[lk] = docs
+    return {
+        "encabezado": {"rut": "76.543.210-K", "razon_social": "BENCHMARK SPA",
+                       "periodo_mes": 1, "periodo_anio": 2026},
+        "documentos": documentos,
+        "ppm": {"tasa": 0.25},
+    }
+
+
+def _rss_pico_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB, macOS bytes
+    return round(pico / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _etapas(modo, datos, ruta):
+    """Etapas a medir, en orden: [(nombre, función sin argumentos)]."""
+    import openpyxl
+    from scripts import generar_f29 as g
+
+    estado = {}
+
+    def calcular():
+        estado["codigos"] = g.calcular_f29(datos)
+
+    def compilar_layout():
+        g._layout_compilado()  # una vez por proceso; se mide aparte del render
+
+    enc = datos.get("encabezado", {})
+    if modo == "xml":
+        from scripts.xlsx_directo import escribir_xlsx
+        return [("calcular_f29", calcular), ("compilar_layout", compilar_layout),
+                ("escribir_xlsx", lambda: escribir_xlsx(datos, estado["codigos"], ruta))]
+
+    if modo == "streaming":
+        def f29_y_alertas():
+            borrador = estado["borrador"] = openpyxl.Workbook()
+            g._write_f29_compilado(borrador, estado["codigos"], enc)
+            g._write_alertas(borrador, estado["codigos"], datos)
+
+        def detalle():
+            wb = estado["wb"] = openpyxl.Workbook(write_only=True)
+            for t in g._TABLAS_ESTILO:
+                setattr(wb, t, getattr(estado["borrador"], t))
+            g._volcar_hoja(estado["borrador"].worksheets[0], wb)
+            g._write_detalle_streaming(wb, datos, estado["codigos"])
+            g._volcar_hoja(estado["borrador"].worksheets[1], wb)
+
+        def guardar():
+            estado["wb"].save(ruta)
+
+        return [("calcular_f29", calcular), ("compilar_layout", compilar_layout),
+                ("_write_f29+_write_alertas", f29_y_alertas),
+                ("_write_detalle_streaming", detalle), ("save", guardar)]
+
+    write_f29 = g._write_f29_compilado if modo == "compilado" else g._write_f29
+
+    def f29():
+        estado["wb"] = openpyxl.Workbook()
+        write_f29(estado["wb"], estado["codigos"], enc)
+
+    etapas = [("calcular_f29", calcular)]
+    if modo == "compilado":
+        etapas.append(("compilar_layout", compilar_layout))
+    return etapas + [
+        (write_f29.__name__, f29),
+        ("_write_detalle", lambda: g._write_detalle(estado["wb"], datos, estado["codigos"])),
+        ("_write_alertas", lambda: g._write_alertas(estado["wb"], estado["codigos"], datos)),
+        ("save", lambda: estado["wb"].save(ruta)),
+    ]
+
+
+def medir(n_docs, modo="normal", semilla=0):
+    """Mide una corrida en este proceso. Ver correr_benchmark para aislar el RSS."""
+    inicio = time.perf_counter()
+    datos = datos_sinteticos(n_docs, semilla)
+    resultado = {"n_docs": n_docs, "modo": modo,
+                 "datos_segundos": round(time.perf_counter() - inicio, 4),
+                 "datos_rss_pico_mb": _rss_pico_mb(), "etapas": {}}
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        total = 0.0
+        for nombre, etapa in _etapas(modo, datos, ruta):
+            t0 = time.perf_counter()
+            etapa()
+            seg = time.perf_counter() - t0
+            total += seg
+            resultado["etapas"][nombre] = {"segundos": round(seg, 4), "rss_pico_mb": _rss_pico_mb()}
+        resultado["total_segundos"] = round(total, 4)
+        resultado["rss_pico_mb"] = _rss_pico_mb()
+        resultado["bytes_archivo"] = os.path.getsize(ruta)
+    finally:
+        os.remove(ruta)
+    return resultado
+
+
+def _medir_en_subproceso(n_docs, modo, semilla):
+    cmd = [sys.executable, "-m", "scripts.bench_f29", "--interno", str(n_docs),
+           "--modo", modo, "--semilla", str(semilla)]
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    salida = subprocess.run(cmd, cwd=raiz, capture_output=True, text=True)
+    if salida.returncode != 0:
+        return {"n_docs": n_docs, "modo": modo, "error": salida.stderr.strip().splitlines()[-1:]}
+    return json.loads(salida.stdout)
+
+
+def _version():
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=raiz,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def correr_benchmark(tamanos=TAMANOS, modo="normal", repeticiones=1, semilla=0, progreso=None):
+    """
+    Corre cada tamaño `repeticiones` veces (subproceso nuevo por corrida) y se
+    queda con la más rápida. Devuelve el dict que se guarda como JSON.
+    """
+    import openpyxl
+    resultados = []
+    for n in tamanos:
+        corridas = [_medir_en_subproceso(n, modo, semilla) for _ in range(repeticiones)]
+        ok = [c for c in corridas if "error" not in c]
+        mejor = min(ok, key=lambda c: c["total_segundos"]) if ok else corridas[0]
+        resultados.append(mejor)
+        if progreso:
+            progreso(mejor)
+    return {
+        "version": _version(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "openpyxl": openpyxl.__version__,
+        "plataforma": platform.platform(),
+        "modo": modo,
+        "repeticiones": repeticiones,
+        "resultados": resultados,
+    }
+
+
+def comparar(base, nuevo, umbral=0.10, minimo=0.005):
+    """
+    Compara dos JSON de benchmark por (n_docs, etapa). Devuelve una lista de
+    (n_docs, etapa, segundos_base, segundos_nuevo, razon, es_regresion).
+    Se cuenta como regresión si el valor empeora más de `umbral` (10%) y,
+    para tiempos, más de `minimo` segundos (las etapas de microsegundos son ruido).
+    """
+    filas = []
+    por_tamano = {r["n_docs"]: r for r in base["resultados"] if "error" not in r}
+    for r in nuevo["resultados"]:
+        b = por_tamano.get(r["n_docs"])
+        if b is None or "error" in r:
+            continue
+        etapas = [(k, b["etapas"][k]["segundos"], v["segundos"])
+                  for k, v in r["etapas"].items() if k in b["etapas"]]
+        etapas.append(("total", b["total_segundos"], r["total_segundos"]))
+        etapas.append(("rss_pico_mb", b.get("rss_pico_mb") or 0, r.get("rss_pico_mb") or 0))
+        etapas.append(("bytes_archivo", b["bytes_archivo"], r["bytes_archivo"]))
+        for etapa, antes, despues in etapas:
+            razon = despues / antes if antes else None
+            regresion = (razon is not None and razon > 1 + umbral and etapa != "bytes_archivo"
+                         and (etapa == "rss_pico_mb" or despues - antes > minimo))
+            filas.append((r["n_docs"], etapa, antes, despues, razon, regresion))
+    return filas
+
+
+def _imprimir(res):
+    if "error" in res:
+        print(f"{res['n_docs']:>9} docs  ERROR {res['error']}")
+        return
+    etapas = "  ".join(f"{k}={v['segundos']:.3f}s" for k, v in res["etapas"].items())
+    print(f"{res['n_docs']:>9} docs  {etapas}  total={res['total_segundos']:.3f}s  "
+          f"rss={res['rss_pico_mb']}MB  xlsx={res['bytes_archivo'] / 1024:.0f}KB")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark de calcular_f29 y los escritores de hojas.")
+    p.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS, help="Cantidades de documentos")
+    p.add_argument("--modo", choices=MODOS, default="normal")
+    p.add_argument("-r", "--repeticiones", type=int, default=1)
+    p.add_argument("--semilla", type=int, default=0)
+    p.add_argument("-o", "--salida", help="Archivo JSON donde guardar los resultados")
+    p.add_argument("--comparar", help="JSON de una corrida anterior contra la cual comparar")
+    p.add_argument("--umbral", type=float, default=0.10, help="Empeoramiento tolerado (0.10 = 10%%)")
+    p.add_argument("--interno", type=int, help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.interno is not None:
+        print(json.dumps(medir(args.interno, args.modo, args.semilla)))
+        return 0
+
+    informe = correr_benchmark(args.tamanos, args.modo, args.repeticiones, args.semilla, _imprimir)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+    if not args.comparar:
+        return 0
+
+    with open(args.comparar, encoding="utf-8") as f:
+        base = json.load(f)
+    regresiones = 0
+    for n, etapa, antes, despues, razon, regresion in comparar(base, informe, args.umbral):
+        regresiones += regresion
+        marca = "  REGRESIÓN" if regresion else ""
+        print(f"{n:>9} {etapa:<28} {antes:>12} → {despues:<12} "
+              f"{'x%.2f' % razon if razon is not None else '—'}{marca}")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
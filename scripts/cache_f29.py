@@ -0,0 +1,213 @@
+"""
+cache_f29.py — Caché en disco de los F29 generados, direccionada por contenido.
+
+La llave es un hash canónico de `datos` más la versión del generador (hash
+del código de calculo_f29, generar_f29 y xlsx_directo, y versión de
+openpyxl): mismos datos y mismo código → mismo xlsx. Cada entrada guarda los
+bytes del xlsx y los códigos; un acierto no importa openpyxl.
+
+Las escrituras son atómicas (archivo temporal + os.replace), así varios
+procesos (lote, servidor) pueden compartir el directorio. Al superar el
+tamaño máximo se borran las entradas usadas hace más tiempo (LRU por mtime).
+
+Uso:
+    from scripts.cache_f29 import CacheF29
+    cache = CacheF29("~/.cache/f29", max_mb=512)
+    codigos = cache.generar_f29_excel(datos, "F29.xlsx", motor="xml")
+    print(cache.aciertos, cache.fallos, cache.estado())
+"""
+
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+from importlib import metadata
+
+from scripts.calculo_f29 import ColumnasDocumentos, Documento, generar_f29_bytes
+
+_FUENTES = ("calculo_f29.py", "generar_f29.py", "xlsx_directo.py")
+
+
+@lru_cache(maxsize=None)
+def version_generador():
+    """Hash del código que determina el xlsx; cambia al editar cualquiera de _FUENTES."""
+    h = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for nombre in _FUENTES:
+        with open(os.path.join(base, nombre), "rb") as f:
+            h.update(f.read())
+    try:
+        h.update(metadata.version("openpyxl").encode())
+    except metadata.PackageNotFoundError:
+        pass
+    return h.hexdigest()[:16]
+
+
+def _canonico(obj):
+    """
+    Forma JSON estable de `datos`: las llaves llevan su tipo (504 ≠ "504") y
+    las tuplas se distinguen de las listas (las notas (tipo, msg) son tuplas).
+    Documento y ColumnasDocumentos se serializan por sus campos; los arrays y
+    escalares de NumPy, por su tolist(). Cualquier otro tipo lanza TypeError:
+    sin una forma canónica dos datos distintos podrían compartir llave.
+    """
+    if isinstance(obj, dict):
+        return {f"{type(k).__name__}:{k}": _canonico(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return {"__tupla__": [_canonico(v) for v in obj]}
+    if isinstance(obj, list):
+        return [_canonico(v) for v in obj]
+    if obj is None or isinstance(obj, (str, int, float)):
+        return obj
+    if isinstance(obj, Documento):
+        return {"__documento__": _canonico(obj.a_dict())}
+    if isinstance(obj, ColumnasDocumentos):
+        return {"__columnas__": _canonico(obj.columnas)}
+    if isinstance(obj, decimal.Decimal):
+        return {"__decimal__": str(obj)}
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return {f"__{type(obj).__name__}__": obj.isoformat()}
+    if hasattr(obj, "tolist"):
+        return _canonico(obj.tolist())
+    raise TypeError(f"No hay forma canónica para {type(obj).__name__} en la llave de la caché")
+
+
+def clave_datos(datos, version=None):
+    """
+    Hash hex de `datos` canónicos + versión del generador. Lanza TypeError si
+    `datos` trae un tipo sin forma canónica (ver _canonico).
+    """
+    texto = json.dumps(_canonico(datos), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    h = hashlib.sha256((version or version_generador()).encode())
+    h.update(texto.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _escribir_atomico(ruta, contenido):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class CacheF29:
+    """
+    Caché en `directorio` con tope de `max_mb` megabytes. Cada entrada son
+    dos archivos, <llave>.json (códigos) y <llave>.xlsx; el .xlsx se escribe
+    último y es el que marca la entrada como completa.
+    """
+
+    def __init__(self, directorio, max_mb=512, version=None):
+        self.directorio = os.path.expanduser(directorio)
+        self.max_bytes = int(max_mb * (1 << 20))
+        self.version = version
+        self.aciertos = self.fallos = 0
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _ruta(self, llave, ext):
+        return os.path.join(self.directorio, f"{llave}.{ext}")
+
+    def clave(self, datos, cachear_formulas=False):
+        version = self.version or version_generador()
+        # Con resultados de fórmulas el xlsx es otro: entrada aparte
+        return clave_datos(datos, version + "+valores" if cachear_formulas else version)
+
+    def obtener(self, llave):
+        """(codigos, bytes del xlsx) o None. Un acierto renueva la entrada para el LRU."""
+        try:
+            with open(self._ruta(llave, "xlsx"), "rb") as f:
+                contenido = f.read()
+            with open(self._ruta(llave, "json"), encoding="utf-8") as f:
+                codigos = {int(k): v for k, v in json.load(f).items()}
+            os.utime(self._ruta(llave, "xlsx"))
+        except (FileNotFoundError, ValueError):
+            # Ausente, o desalojada por otro proceso a mitad de la lectura
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        return codigos, contenido
+
+    def guardar(self, llave, codigos, contenido):
+        _escribir_atomico(self._ruta(llave, "json"),
+                          json.dumps({str(k): v for k, v in codigos.items()}).encode("utf-8"))
+        _escribir_atomico(self._ruta(llave, "xlsx"), contenido)
+        self.desalojar()
+
+    def _entradas(self):
+        """[(mtime, bytes, llave)] de las entradas completas."""
+        entradas = []
+        with os.scandir(self.directorio) as it:
+            for e in it:
+                if not e.name.endswith(".xlsx"):
+                    continue
+                try:
+                    st = e.stat()
+                    tam = st.st_size + os.path.getsize(e.path[:-5] + ".json")
+                except FileNotFoundError:
+                    continue
+                entradas.append((st.st_mtime, tam, e.name[:-5]))
+        return entradas
+
+    def desalojar(self):
+        """Borra las entradas menos usadas hasta quedar bajo el tope. Devuelve cuántas borró."""
+        entradas = self._entradas()
+        total = sum(tam for _, tam, _ in entradas)
+        borradas = 0
+        for _, tam, llave in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            for ext in ("xlsx", "json"):  # primero el .xlsx: deja de ser un acierto
+                try:
+                    os.remove(self._ruta(llave, ext))
+                except FileNotFoundError:
+                    pass
+            total -= tam
+            borradas += 1
+        return borradas
+
+    def estado(self):
+        entradas = self._entradas()
+        return {"entradas": len(entradas), "bytes": sum(tam for _, tam, _ in entradas),
+                "max_bytes": self.max_bytes, "aciertos": self.aciertos, "fallos": self.fallos}
+
+    def limpiar(self):
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith((".xlsx", ".json", ".tmp")):
+                try:
+                    os.remove(os.path.join(self.directorio, nombre))
+                except FileNotFoundError:
+                    pass
+
+    def generar_f29_excel(self, datos, output_path, **opciones):
+        """
+        Como generar_f29_excel, pasando por la caché. Las opciones de render no
+        forman parte de la llave (todas dan el mismo contenido), salvo
+        cachear_formulas; en un acierto no se llama el callback `metricas`. Si
+        `datos` no tiene llave (tipo sin forma canónica) se genera sin caché.
+        """
+        try:
+            llave = self.clave(datos, opciones.get("cachear_formulas", False))
+        except TypeError:
+            llave = None
+        encontrado = None if llave is None else self.obtener(llave)
+        if encontrado is None:
+            encontrado = generar_f29_bytes(datos, **opciones)
+            if llave is not None:
+                self.guardar(llave, *encontrado)
+        codigos, contenido = encontrado
+        if isinstance(output_path, (str, os.PathLike)):
+            with open(output_path, "wb") as f:
+                f.write(contenido)
+        else:
+            output_path.write(contenido)
+        return dict(codigos)
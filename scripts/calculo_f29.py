@@ -0,0 +1,798 @@
+"""
+calculo_f29.py — Cálculo del F29 sin dependencias de Excel.
+
+Tablas de líneas del formulario, agregación de documentos y calcular_f29.
+No importa openpyxl: para servicios que solo necesitan los códigos (89, 595,
+547, 91, ...) el arranque en frío es mínimo. La capa de render (generar_f29)
+se carga recién cuando se pide un Excel.
+
+Uso:
+    from scripts.calculo_f29 import calcular_f29
+    codigos = calcular_f29(datos)
+
+    from scripts.calculo_f29 import generar_f29_excel  # importa openpyxl al llamarla
+    generar_f29_excel(datos, "F29.xlsx")
+"""
+
+import math
+from itertools import repeat
+from operator import attrgetter
+
+MESES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
+    5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
+    9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
+
+
+def formato_peso(v):
+    if v is None or v == 0:
+        return "$0"
+    if isinstance(v, float):
+        v = int(v)
+    if v < 0:
+        return f"-${abs(v):,}".replace(",", ".")
+    return f"${v:,}".replace(",", ".")
+
+
+def redondear(x, dig=0):
+    """ROUND de Excel: mitades se alejan de cero (no redondeo bancario)."""
+    f = 10 ** int(dig)
+    r = math.floor(abs(x) * f + 0.5) / f
+    r = r if x >= 0 else -r
+    return int(r) if dig <= 0 else r
+
+
+# ============================================================
+# Datos de líneas del F29
+# ============================================================
+
+L_DEB_INFO = [
+    (1, 'Exportaciones', 585, 20, None),
+    (2, 'Ventas y/o Servicios prestados Exentos, o No Gravados del giro', 586, 142, None),
+    (3, 'Ventas con retención sobre el margen de comercialización (contribuyentes retenidos)', 731, 732, None),
+    (4, 'Ventas y/o Servicios prestados exentos o No Gravados que no son del giro', 714, 715, None),
+    (5, 'Facturas de Compra recibidas con retención total (contribuyentes retenidos) y Factura de Inicio emitida', 515, 587, None),
+    (6, 'Facturas de compras recibidas con retención parcial (Total neto)', None, 720, None),
+]
+
+L_DEB_GENERA = [
+    (7, 'Facturas emitidas por ventas y servicios del giro, o por cuenta de terceros', 503, 502, '+'),
+    (8, 'Facturas emitidas por la venta de bienes inmuebles afectas a IVA', 763, 764, '+'),
+    (9, 'Facturas y Notas de Débitos por ventas y servicios que no son del giro (activo fijo y otros)', 716, 717, '+'),
+    (10, 'Boletas', 110, 111, '+'),
+    (11, 'Comprobantes o Recibos de Pago generados en transacciones pagadas a través de medios electrónicos', 758, 759, '+'),
+    (12, 'Notas de Débito emitidas asociadas al giro y ND recibidas de terceros por retención parcial de cambio de sujeto', 512, 513, '+'),
+    (13, 'Notas de Crédito emitidas por Facturas asociadas al giro y NC recibidas de terceros por retención parcial de cambio de sujeto', 509, 510, '-'),
+    (14, 'Notas de Crédito emitidas por Vales de máquinas autorizadas por el Servicio', 708, 709, '-'),
+    (15, 'Notas de Crédito emitidas por ventas y servicios que no son del giro (activo fijo y otros)', 733, 734, '-'),
+    (16, 'Facturas de Compra recibidas con retención parcial (contribuyentes retenidos)', 516, 517, '+'),
+    (17, 'Liquidación y Liquidación Factura', 500, 501, '+'),
+    (18, 'Adiciones al Débito Fiscal del mes por Art.27 bis', None, 154, '+'),
+    (19, 'Restitución Adicional Art.27 bis, inc.2º (Ley 19.738)', None, 518, '+'),
+    (20, 'Reintegro Impuesto de Timbres y Estampillas, Art. 3º Ley Nº 20.259 e IVA Arrendamiento esporádico BBII Amoblados', None, 713, '+'),
+    (21, 'Adiciones al Débito por IEPD Ley 20.765', 738, 741, '+'),
+    (22, 'Restitución Adicional Reembolso Remanente CF IVA (Ley 21.256)', None, 791, '+'),
+]
+
+L_CRED_SIN = [
+    (25, 'Internas afectas', 564, 521, None),
+    (26, 'Importaciones', 566, 560, None),
+    (27, 'Internas exentas, o no gravadas', 584, 562, None),
+]
+
+L_CRED_INT = [
+    (28, 'Facturas recibidas del giro y Facturas de compra emitidas', 519, 520, '+'),
+    (29, 'Facturas recibidas de Proveedores: Supermercados y Comercios similares, Art.23 Nº4 D.L.825 (Ley Nº20.780)', 761, 762, '+'),
+    (30, 'Facturas recibidas por Adquisición o Construcción de Bienes Inmuebles, Art.8º transitorio (Ley Nº20.780)', 765, 766, '+'),
+    (31, 'Facturas activo fijo', 524, 525, '+'),
+    (32, 'Notas de Crédito recibidas y NC emitidas por retención de cambio de sujeto', 527, 528, '-'),
+    (33, 'Notas de Débito recibidas y ND emitidas por retención de cambio de sujeto', 531, 532, '+'),
+]
+
+L_CRED_IMP = [
+    (34, 'Declaraciones de Ingreso (DIN) importaciones del giro', 534, 535, '+'),
+    (35, 'Declaraciones de Ingreso (DIN) importaciones de activo fijo', 536, 553, '+'),
+]
+
+L_CRED_REM = [
+    (36, 'Remanente Crédito Fiscal mes anterior', None, 504, '+'),
+    (37, 'Devolución Solicitud Art. 36 (Exportadores)', None, 593, '-'),
+    (38, 'Devolución Solicitud Art. 27 bis (Activo fijo)', None, 594, '-'),
+    (39, 'Certificado Imputación Art. 27 bis (Activo fijo)', None, 592, '-'),
+    (40, 'Devolución Solicitud Art. 3º (Cambio de Sujeto)', None, 539, '-'),
+    (41, 'Devolución Solicitud Ley Nº 20.258 (Generadoras Eléctricas)', None, 718, '-'),
+    (42, 'Devolución Solicitud Reembolso Remanente de Crédito Fiscal IVA', None, 790, '-'),
+    (43, 'Monto Reintegrado por Devolución Indebida de Crédito Fiscal D.S. 348 (Exportadores)', None, 164, '+'),
+]
+
+L_CRED_IEPD = [
+    (44, 'Recuperación de Impuesto Específico al Petróleo Diesel (Art. 7º Ley 18.502, Arts.1º y 3º D.S. Nº 311/86)', 730, 127, '+'),
+    (45, 'Recuperación Imp. Específico Petróleo Diesel Transportistas de Carga (Art. 2º Ley Nº19.764)', 729, 544, '+'),
+]
+
+L_CRED_OTROS = [
+    (46, 'Crédito del Art.11º Ley 18.211 (Zona Franca de Extensión)', None, 523, '+'),
+    (47, 'Crédito por Impuesto de Timbres y Estampillas, Art. 3º Ley Nº 20.259', None, 712, '+'),
+    (48, 'Crédito por IVA restituido a aportantes sin domicilio ni residencia en Chile (Art. 83, Ley 20.712)', None, 757, '+'),
+]
+
+L_POST_51 = [(51, 'Saldo de IVA postergado en 12 cuotas', 772, 775, '+')]
+
+L_POST_CUOTAS = [
+    (52, 'Monto Total de IVA postergado', 777, 780, '+'),
+    (53, 'Monto total IVA postergado (Ley 20.780)', 782, 783, '+'),
+    (54, 'Monto total IVA postergado (Ley 21.207)', 784, 785, '+'),
+    (55, 'Monto Total IVA postergado (DIN)', 786, 787, '+'),
+    (56, 'Monto Total IVA postergado (Tributación Simplificada)', 788, 789, '+'),
+    (57, 'Restitución de devolución Art. 27 ter D.L. 825, inc. 2º (Ley Nº 20.720)', None, 760, '+'),
+    (58, 'Certificado Imputación Art. 27 ter D.L. 825, inc. 1º (Ley Nº 20.720)', None, 767, '-'),
+]
+
+L_RET = [
+    (59, 'Retención Imp. Primera Categoría por rentas de capitales mobiliarios del Art.20 Nº2, según Art.73 LIR', None, 50, '+'),
+    (60, 'Retención Impuesto Único a los Trabajadores, según Art. 74 Nº 1 LIR', 751, 48, '+'),
+    (61, 'Retención de Impuesto con tasa del 15.25% sobre las rentas del Art. 42 Nº2, según Art. 74 Nº2 LIR', None, 151, '+'),
+    (62, 'Retención de Impuesto con tasa del 10% sobre las rentas del Art. 48, según Art. 74 N° 3 LIR', None, 153, '+'),
+    (63, 'Retención sobre rentas del Art. 42 N°1 LIR con tasa del 3%', None, 49, '+'),
+    (64, 'Retención sobre rentas del Art. 42 N°2 LIR con tasa del 3%', None, 155, '+'),
+    (65, 'Retención a Suplementeros, según Art. 74 N°5 (tasa 0,5%) LIR', None, 54, '+'),
+    (66, 'Retención por compra de productos mineros, según Art. 74 N° 6 LIR', None, 56, '+'),
+    (67, 'Retención sobre rescates y seguros dotales del N° 3 del Art.17 LIR (tasa 15%)', None, 588, '+'),
+    (68, 'Retención sobre retiros de Ahorro Previsional Voluntario del Art. 42 bis LIR (tasa 15%)', None, 589, '+'),
+]
+
+# PPM: L_PPM keeps cq/ca for formula builder (_bf uses ca only)
+# Extra codes for multi-column lines are handled in the renderer
+L_PPM = [
+    (69, '1ra Categoría Art. 84 a) y 14 D N° 3 letra (k) y 8 letra (a) numeral (viii)', 750, 62, '+'),
+    (70, '1ra Cat. Art. 84 a) tasa 3%, reintegro préstamo tasa 0%', None, 156, '+'),
+    (71, 'Mineros, Art.84 a)', 565, 123, '+'),
+    (72, 'Explotador Minero Art. 84 h)', 700, 703, '+'),
+    (73, 'Explotador Minero Royalty Ley 21.591', 806, 810, '+'),
+    (74, 'Transportistas acogidos a Renta Presunta, Art 84, e) y f) (tasa de 0,3%)', None, 66, '+'),
+    (75, 'Crédito Capacitación, Ley 19.518/97', 721, 723, '-'),
+    (76, '2da. Categoría Art. 84, b) (tasa 15.25%)', None, 152, '+'),
+    (77, '2da. Cat. Art. 84 b) LIR tasa 3%', None, 157, '+'),
+    (78, 'Taller artesanal Art.84, c) (tasa de 1,5% o 3%)', None, 70, '+'),
+    (79, 'Renta Líquida Provisional inciso final de la letra a) del art 84 de la LIR, Ley N° 21.210', None, 776, '+'),
+]
+
+# Multi-column PPM: codes for columns E-N (line 69) or F-N (lines 71-73)
+# Line 69: 6 pairs in cols C-N: [750, 30, 563, 115, 68, 62]
+# Lines 71-73: 5 pairs in cols E-N: [base, base_imp, tasa, credito, ppm_calc]
+PPM_LINE69_CODES = [750, 30, 563, 115, 68, 62]
+PPM_MULTI = {
+    71: [565, 120, 542, 122, 123],
+    72: [700, 701, 702, 711, 703],
+    73: [806, 807, 808, 809, 810],
+}
+
+L_TRIB_SIMP = [
+    (81, 'Ventas del período', None, 529, None),
+    (82, 'Crédito del período', None, 530, None),
+    (83, 'IVA determinado por concepto de Tributación Simplificada', None, 409, '+'),
+]
+
+L_ART37 = [
+    (84, 'Letras e), h), i), l) (tasa 15%)', None, 522, '+'),
+    (85, 'Letra j) (tasa 50%)', None, 526, '+'),
+    (86, 'Débito de Impuesto Adicional Ventas Art. 37 letras a), b) y c) y Art. 40 D.L.825 (tasa 15%)', None, 113, '+'),
+    (87, 'Crédito de Impuesto Adicional Art.37 letras a), b) y c) D.L. 825', None, 28, '-'),
+    (88, 'Monto reintegrado por devolución indebida de crédito por exportadores D.L. 825', None, 548, '-'),
+    (89, 'Remanente crédito Art. 37 mes anterior D.L.825', None, 540, '-'),
+    (90, 'Devolución Solicitud Art.36 relativa al Imp. Adicional Art.37 letras a), b) y c) D.L. 825', None, 541, '+'),
+]
+
+L_ART42_DEB = [
+    (92, 'Pisco, Licores, Whisky y Aguardiente (tasa 31,5%)', None, 577, '+'),
+    (93, 'Vinos, Champaña, Chichas (tasa 20,5%)', None, 32, '+'),
+    (94, 'Cervezas (tasa 20,5%)', None, 150, '+'),
+    (95, 'Bebidas analcohólicas (tasa 10%)', None, 146, '+'),
+    (96, 'Bebidas analcohólicas elevado contenido azúcares (tasa 18%)', None, 752, '+'),
+    (97, 'Notas de Débito emitidas', None, 545, '+'),
+    (98, 'Notas de Crédito emitidas por Facturas', None, 546, '-'),
+    (99, 'Notas de Crédito emitidas por Vales de máquinas autorizadas por el Servicio', None, 710, '-'),
+]
+
+L_ART42_CRED = [
+    (101, 'Pisco, Licores, Whisky y Aguardiente (tasa 31,5%)', 575, 576, '+'),
+    (102, 'Vinos, Champaña, Chichas (tasa 20,5%)', 574, 33, '+'),
+    (103, 'Cervezas (tasa 20,5%)', 580, 149, '+'),
+    (104, 'Bebidas analcohólicas (tasa 10%)', 582, 85, '+'),
+    (105, 'Bebidas analcohólicas elevado contenido azúcares (tasa 18%)', 753, 754, '+'),
+    (106, 'Notas de Débito recibidas', None, 551, '+'),
+    (107, 'Notas de Crédito recibidas', None, 559, '-'),
+    (108, 'Remanente crédito Art.42 mes anterior', None, 508, '+'),
+    (109, 'Devolución Art. 36 D.L.825 relativas impuesto Art.42', None, 533, '-'),
+    (110, 'Monto reintegrado devoluciones indebidas de crédito por exportaciones', None, 552, '+'),
+]
+
+L_ANTICIPO_CS = [
+    (113, 'IVA anticipado del período', None, 556, '+'),
+    (114, 'Remanente del mes anterior', None, 557, '+'),
+    (115, 'Devolución del mes anterior', None, 558, '-'),
+]
+
+L_CS_AGENTE = [
+    (118, 'IVA total retenido a terceros (tasa Art. 14 DL 825)', None, 39, '+'),
+    (119, 'IVA parcial retenido a terceros (según tasa)', None, 554, '+'),
+    (120, 'IVA Retenido por notas de crédito emitidas', None, 736, '-'),
+    (121, 'Retención de margen de comercialización', None, 597, '+'),
+    (122, 'Retención Anticipo de Cambio de Sujeto', 555, 596, '+'),
+]
+
+L_CS_ESPECIAL = [
+    (123, 'IVA retenido a terceros con retención total en el período', None, 100, '+'),
+    (124, 'Ajustes por concepto de IVA asociado a reversiones y contracargos (disputas) solucionadas en el período', None, 101, '-'),
+    (125, 'Valor nominal del remanente de ajuste (código 104 del período anterior)', None, 102, '-'),
+]
+
+L_VENTA_REMOTA = [
+    (128, 'IVA total del periodo por la venta remota de bienes corporales muebles', None, 811, '+'),
+    (129, 'Ajustes por concepto de IVA asociado a reversiones y contracargos solucionados en el período', None, 812, '-'),
+    (130, 'Valor nominal del remanente de ajuste (código [815] del período anterior)', None, 813, '-'),
+]
+
+L_CRED_ESP = [
+    (134, 'Crédito por Sistemas Solares Térmicos, Ley 20.365', 725, 727, '-'),
+    (135, 'Imputación del Pago Patente Aguas Ley 20.017', 704, 706, '-'),
+    (136, 'Cotización Adicional Ley 18.566', 160, 570, '-'),
+    (137, 'Crédito Especial Empresas Constructoras', 126, 571, '-'),
+    (138, 'Recup. Peajes Transportistas Pasajeros, Ley 19.764', 572, 590, '-'),
+    (139, 'Crédito por desembolsos directos trazabilidad', 768, 770, '-'),
+]
+
+L_REM_CRED_ESP = [
+    (141, 'Remanente Crédito por Sistemas Solares Térmicos, Ley 20.365', None, 728, None),
+    (142, 'Remanente periodo siguiente Patente Aguas, Ley 20.017', None, 707, None),
+    (143, 'Remanente de Cotización Adicional Ley 18.566', None, 73, None),
+    (144, 'Remanente Crédito Especial Empresas Constructoras', None, 130, None),
+    (145, 'Remanente Recup. de Peajes Trans. Pasajeros Ley 19.764', None, 591, None),
+    (146, 'Remanente Crédito por desembolsos directos trazabilidad', None, 771, None),
+]
+
+ALL_CRED_LINES = L_CRED_INT + L_CRED_IMP + L_CRED_REM + L_CRED_IEPD + L_CRED_OTROS
+
+# Líneas que admiten documentos individuales (hoja de detalle, RCV)
+LINEAS_INFO = {
+    "linea_1":  {"linea": "1",  "cod_cant": 585, "cod_monto": 20,  "nombre": "Facturas de Exportación", "seccion": "debito"},
+    "linea_2":  {"linea": "2",  "cod_cant": 586, "cod_monto": 142, "nombre": "Ventas/Servicios Exentos del Giro", "seccion": "debito"},
+    "linea_5":  {"linea": "5",  "cod_cant": 515, "cod_monto": 587, "nombre": "Facturas de Compra (Serv. Digitales Extranjeros)", "seccion": "debito"},
+    "linea_7":  {"linea": "7",  "cod_cant": 503, "cod_monto": 502, "nombre": "Facturas Afectas del Giro", "seccion": "debito"},
+    "linea_9":  {"linea": "9",  "cod_cant": 716, "cod_monto": 717, "nombre": "Ventas Activo Fijo (No del Giro)", "seccion": "debito"},
+    "linea_10": {"linea": "10", "cod_cant": 110, "cod_monto": 111, "nombre": "Boletas", "seccion": "debito"},
+    "linea_11": {"linea": "11", "cod_cant": 758, "cod_monto": 759, "nombre": "Boletas Electrónicas / POS", "seccion": "debito"},
+    "linea_12": {"linea": "12", "cod_cant": 512, "cod_monto": 513, "nombre": "Notas de Débito Emitidas", "seccion": "debito"},
+    "linea_13": {"linea": "13", "cod_cant": 509, "cod_monto": 510, "nombre": "Notas de Crédito Emitidas", "seccion": "debito"},
+    "linea_27": {"linea": "27", "cod_cant": 584, "cod_monto": 562, "nombre": "Internas Exentas sin Derecho a CF", "seccion": "credito"},
+    "linea_28": {"linea": "28", "cod_cant": 519, "cod_monto": 520, "nombre": "Facturas Recibidas del Giro + FC Emitidas", "seccion": "credito"},
+    "linea_29": {"linea": "29", "cod_cant": 761, "cod_monto": 762, "nombre": "Facturas Supermercados/Comercios", "seccion": "credito"},
+    "linea_31": {"linea": "31", "cod_cant": 524, "cod_monto": 525, "nombre": "Facturas Activo Fijo", "seccion": "credito"},
+    "linea_32": {"linea": "32", "cod_cant": 527, "cod_monto": 528, "nombre": "Notas de Crédito Recibidas / NC por Cambio de Sujeto", "seccion": "credito"},
+    "linea_33": {"linea": "33", "cod_cant": 531, "cod_monto": 532, "nombre": "Notas de Débito Recibidas", "seccion": "credito"},
+    "linea_60": {"linea": "60", "cod_cant": None, "cod_monto": 48,  "nombre": "Impuesto Único 2da Categoría (Sueldos)", "seccion": "retencion"},
+    "linea_61": {"linea": "61", "cod_cant": None, "cod_monto": 151, "nombre": "Retención Honorarios Art. 42 N°2", "seccion": "retencion"},
+}
+
+
+# ============================================================
+# Agregación de documentos (una sola pasada)
+# ============================================================
+
+class ColumnasDocumentos:
+    """
+    Documentos de una línea en formato columnar: {"neto": [...], "iva": [...], ...}.
+
+    Las columnas pueden ser listas o arrays de NumPy; en ese caso los totales
+    se suman vectorizados. Al iterar entrega un dict por documento, así que la
+    hoja de detalle lo trata igual que una lista de dicts.
+    """
+
+    def __init__(self, columnas):
+        self.columnas = dict(columnas)
+        largos = {len(v) for v in self.columnas.values()}
+        if len(largos) > 1:
+            raise ValueError(f"Columnas de distinto largo: {sorted(largos)}")
+        self._n = largos.pop() if largos else 0
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        nombres = list(self.columnas)
+        for fila in zip(*self.columnas.values()):
+            yield {k: (v.item() if hasattr(v, "item") else v) for k, v in zip(nombres, fila)}
+
+    def suma(self, *alias):
+        """Total de la primera columna existente entre `alias` (0 si no hay ninguna)."""
+        for campo in alias:
+            col = self.columnas.get(campo)
+            if col is not None:
+                total = col.sum() if hasattr(col, "sum") else sum(col)
+                return total.item() if hasattr(total, "item") else total
+        return 0
+
+
+# Alias por campo agregado: honorarios y sueldos usan bruto/retención|iusc/
+# líquido, igual que las columnas de la hoja de detalle.
+CAMPOS_AGREGADOS = ("neto", "iva", "exento", "total")
+ALIAS_MONTOS = {
+    "linea_60": {"neto": ("bruto", "neto"), "iva": ("iusc", "iva"), "total": ("liquido", "total")},
+    "linea_61": {"neto": ("bruto", "neto"), "iva": ("retencion", "iva"), "total": ("liquido", "total")},
+}
+
+
+class Documento:
+    """
+    Documento compacto (__slots__, sin dict por instancia): menos de la
+    mitad de memoria que el dict equivalente. Los alias de su línea (bruto,
+    retencion, iusc, liquido, nombre, cargo) se resuelven una vez al crearlo
+    con desde_dict; después los campos son siempre los mismos.
+
+    También responde a get/in/[] como un dict (con los alias), así el código
+    que recibe documentos en dict lo acepta sin cambios.
+    """
+
+    __slots__ = ("numero", "fecha", "rut", "razon_social", "descripcion",
+                 "neto", "iva", "exento", "total", "tipo_doc", "prestamo_solidario")
+    _TEXTOS = ("numero", "fecha", "rut", "razon_social", "descripcion")
+    _DEFECTOS = {"tipo_doc": None, "prestamo_solidario": False}
+
+    def __init__(self, numero="", fecha="", rut="", razon_social="", descripcion="",
+                 neto=0, iva=0, exento=0, total=0, tipo_doc=None, prestamo_solidario=False):
+        self.numero = numero
+        self.fecha = fecha
+        self.rut = rut
+        self.razon_social = razon_social
+        self.descripcion = descripcion
+        self.neto = neto
+        self.iva = iva
+        self.exento = exento
+        self.total = total
+        self.tipo_doc = tipo_doc
+        self.prestamo_solidario = prestamo_solidario
+
+    @classmethod
+    def desde_dict(cls, doc, lk=None):
+        """Documento desde un dict de `documentos[lk]`, con los alias de la línea lk."""
+        alias = ALIAS_DOCUMENTO.get(lk, {})
+        valores = {}
+        for campo in cls.__slots__:
+            defecto = "" if campo in cls._TEXTOS else cls._DEFECTOS.get(campo, 0)
+            valores[campo] = next((doc[a] for a in alias.get(campo, (campo,)) if a in doc), defecto)
+        return cls(**valores)
+
+    def a_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    # Interfaz de dict: nombres alias → campo normalizado
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, _CAMPO_NORMALIZADO.get(campo, campo))
+        except (AttributeError, TypeError):
+            raise KeyError(campo) from None
+
+    def __contains__(self, campo):
+        return _CAMPO_NORMALIZADO.get(campo, campo) in self.__slots__
+
+    def get(self, campo, defecto=None):
+        try:
+            return self[campo]
+        except KeyError:
+            return defecto
+
+    def __eq__(self, otro):
+        if not isinstance(otro, Documento):
+            return NotImplemented
+        return all(getattr(self, c) == getattr(otro, c) for c in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        campos = ", ".join(f"{c}={getattr(self, c)!r}" for c in self.__slots__)
+        return f"Documento({campos})"
+
+
+# Alias por campo del Documento: los de ALIAS_MONTOS más los textos de sueldos
+ALIAS_DOCUMENTO = {
+    "linea_60": {**ALIAS_MONTOS["linea_60"],
+                 "razon_social": ("razon_social", "nombre"), "descripcion": ("cargo", "descripcion")},
+    "linea_61": dict(ALIAS_MONTOS["linea_61"]),
+}
+_CAMPO_NORMALIZADO = {"bruto": "neto", "retencion": "iva", "iusc": "iva", "liquido": "total",
+                      "nombre": "razon_social", "cargo": "descripcion"}
+
+
+def compactar_documentos(documentos):
+    """
+    `documentos` con cada lista de dicts convertida a Documento (alias ya
+    resueltos). ColumnasDocumentos, spools y otros iterables quedan tal cual.
+    """
+    compactos = {}
+    for lk, doc_list in documentos.items():
+        if isinstance(doc_list, (list, tuple)):
+            doc_list = [d if isinstance(d, Documento) else Documento.desde_dict(d, lk) for d in doc_list]
+        compactos[lk] = doc_list
+    return compactos
+
+
+def _sumar_campo(doc_list, alias):
+    """Suma d[alias[0]] (o el siguiente alias, o 0) sobre los documentos de una línea."""
+    if isinstance(doc_list, ColumnasDocumentos):
+        return doc_list.suma(*alias)
+    if isinstance(doc_list, list) and doc_list and isinstance(doc_list[0], Documento):
+        try:
+            # Documento ya tiene los alias resueltos: el campo es el último alias
+            return sum(map(attrgetter(alias[-1]), doc_list))
+        except AttributeError:
+            pass  # lista mezclada con dicts
+    try:
+        # map(dict.get, ...) recorre la lista en C: más rápido que un for en Python
+        valores = repeat(0)
+        for campo in reversed(alias):
+            valores = map(dict.get, doc_list, repeat(campo), valores)
+        return sum(valores)
+    except TypeError:
+        if all(isinstance(d, dict) for d in doc_list):
+            raise
+
+    def valor(d):
+        for campo in alias:
+            if campo in d:
+                return d[campo]
+        return 0
+    return sum(valor(d) for d in doc_list)
+
+
+def montos_documento(doc, lk):
+    """{"neto", "iva", "exento", "total"} de un documento, resolviendo los alias de su línea."""
+    if isinstance(doc, Documento):
+        return {campo: getattr(doc, campo) for campo in CAMPOS_AGREGADOS}
+    alias = ALIAS_MONTOS.get(lk, {})
+    montos = {}
+    for campo in CAMPOS_AGREGADOS:
+        montos[campo] = next((doc[a] for a in alias.get(campo, (campo,)) if a in doc), 0)
+    return montos
+
+
+def agregar_documentos(docs, campos=CAMPOS_AGREGADOS):
+    """
+    Totales por línea de `documentos`: {linea: {"cant", "neto", "iva", "exento", "total"}}.
+    Solo incluye líneas con documentos. calcular_f29 lee únicamente esto.
+    """
+    agregados = {}
+    for lk, doc_list in docs.items():
+        if not len(doc_list):
+            continue
+        alias = ALIAS_MONTOS.get(lk, {})
+        agg = {"cant": len(doc_list)}
+        for campo in campos:
+            agg[campo] = _sumar_campo(doc_list, alias.get(campo, (campo,)))
+        agregados[lk] = agg
+    return agregados
+
+
+# ============================================================
+# Cálculo del F29
+# ============================================================
+
+IVA_TASA = 0.19
+
+# Retención de honorarios (Art. 74 N°2 LIR, alza gradual Ley 21.133), en % según el año de la boleta
+TASAS_HONORARIOS = {2020: 10.75, 2021: 11.5, 2022: 12.25, 2023: 13.0, 2024: 13.75,
+                    2025: 14.5, 2026: 15.25, 2027: 16.0}
+TASA_HONORARIOS_FINAL = 17.0       # desde 2028
+TASA_PRESTAMO_SOLIDARIO = 3.0      # Art. 42 N°2, devolución del préstamo solidario (código 155)
+
+
+def tasa_honorarios(anio):
+    """Tasa de retención (%) de las boletas de honorarios emitidas en `anio`."""
+    if anio >= 2028:
+        return TASA_HONORARIOS_FINAL
+    return TASAS_HONORARIOS.get(anio, 10.0)
+
+
+# Líneas que se calculan desde documentos o, sin ellos, desde ventas/compras.
+# Débito: (cq, ca, línea, campo cantidad, campo neto, monto es IVA)
+LINEAS_DOC_DEBITO = [
+    (585, 20, "linea_1", "facturas_exportacion_cant", "facturas_exportacion_neto", False),
+    (586, 142, "linea_2", "facturas_exentas_giro_cant", "facturas_exentas_giro_neto", False),
+    (515, 587, "linea_5", "facturas_compra_digital_cant", "facturas_compra_digital_neto", False),
+    (503, 502, "linea_7", "facturas_afectas_cant", "facturas_afectas_neto", True),
+    (716, 717, "linea_9", "ventas_activo_fijo_cant", "ventas_activo_fijo_neto", True),
+    (110, 111, "linea_10", "boletas_cant", "boletas_neto", True),
+    (512, 513, "linea_12", "notas_debito_cant", "notas_debito_neto", True),
+    (509, 510, "linea_13", "notas_credito_cant", "notas_credito_neto", True),
+]
+# Crédito: (cq, ca, línea, campo cantidad, campo IVA)
+LINEAS_DOC_CREDITO = [
+    (519, 520, "linea_28", "facturas_giro_cant", "facturas_giro_iva"),
+    (524, 525, "linea_31", "facturas_activo_fijo_cant", "facturas_activo_fijo_iva"),
+    (527, 528, "linea_32", "notas_credito_recibidas_cant", "notas_credito_recibidas_iva"),
+    (531, 532, "linea_33", "notas_debito_recibidas_cant", "notas_debito_recibidas_iva"),
+    (534, 535, "linea_34", "din_giro_cant", "din_giro_iva"),
+    (536, 553, "linea_35", "din_activo_fijo_cant", "din_activo_fijo_iva"),
+]
+# Sin derecho a crédito: (cq, ca, línea, campo cantidad, campo neto en compras)
+LINEAS_DOC_SIN_CREDITO = [
+    (584, 562, "linea_27", "exentas_sin_derecho_cant", "exentas_sin_derecho_neto"),
+]
+# Retenciones: (ca, línea, campo en datos["retenciones"]); el monto es la columna IUSC/Retención
+LINEAS_DOC_RETENCION = [
+    (48, "linea_60", "iusc_impuesto"),
+    (151, "linea_61", "honorarios_retencion"),
+]
+# Base PPM (563): (línea, campo neto en ventas, signo)
+LINEAS_BASE_PPM = [
+    ("linea_7", "facturas_afectas_neto", 1),
+    ("linea_2", "facturas_exentas_giro_neto", 1),
+    ("linea_1", "facturas_exportacion_neto", 1),
+    ("linea_10", "boletas_neto", 1),
+    ("linea_12", "notas_debito_neto", 1),
+    ("linea_13", "notas_credito_neto", -1),
+]
+
+
+def _codigos_linea_debito(agg, v, c, lk, fc, fn, is_iva):
+    """(cantidad, monto) de una línea de débito desde sus totales o desde ventas."""
+    if lk in agg:
+        monto = agg[lk]["iva"] if is_iva else agg[lk]["neto"]
+        if is_iva and not monto:
+            monto = int(agg[lk]["neto"] * IVA_TASA)
+        return agg[lk]["cant"], monto
+    monto = int(v.get(fn, 0) * IVA_TASA) if is_iva else v.get(fn, c.get(fn, 0))
+    return v.get(fc, c.get(fc, 0)), monto
+
+
+def _codigos_linea_credito(agg, c, sin_derecho, lk, fc, fi):
+    """
+    (cantidad, IVA) de una línea de crédito desde sus totales o desde compras,
+    menos el IVA de uso común sin derecho a crédito (prorrateo_f29) de la línea.
+    """
+    if lk in agg:
+        cant, iva = agg[lk]["cant"], agg[lk]["iva"]
+    else:
+        cant, iva = c.get(fc, 0), c.get(fi, 0)
+    return cant, iva - sin_derecho.get(lk, 0)
+
+
+def _codigos_linea_sin_credito(agg, c, lk, fc, fn):
+    """(cantidad, monto neto) de una línea de compras sin derecho a crédito desde sus totales o desde compras."""
+    if lk in agg:
+        return agg[lk]["cant"], agg[lk]["neto"]
+    return c.get(fc, 0), c.get(fn, 0)
+
+
+def _codigo_linea_retencion(agg, ret, lk, campo):
+    return agg[lk]["iva"] if lk in agg else ret.get(campo, 0)
+
+
+def _base_ppm(agg, v, ppm):
+    if ppm.get("base_imponible") is not None:
+        return ppm["base_imponible"]
+    return sum(signo * (agg[lk]["neto"] if lk in agg else v.get(fk, 0))
+               for lk, fk, signo in LINEAS_BASE_PPM)
+
+
+def _ppm_determinado(base, tasa, suspension=False):
+    """(68, 62) como la hoja: ROUND(563 × 115 / 100) − 68; con suspensión el tope (68) es todo el PPM."""
+    bruto = redondear(base * tasa / 100)
+    tope = bruto if suspension else 0
+    return tope, bruto - tope
+
+
+def _sence(credito, remanente, ppm):
+    """(723, 724): crédito SENCE imputado contra el PPM (62) y lo que queda para el mes siguiente."""
+    sence = credito + remanente
+    imputado = min(sence, ppm)
+    return imputado, sence - imputado
+
+
+def _subtotal_595(codigos):
+    """Código 595 en modo cálculo: 89 + retenciones + PPM menos el crédito SENCE imputado."""
+    return (codigos[89] + sum(codigos.get(ca, 0) for _, _, _, ca, _ in L_RET)
+            + codigos[62] - codigos[723])
+
+
+def _total_547(codigos):
+    """Código 547 en modo cálculo: 595 + impuestos adicionales (549, 507) + cambio de sujeto (596)."""
+    return codigos[595] + codigos[549] + codigos[507] + codigos.get(596, 0)
+
+
+def suma_signada(codigos, lines):
+    """Suma de los montos de `lines` con su signo ('+'/'-'), como las fórmulas de total de la hoja."""
+    return sum(codigos.get(ca, 0) * (1 if op == '+' else -1)
+               for _, _, _, ca, op in lines if op in ('+', '-'))
+
+
+def _saldos_impuesto_adicional(codigos):
+    """602/603, 507/506 (línea 112) y 549/550 (línea 91) como los calcula la hoja."""
+    deb, cred = suma_signada(codigos, L_ART42_DEB), suma_signada(codigos, L_ART42_CRED)
+    saldo37 = suma_signada(codigos, L_ART37)
+    return {602: deb, 603: cred, 507: max(deb - cred, 0), 506: max(cred - deb, 0),
+            549: max(saldo37, 0), 550: max(-saldo37, 0)}
+
+
+def recalcular_totales(codigos, cambios):
+    """
+    Copia de `codigos` (modo códigos) con `cambios` ({código: valor}) aplicados
+    y los totales que dependen de ellos corregidos por diferencia: 511/514,
+    538/537, 89/77, 723/724, 602/603, 507/506, 549/550, 595, 547, 91 y 94.
+    Los totales que ya traía `codigos` se respetan; solo se les suma el cambio.
+    """
+    nuevo = dict(codigos)
+    nuevo.update(cambios)
+    delta = {k: v - codigos.get(k, 0) for k, v in cambios.items() if v != codigos.get(k, 0)}
+
+    def ajustar(code, d):
+        if d and code not in cambios:
+            nuevo[code] = nuevo.get(code, 0) + d
+            delta[code] = delta.get(code, 0) + d
+
+    def fijar(code, valor):
+        if code not in cambios and valor != nuevo.get(code, 0):
+            delta[code] = delta.get(code, 0) + valor - nuevo.get(code, 0)
+            nuevo[code] = valor
+
+    ajustar(511, delta.get(519, 0) + delta.get(524, 0))
+    ajustar(514, delta.get(520, 0) + delta.get(525, 0))
+    ajustar(538, suma_signada(delta, L_DEB_GENERA))
+    ajustar(537, suma_signada(delta, ALL_CRED_LINES))
+    if 537 in delta or 538 in delta:
+        td, tc = nuevo.get(538, 0), nuevo.get(537, 0)
+        fijar(89, max(td - tc, 0))
+        fijar(77, max(tc - td, 0))
+    if 721 in delta or 722 in delta or 62 in delta:
+        imputado, remanente = _sence(nuevo.get(721, 0), nuevo.get(722, 0), nuevo.get(62, 0))
+        fijar(723, imputado)
+        fijar(724, remanente)
+    ajustar(602, suma_signada(delta, L_ART42_DEB))
+    ajustar(603, suma_signada(delta, L_ART42_CRED))
+    if 602 in delta or 603 in delta:
+        deb, cred = nuevo.get(602, 0), nuevo.get(603, 0)
+        fijar(507, max(deb - cred, 0))
+        fijar(506, max(cred - deb, 0))
+    d37 = suma_signada(delta, L_ART37)
+    if d37:
+        previo = codigos.get(549, 0) - codigos.get(550, 0) if 549 in codigos or 550 in codigos \
+            else suma_signada(codigos, L_ART37)
+        fijar(549, max(previo + d37, 0))
+        fijar(550, max(-(previo + d37), 0))
+    ajustar(595, delta.get(89, 0) + suma_signada(delta, L_POST_51 + L_POST_CUOTAS + L_RET + L_PPM))
+    ajustar(547, sum(delta.get(k, 0) for k in (595, 409, 549, 507, 596, 816))
+            + suma_signada(delta, L_CRED_ESP))
+    ajustar(91, delta.get(547, 0))
+    ajustar(94, delta.get(91, 0))
+    return nuevo
+
+
+def calcular_f29(datos):
+    """Calcula códigos del F29 desde datos."""
+    if "codigos" in datos:
+        codigos = dict(datos["codigos"])
+        for k in [538, 537, 89, 77, 595, 547, 91, 62]:
+            codigos.setdefault(k, 0)
+        return codigos
+
+    v = datos.get("ventas", {})
+    c = datos.get("compras", {})
+    ret = datos.get("retenciones", {})
+    ppm = datos.get("ppm", {})
+    dev = datos.get("devoluciones", {})
+    docs = datos.get("documentos", {})
+    cs = datos.get("cambio_sujeto", {})
+    codigos = {}
+
+    # Totales ya agregados (p.ej. por la ingesta del RCV) mandan sobre documentos
+    agg = dict(datos.get("agregados", {}))
+    agg.update(agregar_documentos({lk: d for lk, d in docs.items() if lk not in agg},
+                                  campos=("neto", "iva")))
+
+    for linea in LINEAS_DOC_DEBITO:
+        cq, ca = linea[:2]
+        codigos[cq], codigos[ca] = _codigos_linea_debito(agg, v, c, *linea[2:])
+
+    for k in [731, 732, 714, 715, 720, 763, 764, 758, 759, 708, 709, 733, 734,
+              516, 517, 500, 501, 154, 518, 713, 738, 741, 791]:
+        codigos.setdefault(k, 0)
+
+    codigos[538] = suma_signada(codigos, L_DEB_GENERA)
+
+    # IVA de uso común sin derecho a crédito (prorrateo_f29) sale de 520/525
+    sin_derecho = datos.get("prorrateo", {}).get("sin_derecho", {})
+    for linea in LINEAS_DOC_CREDITO:
+        cq, ca = linea[:2]
+        codigos[cq], codigos[ca] = _codigos_linea_credito(agg, c, sin_derecho, *linea[2:])
+
+    for k in [761, 762, 765, 766, 564, 521, 566, 560, 730, 127, 729, 544]:
+        codigos.setdefault(k, 0)
+    for linea in LINEAS_DOC_SIN_CREDITO:
+        cq, ca = linea[:2]
+        codigos[cq], codigos[ca] = _codigos_linea_sin_credito(agg, c, *linea[2:])
+    codigos[511] = codigos.get(519, 0) + codigos.get(524, 0)
+    codigos[514] = codigos.get(520, 0) + codigos.get(525, 0)
+    codigos[504] = datos.get("remanente_anterior", 0)
+    codigos[508] = datos.get("remanente_art42_anterior", 0)
+    codigos[540] = datos.get("remanente_art37_anterior", 0)
+    codigos[593] = dev.get("art_36_exportador", 0)
+    codigos[594] = dev.get("art_27_bis", 0)
+    codigos[592] = dev.get("certificado_27_bis", 0)
+    codigos[539] = dev.get("cambio_sujeto", 0)
+    for k in [718, 790, 164, 523, 712, 757]:
+        codigos.setdefault(k, 0)
+
+    codigos[537] = suma_signada(codigos, ALL_CRED_LINES)
+
+    td, tc = codigos[538], codigos[537]
+    codigos[89] = max(td - tc, 0)
+    codigos[77] = max(tc - td, 0)
+
+    codigos.setdefault(50, 0)
+    for ca, lk, campo in LINEAS_DOC_RETENCION:
+        codigos[ca] = _codigo_linea_retencion(agg, ret, lk, campo)
+    codigos[153] = ret.get("directores_retencion", 0)
+    codigos[155] = ret.get("prestamo_solidario_retencion", 0)
+    for k in [49, 54, 56, 588, 589, 751]:
+        codigos.setdefault(k, 0)
+
+    tasa_ppm = ppm.get("tasa", 0.25)
+    codigos[115] = tasa_ppm
+    codigos.setdefault(750, 0)
+    codigos.setdefault(30, 0)
+    base_ppm = _base_ppm(agg, v, ppm)
+    codigos[563] = base_ppm
+    codigos[68], codigos[62] = _ppm_determinado(base_ppm, tasa_ppm, ppm.get("suspension"))
+    codigos[722] = ppm.get("remanente_sence_anterior", 0)
+    codigos[721] = ppm.get("credito_sence", 0)
+    codigos[723], codigos[724] = _sence(codigos[721], codigos[722], codigos[62])
+    codigos[595] = _subtotal_595(codigos)
+
+    codigos[39] = cs.get("iva_retenido_total", cs.get(39, 0))
+    codigos[554] = cs.get("iva_parcial_retenido", cs.get(554, 0))
+    codigos[736] = cs.get("iva_retenido_nc", cs.get(736, 0))
+    codigos[597] = cs.get("retencion_margen", cs.get(597, 0))
+    codigos[596] = cs.get("retencion_neta", cs.get(596, 0))
+    if codigos[596] == 0 and codigos[39] > 0:
+        codigos[596] = codigos[39] + codigos.get(554, 0) - codigos[736] + codigos.get(597, 0)
+
+    codigos.update(_saldos_impuesto_adicional(codigos))
+    codigos[547] = _total_547(codigos)
+    codigos[91] = codigos[547]
+    codigos[92] = 0; codigos[93] = 0
+    codigos[94] = codigos[91]
+    return codigos
+
+
+def periodo_datos(datos):
+    """(anio, mes) declarado en datos["encabezado"]; por defecto enero de 2026."""
+    enc = datos.get("encabezado", {})
+    return enc.get("periodo_anio", 2026), enc.get("periodo_mes", 1)
+
+
+def datos_desde_json(datos, compactar=False):
+    """
+    Normaliza datos leídos desde JSON: claves de códigos a int y notas a tuplas.
+    compactar=True convierte además los documentos a Documento (menos memoria).
+    """
+    datos = dict(datos)
+    if compactar and "documentos" in datos:
+        datos["documentos"] = compactar_documentos(datos["documentos"])
+    if "codigos" in datos:
+        datos["codigos"] = {int(k): v for k, v in datos["codigos"].items()}
+    if "notas" in datos:
+        datos["notas"] = [tuple(n) if isinstance(n, list) and len(n) == 2 else n
+                          for n in datos["notas"]]
+    return datos
+
+
+def generar_f29_excel(datos, output_path, **opciones):
+    """Atajo a generar_f29.generar_f29_excel que carga openpyxl solo al pedir un Excel."""
+    from scripts.generar_f29 import generar_f29_excel as generar
+    return generar(datos, output_path, **opciones)
+
+
+def generar_f29_bytes(datos, **opciones):
+    """Atajo a generar_f29.generar_f29_bytes: (codigos, bytes del xlsx)."""
+    from scripts.generar_f29 import generar_f29_bytes as generar
+    return generar(datos, **opciones)
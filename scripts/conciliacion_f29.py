@@ -0,0 +1,247 @@
+"""
+conciliacion_f29.py — Cruce del RCV contra los libros internos (SKILL.md, Paso 4 punto 8).
+
+Indexa los documentos del libro interno en un dict por (Tipo Doc, folio, RUT,
+registro) y recorre el RCV una vez: cada documento se busca en O(1). El
+registro (débito, crédito o retención, de LINEAS_INFO) separa ventas de
+compras: una factura emitida y una recibida con el mismo tipo, folio y RUT
+son documentos distintos. Tiempo lineal en el total de filas (500k por lado
+en segundos), sin comparar todos contra todos.
+
+Informa por línea del F29:
+    falta_en_libro   — está en el RCV y no en el libro interno (falta registrarlo)
+    falta_en_rcv     — está en el libro y no en el RCV del período (¿emisión tardía?)
+    diferencia_monto — está en ambos con neto/IVA/exento/total distintos
+    linea_distinta   — está en ambos, pero clasificado en otra línea
+    duplicado        — la misma llave aparece dos veces en una fuente
+
+El RCV manda: las diferencias se informan, no se corrigen. `notas()` entrega
+las alertas en el formato de datos["notas"] para la hoja "Alertas y Notas".
+
+Uso:
+    from scripts.conciliacion_f29 import conciliar
+    res = conciliar(datos["documentos"], libro)      # {linea_*: [docs]} o (linea, doc)
+    print(res.resumen())
+    datos.setdefault("notas", []).extend(res.notas())
+
+    python -m scripts.conciliacion_f29 --rcv-ventas rcv_v.csv --libro-ventas ventas.csv
+"""
+
+import argparse
+import gc
+import json
+import sys
+from itertools import chain
+from operator import attrgetter
+
+from scripts.calculo_f29 import (
+    ALIAS_MONTOS, CAMPOS_AGREGADOS, LINEAS_INFO, Documento, formato_peso, montos_documento,
+)
+from scripts.rcv_f29 import TIPOS_COMPRAS, TIPOS_VENTAS, iterar_documentos
+
+TIPOS_DISCREPANCIA = ("falta_en_libro", "falta_en_rcv", "diferencia_monto", "linea_distinta", "duplicado")
+
+# Tipo Doc por defecto de cada línea, para documentos que no traen tipo_doc
+TIPO_POR_LINEA = {}
+for _tipos in (TIPOS_VENTAS, TIPOS_COMPRAS):
+    for _tipo, _lk in _tipos.items():
+        TIPO_POR_LINEA.setdefault(_lk, _tipo)
+
+
+def _rut(valor):
+    """RUT comparable: sin puntos, guion ni ceros a la izquierda; K mayúscula."""
+    return str(valor or "").replace(".", "").replace("-", "").replace(" ", "").upper().lstrip("0")
+
+
+def _folio(valor):
+    if type(valor) is int:
+        return str(valor)
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor if valor is not None else "").strip().lstrip("0")
+
+
+_MONTOS_DOCUMENTO = attrgetter(*CAMPOS_AGREGADOS)
+_REGISTRO = {lk: info["seccion"] for lk, info in LINEAS_INFO.items()}
+
+
+def _extraer(lk, doc, ruts):
+    """(llave, montos) de un documento. `ruts` memoiza la normalización de RUT (se repiten mucho)."""
+    if isinstance(doc, Documento):
+        tipo, numero, rut = doc.tipo_doc, doc.numero, doc.rut
+        montos = _MONTOS_DOCUMENTO(doc)
+    else:
+        g = doc.get
+        tipo, numero, rut = g("tipo_doc"), g("numero"), g("rut")
+        if lk in ALIAS_MONTOS:
+            m = montos_documento(doc, lk)
+            montos = tuple(m[c] for c in CAMPOS_AGREGADOS)
+        else:
+            montos = (g("neto") or 0, g("iva") or 0, g("exento") or 0, g("total") or 0)
+    if tipo is None:
+        tipo = TIPO_POR_LINEA.get(lk)
+    r = ruts.get(rut)
+    if r is None:
+        r = ruts[rut] = _rut(rut)
+    return (int(tipo) if tipo is not None else None, _folio(numero), r, _REGISTRO.get(lk)), montos
+
+
+def _pares(fuente):
+    """(línea, documento) desde {linea: docs} o desde un iterable de pares."""
+    if isinstance(fuente, dict):
+        return ((lk, doc) for lk, docs in fuente.items() for doc in docs)
+    return iter(fuente)
+
+
+class Conciliacion:
+    """Resultado de conciliar: conteos y discrepancias por línea."""
+
+    def __init__(self):
+        self.por_linea = {}
+
+    def _linea(self, lk):
+        linea = self.por_linea.get(lk)
+        if linea is None:
+            linea = self.por_linea[lk] = {"rcv": 0, "libro": 0, "coinciden": 0,
+                                          **{t: [] for t in TIPOS_DISCREPANCIA}}
+        return linea
+
+    def _anotar(self, lk, tipo, llave, **detalle):
+        self._linea(lk)[tipo].append({"tipo_doc": llave[0], "folio": llave[1], "rut": llave[2], **detalle})
+
+    @property
+    def cuadra(self):
+        return not any(linea[t] for linea in self.por_linea.values() for t in TIPOS_DISCREPANCIA)
+
+    def resumen(self):
+        """{linea: {"rcv", "libro", "coinciden", <tipo>: cantidad}}"""
+        return {lk: {k: (len(v) if isinstance(v, list) else v) for k, v in linea.items()}
+                for lk, linea in sorted(self.por_linea.items(), key=lambda kv: _orden_linea(kv[0]))}
+
+    def notas(self, max_folios=5):
+        """Alertas (tipo, mensaje) para datos["notas"]; una por línea y tipo de discrepancia."""
+        textos = {
+            "falta_en_libro": "en el RCV y no en el libro interno (falta registrarlos)",
+            "falta_en_rcv": "en el libro interno y no en el RCV del período (¿emitidos en otro mes?)",
+            "diferencia_monto": "con montos distintos entre RCV y libro interno (el RCV manda)",
+            "linea_distinta": "clasificados en otra línea en el libro interno",
+            "duplicado": "repetidos (mismo tipo, folio y RUT)",
+        }
+        notas = []
+        for lk, linea in sorted(self.por_linea.items(), key=lambda kv: _orden_linea(kv[0])):
+            nombre = LINEAS_INFO.get(lk, {}).get("linea", lk)
+            for tipo in TIPOS_DISCREPANCIA:
+                docs = linea[tipo]
+                if not docs:
+                    continue
+                folios = ", ".join(str(d["folio"]) for d in docs[:max_folios])
+                mas = "…" if len(docs) > max_folios else ""
+                msg = f"Línea {nombre}: {len(docs)} documento(s) {textos[tipo]}. Folios: {folios}{mas}"
+                if tipo == "diferencia_monto":
+                    # Montos en orden CAMPOS_AGREGADOS: neto, iva, exento, total
+                    neto = sum(d["rcv"][0] - d["libro"][0] for d in docs)
+                    iva = sum(d["rcv"][1] - d["libro"][1] for d in docs)
+                    msg += f". RCV − libro: neto {formato_peso(neto)}, IVA {formato_peso(iva)}"
+                notas.append(("CONCILIACIÓN", msg))
+        return notas
+
+    def a_dict(self):
+        return {lk: dict(linea) for lk, linea in self.por_linea.items()}
+
+
+def _orden_linea(lk):
+    try:
+        return int(lk.rsplit("_", 1)[1])
+    except (IndexError, ValueError):
+        return 10 ** 6
+
+
+def conciliar(rcv, libro, tolerancia=1):
+    """
+    Cruza los documentos del RCV con los del libro interno. Cada fuente es
+    {linea_*: iterable de documentos} (dict o Documento) o un iterable de
+    (linea, documento). Los montos se comparan campo a campo (neto, iva,
+    exento, total) con `tolerancia` pesos de diferencia (redondeos).
+    """
+    # Millones de tuplas nuevas y ningún ciclo: el GC solo recorrería el índice una y otra vez
+    gc_activo = gc.isenabled()
+    gc.disable()
+    try:
+        return _conciliar(rcv, libro, tolerancia)
+    finally:
+        if gc_activo:
+            gc.enable()
+
+
+def _conciliar(rcv, libro, tolerancia):
+    res = Conciliacion()
+    ruts = {}
+
+    # Índice del libro: llave → [línea, montos, visto en RCV]
+    indice = {}
+    for lk, doc in _pares(libro):
+        llave, montos = _extraer(lk, doc, ruts)
+        res._linea(lk)["libro"] += 1
+        if llave in indice:
+            res._anotar(lk, "duplicado", llave, fuente="libro")
+            continue
+        indice[llave] = [lk, montos, False]
+
+    vistos_rcv = set()
+    for lk, doc in _pares(rcv):
+        llave, montos_rcv = _extraer(lk, doc, ruts)
+        linea = res._linea(lk)
+        linea["rcv"] += 1
+        if llave in vistos_rcv:
+            res._anotar(lk, "duplicado", llave, fuente="rcv")
+            continue
+        vistos_rcv.add(llave)
+        entrada = indice.get(llave)
+        if entrada is None:
+            res._anotar(lk, "falta_en_libro", llave, rcv=montos_rcv)
+            continue
+        entrada[2] = True
+        lk_libro, montos_libro, _ = entrada
+        if lk_libro != lk:
+            res._anotar(lk, "linea_distinta", llave, linea_libro=lk_libro)
+        elif montos_rcv != montos_libro and any(
+                abs(a - b) > tolerancia for a, b in zip(montos_rcv, montos_libro)):
+            res._anotar(lk, "diferencia_monto", llave, rcv=montos_rcv, libro=montos_libro)
+        else:
+            linea["coinciden"] += 1
+
+    for llave, (lk, montos, visto) in indice.items():
+        if not visto:
+            res._anotar(lk, "falta_en_rcv", llave, libro=montos)
+    return res
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Concilia el RCV del SII con los libros internos.")
+    for registro in ("ventas", "compras"):
+        p.add_argument(f"--rcv-{registro}", action="append", default=[], help=f"Export RCV de {registro}")
+        p.add_argument(f"--libro-{registro}", action="append", default=[], help=f"Libro interno de {registro}")
+    p.add_argument("--tolerancia", type=int, default=1, help="Pesos de diferencia tolerados por monto")
+    p.add_argument("--json", help="Guardar el detalle de discrepancias en este archivo")
+    args = p.parse_args(argv)
+
+    def fuente(prefijo):
+        return chain.from_iterable(
+            iterar_documentos(path, registro)
+            for registro in ("ventas", "compras")
+            for path in getattr(args, f"{prefijo}_{registro}"))
+
+    res = conciliar(fuente("rcv"), fuente("libro"), args.tolerancia)
+    for lk, r in res.resumen().items():
+        difs = "  ".join(f"{t}={r[t]}" for t in TIPOS_DISCREPANCIA if r[t])
+        print(f"{lk:<10} rcv={r['rcv']:<8} libro={r['libro']:<8} coinciden={r['coinciden']:<8} {difs}")
+    for _, msg in res.notas():
+        print(f"  - {msg}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res.a_dict(), f, ensure_ascii=False, indent=1)
+    return 0 if res.cuadra else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
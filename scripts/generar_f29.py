@@ -10,11 +10,43 @@ Layout de 15 columnas (A-O) que permite representar la sección PPM con sus
 Uso:
     from scripts.generar_f29 import generar_f29_excel
     generar_f29_excel(datos, output_path)
+    codigos, contenido = generar_f29_bytes(datos)
 """
 
+import io
+import os
+import re
+import sys
+import time
+import tracemalloc
+import zipfile
+from contextlib import contextmanager
+from copy import copy
+from decimal import Decimal
+
 import openpyxl
+from openpyxl.cell.cell import Cell, MergedCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet.cell_range import MultiCellRange
+
+if __package__ in (None, ""):
+    # Ejecutado como script suelto (python scripts/generar_f29.py): hace visible `scripts`
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tablas y cálculo viven en calculo_f29 (sin openpyxl); se re-exportan aquí
+from scripts.calculo_f29 import (
+    MESES, formato_peso, L_DEB_INFO, L_DEB_GENERA, L_CRED_SIN, L_CRED_INT, L_CRED_IMP,
+    L_CRED_REM, L_CRED_IEPD, L_CRED_OTROS, L_POST_51, L_POST_CUOTAS, L_RET, L_PPM,
+    PPM_LINE69_CODES, PPM_MULTI, L_TRIB_SIMP, L_ART37, L_ART42_DEB, L_ART42_CRED,
+    L_ANTICIPO_CS, L_CS_AGENTE, L_CS_ESPECIAL, L_VENTA_REMOTA, L_CRED_ESP,
+    L_REM_CRED_ESP, ALL_CRED_LINES, LINEAS_INFO, ColumnasDocumentos, CAMPOS_AGREGADOS,
+    ALIAS_MONTOS, Documento, ALIAS_DOCUMENTO, compactar_documentos, montos_documento,
+    agregar_documentos, IVA_TASA, LINEAS_DOC_DEBITO, LINEAS_DOC_CREDITO, LINEAS_DOC_SIN_CREDITO,
+    LINEAS_DOC_RETENCION, LINEAS_BASE_PPM, calcular_f29, datos_desde_json, tasa_honorarios,
+)
+from scripts.indice_f29 import CELDAS_CODIGOS, FILAS_F29, diferencias_layout
 
 # ============================================================
 # Estilos — Colores exactos del F29 en sii.cl (f29.html)
@@ -74,234 +106,6 @@ COL_WIDTHS = [
     ('M', 4), ('N', 16), ('O', 3),
 ]
 
-MESES = {
-    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
-    5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
-    9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-}
-
-
-def formato_peso(v):
-    if v is None or v == 0:
-        return "$0"
-    if isinstance(v, float):
-        v = int(v)
-    if v < 0:
-        return f"-${abs(v):,}".replace(",", ".")
-    return f"${v:,}".replace(",", ".")
-
-# ============================================================
-# Datos de líneas del F29
-# ============================================================
-
-L_DEB_INFO = [
-    (1, 'Exportaciones', 585, 20, None),
-    (2, 'Ventas y/o Servicios prestados Exentos, o No Gravados del giro', 586, 142, None),
-    (3, 'Ventas con retención sobre el margen de comercialización (contribuyentes retenidos)', 731, 732, None),
-    (4, 'Ventas y/o Servicios prestados exentos o No Gravados que no son del giro', 714, 715, None),
-    (5, 'Facturas de Compra recibidas con retención total (contribuyentes retenidos) y Factura de Inicio emitida', 515, 587, None),
-    (6, 'Facturas de compras recibidas con retención parcial (Total neto)', None, 720, None),
-]
-
-L_DEB_GENERA = [
-    (7, 'Facturas emitidas por ventas y servicios del giro, o por cuenta de terceros', 503, 502, '+'),
-    (8, 'Facturas emitidas por la venta de bienes inmuebles afectas a IVA', 763, 764, '+'),
-    (9, 'Facturas y Notas de Débitos por ventas y servicios que no son del giro (activo fijo y otros)', 716, 717, '+'),
-    (10, 'Boletas', 110, 111, '+'),
-    (11, 'Comprobantes o Recibos de Pago generados en transacciones pagadas a través de medios electrónicos', 758, 759, '+'),
-    (12, 'Notas de Débito emitidas asociadas al giro y ND recibidas de terceros por retención parcial de cambio de sujeto', 512, 513, '+'),
-    (13, 'Notas de Crédito emitidas por Facturas asociadas al giro y NC recibidas de terceros por retención parcial de cambio de sujeto', 509, 510, '-'),
-    (14, 'Notas de Crédito emitidas por Vales de máquinas autorizadas por el Servicio', 708, 709, '-'),
-    (15, 'Notas de Crédito emitidas por ventas y servicios que no son del giro (activo fijo y otros)', 733, 734, '-'),
-    (16, 'Facturas de Compra recibidas con retención parcial (contribuyentes retenidos)', 516, 517, '+'),
-    (17, 'Liquidación y Liquidación Factura', 500, 501, '+'),
-    (18, 'Adiciones al Débito Fiscal del mes por Art.27 bis', None, 154, '+'),
-    (19, 'Restitución Adicional Art.27 bis, inc.2º (Ley 19.738)', None, 518, '+'),
-    (20, 'Reintegro Impuesto de Timbres y Estampillas, Art. 3º Ley Nº 20.259 e IVA Arrendamiento esporádico BBII Amoblados', None, 713, '+'),
-    (21, 'Adiciones al Débito por IEPD Ley 20.765', 738, 741, '+'),
-    (22, 'Restitución Adicional Reembolso Remanente CF IVA (Ley 21.256)', None, 791, '+'),
-]
-
-L_CRED_SIN = [
-    (25, 'Internas afectas', 564, 521, None),
-    (26, 'Importaciones', 566, 560, None),
-    (27, 'Internas exentas, o no gravadas', 584, 562, None),
-]
-
-L_CRED_INT = [
-    (28, 'Facturas recibidas del giro y Facturas de compra emitidas', 519, 520, '+'),
-    (29, 'Facturas recibidas de Proveedores: Supermercados y Comercios similares, Art.23 Nº4 D.L.825 (Ley Nº20.780)', 761, 762, '+'),
-    (30, 'Facturas recibidas por Adquisición o Construcción de Bienes Inmuebles, Art.8º transitorio (Ley Nº20.780)', 765, 766, '+'),
-    (31, 'Facturas activo fijo', 524, 525, '+'),
-    (32, 'Notas de Crédito recibidas y NC emitidas por retención de cambio de sujeto', 527, 528, '-'),
-    (33, 'Notas de Débito recibidas y ND emitidas por retención de cambio de sujeto', 531, 532, '+'),
-]
-
-L_CRED_IMP = [
-    (34, 'Declaraciones de Ingreso (DIN) importaciones del giro', 534, 535, '+'),
-    (35, 'Declaraciones de Ingreso (DIN) importaciones de activo fijo', 536, 553, '+'),
-]
-
-L_CRED_REM = [
-    (36, 'Remanente Crédito Fiscal mes anterior', None, 504, '+'),
-    (37, 'Devolución Solicitud Art. 36 (Exportadores)', None, 593, '-'),
-    (38, 'Devolución Solicitud Art. 27 bis (Activo fijo)', None, 594, '-'),
-    (39, 'Certificado Imputación Art. 27 bis (Activo fijo)', None, 592, '-'),
-    (40, 'Devolución Solicitud Art. 3º (Cambio de Sujeto)', None, 539, '-'),
-    (41, 'Devolución Solicitud Ley Nº 20.258 (Generadoras Eléctricas)', None, 718, '-'),
-    (42, 'Devolución Solicitud Reembolso Remanente de Crédito Fiscal IVA', None, 790, '-'),
-    (43, 'Monto Reintegrado por Devolución Indebida de Crédito Fiscal D.S. 348 (Exportadores)', None, 164, '+'),
-]
-
-L_CRED_IEPD = [
-    (44, 'Recuperación de Impuesto Específico al Petróleo Diesel (Art. 7º Ley 18.502, Arts.1º y 3º D.S. Nº 311/86)', 730, 127, '+'),
-    (45, 'Recuperación Imp. Específico Petróleo Diesel Transportistas de Carga (Art. 2º Ley Nº19.764)', 729, 544, '+'),
-]
-
-L_CRED_OTROS = [
-    (46, 'Crédito del Art.11º Ley 18.211 (Zona Franca de Extensión)', None, 523, '+'),
-    (47, 'Crédito por Impuesto de Timbres y Estampillas, Art. 3º Ley Nº 20.259', None, 712, '+'),
-    (48, 'Crédito por IVA restituido a aportantes sin domicilio ni residencia en Chile (Art. 83, Ley 20.712)', None, 757, '+'),
-]
-
-L_POST_51 = [(51, 'Saldo de IVA postergado en 12 cuotas', 772, 775, '+')]
-
-L_POST_CUOTAS = [
-    (52, 'Monto Total de IVA postergado', 777, 780, '+'),
-    (53, 'Monto total IVA postergado (Ley 20.780)', 782, 783, '+'),
-    (54, 'Monto total IVA postergado (Ley 21.207)', 784, 785, '+'),
-    (55, 'Monto Total IVA postergado (DIN)', 786, 787, '+'),
-    (56, 'Monto Total IVA postergado (Tributación Simplificada)', 788, 789, '+'),
-    (57, 'Restitución de devolución Art. 27 ter D.L. 825, inc. 2º (Ley Nº 20.720)', None, 760, '+'),
-    (58, 'Certificado Imputación Art. 27 ter D.L. 825, inc. 1º (Ley Nº 20.720)', None, 767, '-'),
-]
-
-L_RET = [
-    (59, 'Retención Imp. Primera Categoría por rentas de capitales mobiliarios del Art.20 Nº2, según Art.73 LIR', None, 50, '+'),
-    (60, 'Retención Impuesto Único a los Trabajadores, según Art. 74 Nº 1 LIR', 751, 48, '+'),
-    (61, 'Retención de Impuesto con tasa del 15.25% sobre las rentas del Art. 42 Nº2, según Art. 74 Nº2 LIR', None, 151, '+'),
-    (62, 'Retención de Impuesto con tasa del 10% sobre las rentas del Art. 48, según Art. 74 N° 3 LIR', None, 153, '+'),
-    (63, 'Retención sobre rentas del Art. 42 N°1 LIR con tasa del 3%', None, 49, '+'),
-    (64, 'Retención sobre rentas del Art. 42 N°2 LIR con tasa del 3%', None, 155, '+'),
-    (65, 'Retención a Suplementeros, según Art. 74 N°5 (tasa 0,5%) LIR', None, 54, '+'),
-    (66, 'Retención por compra de productos mineros, según Art. 74 N° 6 LIR', None, 56, '+'),
-    (67, 'Retención sobre rescates y seguros dotales del N° 3 del Art.17 LIR (tasa 15%)', None, 588, '+'),
-    (68, 'Retención sobre retiros de Ahorro Previsional Voluntario del Art. 42 bis LIR (tasa 15%)', None, 589, '+'),
-]
-
-# PPM: L_PPM keeps cq/ca for formula builder (_bf uses ca only)
-# Extra codes for multi-column lines are handled in the renderer
-L_PPM = [
-    (69, '1ra Categoría Art. 84 a) y 14 D N° 3 letra (k) y 8 letra (a) numeral (viii)', 750, 62, '+'),
-    (70, '1ra Cat. Art. 84 a) tasa 3%, reintegro préstamo tasa 0%', None, 156, '+'),
-    (71, 'Mineros, Art.84 a)', 565, 123, '+'),
-    (72, 'Explotador Minero Art. 84 h)', 700, 703, '+'),
-    (73, 'Explotador Minero Royalty Ley 21.591', 806, 810, '+'),
-    (74, 'Transportistas acogidos a Renta Presunta, Art 84, e) y f) (tasa de 0,3%)', None, 66, '+'),
-    (75, 'Crédito Capacitación, Ley 19.518/97', 721, 723, '-'),
-    (76, '2da. Categoría Art. 84, b) (tasa 15.25%)', None, 152, '+'),
-    (77, '2da. Cat. Art. 84 b) LIR tasa 3%', None, 157, '+'),
-    (78, 'Taller artesanal Art.84, c) (tasa de 1,5% o 3%)', None, 70, '+'),
-    (79, 'Renta Líquida Provisional inciso final de la letra a) del art 84 de la LIR, Ley N° 21.210', None, 776, '+'),
-]
-
-# Multi-column PPM: codes for columns E-N (line 69) or F-N (lines 71-73)
-# Line 69: 6 pairs in cols C-N: [750, 30, 563, 115, 68, 62]
-# Lines 71-73: 5 pairs in cols E-N: [base, base_imp, tasa, credito, ppm_calc]
-PPM_LINE69_CODES = [750, 30, 563, 115, 68, 62]
-PPM_MULTI = {
-    71: [565, 120, 542, 122, 123],
-    72: [700, 701, 702, 711, 703],
-    73: [806, 807, 808, 809, 810],
-}
-
-L_TRIB_SIMP = [
-    (81, 'Ventas del período', None, 529, None),
-    (82, 'Crédito del período', None, 530, None),
-    (83, 'IVA determinado por concepto de Tributación Simplificada', None, 409, '+'),
-]
-
-L_ART37 = [
-    (84, 'Letras e), h), i), l) (tasa 15%)', None, 522, '+'),
-    (85, 'Letra j) (tasa 50%)', None, 526, '+'),
-    (86, 'Débito de Impuesto Adicional Ventas Art. 37 letras a), b) y c) y Art. 40 D.L.825 (tasa 15%)', None, 113, '+'),
-    (87, 'Crédito de Impuesto Adicional Art.37 letras a), b) y c) D.L. 825', None, 28, '-'),
-    (88, 'Monto reintegrado por devolución indebida de crédito por exportadores D.L. 825', None, 548, '-'),
-    (89, 'Remanente crédito Art. 37 mes anterior D.L.825', None, 540, '-'),
-    (90, 'Devolución Solicitud Art.36 relativa al Imp. Adicional Art.37 letras a), b) y c) D.L. 825', None, 541, '+'),
-]
-
-L_ART42_DEB = [
-    (92, 'Pisco, Licores, Whisky y Aguardiente (tasa 31,5%)', None, 577, '+'),
-    (93, 'Vinos, Champaña, Chichas (tasa 20,5%)', None, 32, '+'),
-    (94, 'Cervezas (tasa 20,5%)', None, 150, '+'),
-    (95, 'Bebidas analcohólicas (tasa 10%)', None, 146, '+'),
-    (96, 'Bebidas analcohólicas elevado contenido azúcares (tasa 18%)', None, 752, '+'),
-    (97, 'Notas de Débito emitidas', None, 545, '+'),
-    (98, 'Notas de Crédito emitidas por Facturas', None, 546, '-'),
-    (99, 'Notas de Crédito emitidas por Vales de máquinas autorizadas por el Servicio', None, 710, '-'),
-]
-
-L_ART42_CRED = [
-    (101, 'Pisco, Licores, Whisky y Aguardiente (tasa 31,5%)', 575, 576, '+'),
-    (102, 'Vinos, Champaña, Chichas (tasa 20,5%)', 574, 33, '+'),
-    (103, 'Cervezas (tasa 20,5%)', 580, 149, '+'),
-    (104, 'Bebidas analcohólicas (tasa 10%)', 582, 85, '+'),
-    (105, 'Bebidas analcohólicas elevado contenido azúcares (tasa 18%)', 753, 754, '+'),
-    (106, 'Notas de Débito recibidas', None, 551, '+'),
-    (107, 'Notas de Crédito recibidas', None, 559, '-'),
-    (108, 'Remanente crédito Art.42 mes anterior', None, 508, '+'),
-    (109, 'Devolución Art. 36 D.L.825 relativas impuesto Art.42', None, 533, '-'),
-    (110, 'Monto reintegrado devoluciones indebidas de crédito por exportaciones', None, 552, '+'),
-]
-
-L_ANTICIPO_CS = [
-    (113, 'IVA anticipado del período', None, 556, '+'),
-    (114, 'Remanente del mes anterior', None, 557, '+'),
-    (115, 'Devolución del mes anterior', None, 558, '-'),
-]
-
-L_CS_AGENTE = [
-    (118, 'IVA total retenido a terceros (tasa Art. 14 DL 825)', None, 39, '+'),
-    (119, 'IVA parcial retenido a terceros (según tasa)', None, 554, '+'),
-    (120, 'IVA Retenido por notas de crédito emitidas', None, 736, '-'),
-    (121, 'Retención de margen de comercialización', None, 597, '+'),
-    (122, 'Retención Anticipo de Cambio de Sujeto', 555, 596, '+'),
-]
-
-L_CS_ESPECIAL = [
-    (123, 'IVA retenido a terceros con retención total en el período', None, 100, '+'),
-    (124, 'Ajustes por concepto de IVA asociado a reversiones y contracargos (disputas) solucionadas en el período', None, 101, '-'),
-    (125, 'Valor nominal del remanente de ajuste (código 104 del período anterior)', None, 102, '-'),
-]
-
-L_VENTA_REMOTA = [
-    (128, 'IVA total del periodo por la venta remota de bienes corporales muebles', None, 811, '+'),
-    (129, 'Ajustes por concepto de IVA asociado a reversiones y contracargos solucionados en el período', None, 812, '-'),
-    (130, 'Valor nominal del remanente de ajuste (código [815] del período anterior)', None, 813, '-'),
-]
-
-L_CRED_ESP = [
-    (134, 'Crédito por Sistemas Solares Térmicos, Ley 20.365', 725, 727, '-'),
-    (135, 'Imputación del Pago Patente Aguas Ley 20.017', 704, 706, '-'),
-    (136, 'Cotización Adicional Ley 18.566', 160, 570, '-'),
-    (137, 'Crédito Especial Empresas Constructoras', 126, 571, '-'),
-    (138, 'Recup. Peajes Transportistas Pasajeros, Ley 19.764', 572, 590, '-'),
-    (139, 'Crédito por desembolsos directos trazabilidad', 768, 770, '-'),
-]
-
-L_REM_CRED_ESP = [
-    (141, 'Remanente Crédito por Sistemas Solares Térmicos, Ley 20.365', None, 728, None),
-    (142, 'Remanente periodo siguiente Patente Aguas, Ley 20.017', None, 707, None),
-    (143, 'Remanente de Cotización Adicional Ley 18.566', None, 73, None),
-    (144, 'Remanente Crédito Especial Empresas Constructoras', None, 130, None),
-    (145, 'Remanente Recup. de Peajes Trans. Pasajeros Ley 19.764', None, 591, None),
-    (146, 'Remanente Crédito por desembolsos directos trazabilidad', None, 771, None),
-]
-
-ALL_CRED_LINES = L_CRED_INT + L_CRED_IMP + L_CRED_REM + L_CRED_IEPD + L_CRED_OTROS
-
-
 # ============================================================
 # Helpers — apply fills/borders to all cols in a row
 # ============================================================
@@ -573,11 +377,11 @@ def _ppm_line69(ws, r, cod, cc):
         cc[code] = f"{get_column_letter(col)}{r}"
         v = cod.get(code, 0)
         if is_last:
-            # Code 62 (PPM Neto) = Base Imponible × Tasa / 100
+            # Code 62 (PPM Neto) = Base Imponible × Tasa / 100 − Crédito / Tope Suspensión (68)
             base_ref = cc.get(563, '')
             tasa_ref = cc.get(115, '')
             if base_ref and tasa_ref:
-                c_val.value = f"=ROUND({base_ref}*{tasa_ref}/100,0)"
+                c_val.value = f"=ROUND({base_ref}*{tasa_ref}/100,0)-{cc[68]}"
             elif v:
                 c_val.value = v
             c_val.number_format = NF
@@ -636,430 +440,80 @@ def _ppm_multi_line(ws, r, num, desc, codes, cod, cc):
     return r + 1
 
 
-# ============================================================
-# Cálculo del F29
-# ============================================================
-
-def calcular_f29(datos):
-    """Calcula códigos del F29 desde datos."""
-    if "codigos" in datos:
-        codigos = dict(datos["codigos"])
-        for k in [538, 537, 89, 77, 595, 547, 91, 62]:
-            codigos.setdefault(k, 0)
-        return codigos
-
-    v = datos.get("ventas", {})
-    c = datos.get("compras", {})
-    ret = datos.get("retenciones", {})
-    ppm = datos.get("ppm", {})
-    dev = datos.get("devoluciones", {})
-    docs = datos.get("documentos", {})
-    cs = datos.get("cambio_sujeto", {})
-    IVA_TASA = 0.19
-    codigos = {}
-
-    def has_docs(lk): return lk in docs and len(docs[lk]) > 0
-    def count_docs(lk): return len(docs.get(lk, []))
-    def sum_field(lk, campo): return sum(d.get(campo, 0) for d in docs.get(lk, []))
-
-    for cq, ca, lk, fc, fn, is_iva in [
-        (585, 20, "linea_1", "facturas_exportacion_cant", "facturas_exportacion_neto", False),
-        (586, 142, "linea_2", "facturas_exentas_giro_cant", "facturas_exentas_giro_neto", False),
-        (515, 587, "linea_5", "facturas_compra_digital_cant", "facturas_compra_digital_neto", False),
-        (503, 502, "linea_7", "facturas_afectas_cant", "facturas_afectas_neto", True),
-        (716, 717, "linea_9", "ventas_activo_fijo_cant", "ventas_activo_fijo_neto", True),
-        (110, 111, "linea_10", "boletas_cant", "boletas_neto", True),
-        (512, 513, "linea_12", "notas_debito_cant", "notas_debito_neto", True),
-        (509, 510, "linea_13", "notas_credito_cant", "notas_credito_neto", True),
-    ]:
-        if has_docs(lk):
-            codigos[cq] = count_docs(lk)
-            codigos[ca] = sum_field(lk, "iva") if is_iva else sum_field(lk, "neto")
-            if is_iva and not codigos[ca]:
-                codigos[ca] = int(sum_field(lk, "neto") * IVA_TASA)
-        else:
-            codigos[cq] = v.get(fc, c.get(fc, 0))
-            codigos[ca] = int(v.get(fn, 0) * IVA_TASA) if is_iva else v.get(fn, c.get(fn, 0))
-
-    for k in [731, 732, 714, 715, 720, 763, 764, 758, 759, 708, 709, 733, 734,
-              516, 517, 500, 501, 154, 518, 713, 738, 741, 791]:
-        codigos.setdefault(k, 0)
-
-    codigos[538] = sum(codigos.get(ca, 0) * (1 if op == '+' else -1)
-                       for _, _, _, ca, op in L_DEB_GENERA if op in ('+', '-'))
-
-    for cq, ca, lk, fc, fi in [
-        (519, 520, "linea_28", "facturas_giro_cant", "facturas_giro_iva"),
-        (524, 525, "linea_31", "facturas_activo_fijo_cant", "facturas_activo_fijo_iva"),
-        (527, 528, "linea_32", "notas_credito_recibidas_cant", "notas_credito_recibidas_iva"),
-        (531, 532, "linea_33", "notas_debito_recibidas_cant", "notas_debito_recibidas_iva"),
-        (534, 535, "linea_34", "din_giro_cant", "din_giro_iva"),
-        (536, 553, "linea_35", "din_activo_fijo_cant", "din_activo_fijo_iva"),
-    ]:
-        if has_docs(lk):
-            codigos[cq] = count_docs(lk)
-            codigos[ca] = sum_field(lk, "iva")
-        else:
-            codigos[cq] = c.get(fc, 0)
-            codigos[ca] = c.get(fi, 0)
-
-    for k in [761, 762, 765, 766, 564, 521, 566, 560, 730, 127, 729, 544]:
-        codigos.setdefault(k, 0)
-    codigos.setdefault(584, c.get("exentas_sin_derecho_cant", 0))
-    codigos.setdefault(562, c.get("exentas_sin_derecho_neto", 0))
-    codigos[511] = codigos.get(519, 0) + codigos.get(524, 0)
-    codigos[514] = codigos.get(520, 0) + codigos.get(525, 0)
-    codigos[504] = datos.get("remanente_anterior", 0)
-    codigos[593] = dev.get("art_36_exportador", 0)
-    codigos[594] = dev.get("art_27_bis", 0)
-    codigos[592] = dev.get("certificado_27_bis", 0)
-    codigos[539] = dev.get("cambio_sujeto", 0)
-    for k in [718, 790, 164, 523, 712, 757]:
-        codigos.setdefault(k, 0)
-
-    codigos[537] = sum(codigos.get(ca, 0) * (1 if op == '+' else -1)
-                       for _, _, _, ca, op in ALL_CRED_LINES if op in ('+', '-'))
-
-    td, tc = codigos[538], codigos[537]
-    codigos[89] = max(td - tc, 0)
-    codigos[77] = max(tc - td, 0)
-
-    codigos.setdefault(50, 0)
-    if has_docs("linea_60"):
-        codigos[48] = sum(d.get("iusc", d.get("iva", 0)) for d in docs["linea_60"])
-    else:
-        codigos[48] = ret.get("iusc_impuesto", 0)
-    if has_docs("linea_61"):
-        codigos[151] = sum(d.get("retencion", d.get("iva", 0)) for d in docs["linea_61"])
-    else:
-        codigos[151] = ret.get("honorarios_retencion", 0)
-    codigos[153] = ret.get("directores_retencion", 0)
-    for k in [49, 155, 54, 56, 588, 589, 751]:
-        codigos.setdefault(k, 0)
-
-    tasa_ppm = ppm.get("tasa", 0.25)
-    codigos[115] = tasa_ppm
-    codigos.setdefault(750, 0)
-    codigos.setdefault(30, 0)
-    if ppm.get("base_imponible") is not None:
-        base_ppm = ppm["base_imponible"]
-    else:
-        def neto_linea(lk, fk):
-            return sum_field(lk, "neto") if has_docs(lk) else v.get(fk, 0)
-        base_ppm = (neto_linea("linea_7", "facturas_afectas_neto")
-                    + neto_linea("linea_2", "facturas_exentas_giro_neto")
-                    + neto_linea("linea_1", "facturas_exportacion_neto")
-                    + neto_linea("linea_10", "boletas_neto")
-                    + neto_linea("linea_12", "notas_debito_neto")
-                    - neto_linea("linea_13", "notas_credito_neto"))
-    codigos[563] = base_ppm
-    codigos[68] = 0
-    codigos[62] = 0 if ppm.get("suspension") else int(base_ppm * tasa_ppm / 100)
-    codigos[722] = ppm.get("remanente_sence_anterior", 0)
-    codigos[721] = ppm.get("credito_sence", 0)
-    sence = codigos[721] + codigos[722]
-    codigos[723] = min(sence, codigos[62])
-    codigos[724] = sence - codigos[723]
-
-    total_ret = sum(codigos.get(ca, 0) for _, _, _, ca, _ in L_RET)
-    ppm_neto = codigos[62] - codigos[723]
-    codigos[595] = codigos[89] + total_ret + ppm_neto
-
-    codigos[39] = cs.get("iva_retenido_total", cs.get(39, 0))
-    codigos[554] = cs.get("iva_parcial_retenido", cs.get(554, 0))
-    codigos[736] = cs.get("iva_retenido_nc", cs.get(736, 0))
-    codigos[597] = cs.get("retencion_margen", cs.get(597, 0))
-    codigos[596] = cs.get("retencion_neta", cs.get(596, 0))
-    if codigos[596] == 0 and codigos[39] > 0:
-        codigos[596] = codigos[39] + codigos.get(554, 0) - codigos[736] + codigos.get(597, 0)
-
-    codigos[547] = codigos[595] + codigos.get(596, 0)
-    codigos[91] = codigos[547]
-    codigos[92] = 0; codigos[93] = 0
-    codigos[94] = codigos[91]
-    return codigos
-
-
 # ============================================================
 # Hoja 1: Formulario F29
 # ============================================================
 
-def _write_f29(wb, codigos, enc):
+def _titulos_f29(enc):
+    """Título de la hoja y texto de la fila 2 (período, RUT, folio)."""
     mes = enc.get("periodo_mes", 1)
     anio = enc.get("periodo_anio", 2026)
-    ws = wb.active
-    ws.title = f"F29 — {MESES.get(mes)} {anio}"
-
-    for letter, width in COL_WIDTHS:
-        ws.column_dimensions[letter].width = width
-
-    cod = codigos
-    cc = {}
-    r = 1
-
-    # --- TÍTULO ---
-    ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=NCOLS)
-    ws.cell(row=r, column=1, value='DECLARACIÓN MENSUAL Y PAGO SIMULTÁNEO DE IMPUESTOS - FORMULARIO 29').font = F14B
-    ws.cell(row=r, column=1).alignment = AC
-    r += 1
-
     rut = enc.get("rut", "____________")
     folio = enc.get("folio", "____________")
-    ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=NCOLS)
-    ws.cell(row=r, column=1, value=f'Período Tributario: {mes:02d}/{anio}    RUT: {rut}    Folio: {folio}').font = F10
-    ws.cell(row=r, column=1).alignment = AC
-    for c in range(1, NCOLS + 1):
-        ws.cell(row=r, column=c).fill = FB
-    r += 1
-
-    # --- DÉBITOS Y VENTAS ---
-    r = _g(ws, r, 'DÉBITOS Y VENTAS')
-    r = _b(ws, r, 'VENTAS Y/O SERVICIOS PRESTADOS')
-    r = _b(ws, r, 'INFORMACIÓN DE INGRESOS')
-    r = _h(ws, r, 'Cantidad de Documentos', 'Monto Neto', g_label=None)
-    r = _wl(ws, r, L_DEB_INFO, cod, cc)
-
-    r = _h(ws, r, 'Cantidad de Documentos', 'Débito', b_label='GENERA DÉBITO')
-    r = _wl(ws, r, L_DEB_GENERA, cod, cc)
+    return (f"F29 — {MESES.get(mes)} {anio}",
+            f'Período Tributario: {mes:02d}/{anio}    RUT: {rut}    Folio: {folio}')
 
-    r = _fl(ws, r, 23, 'TOTAL DÉBITOS', 538, _bf(L_DEB_GENERA, cc), '=', cc, bold=True)
 
-    # --- CRÉDITOS Y COMPRAS ---
-    r = _g(ws, r, 'CRÉDITOS Y COMPRAS')
-    r = _b(ws, r, 'COMPRAS Y/O SERVICIOS UTILIZADOS')
-    r = _h(ws, r, 'Con Derecho a Crédito', 'Sin Derecho a Crédito', g_label=None)
-    r = _ln(ws, r, 24, 'IVA por documentos electrónicos recibidos', 511, 514, None, cod, cc)
-
-    r = _b(ws, r, 'SIN DERECHO A CRÉDITO FISCAL')
-    r = _h(ws, r, 'Cantidad de Documentos', 'Monto Neto', g_label=None)
-    r = _wl(ws, r, L_CRED_SIN, cod, cc)
-
-    r = _b(ws, r, 'CON DERECHO A CRÉDITO FISCAL')
-    r = _b(ws, r, 'INTERNAS')
-    r = _h(ws, r, 'Cantidad de Documentos', 'Crédito, Recuperación y Reintegro')
-    r = _wl(ws, r, L_CRED_INT, cod, cc)
-
-    r = _b(ws, r, 'IMPORTACIONES')
-    r = _wl(ws, r, L_CRED_IMP, cod, cc)
-    r = _wl(ws, r, L_CRED_REM, cod, cc)
-
-    r = _b(ws, r, 'LEY 20.765')
-    r = _h(ws, r, 'M3 Comprados con Derecho a Crédito', 'Componentes del Impuesto')
-    r = _wl(ws, r, L_CRED_IEPD, cod, cc)
-    r = _wl(ws, r, L_CRED_OTROS, cod, cc)
-
-    r = _fl(ws, r, 49, 'TOTAL CRÉDITOS', 537, _bf(ALL_CRED_LINES, cc), '=', cc, bold=True)
-
-    # --- POSTERGACIÓN DE IVA ---
-    r = _h2(ws, r, 'POSTERGACIÓN DE IVA', 'Remanente CF', 'Impuesto Determinado')
-
-    # Línea 50: dual codes (77 remanente / 89 IVA determinado)
-    ref_538 = cc.get(538, '0')
-    ref_537 = cc.get(537, '0')
-    r = _dual(ws, r, 50, 'Remanente de crédito fiscal para el período siguiente',
-              77, f'=IF({ref_537}>{ref_538},{ref_537}-{ref_538},0)',
-              89, f'=IF({ref_538}>{ref_537},{ref_538}-{ref_537},0)', '+', cc)
-
-    r = _wl(ws, r, L_POST_51, cod, cc)
-
-    # Postergación IVA en cuotas — header
-    _fill_row(ws, r, fill=FB, font=F8B, alignment=AC)
-    ws.merge_cells(start_row=r, start_column=CB, end_row=r, end_column=DESC_2CODE[1])
-    ws.cell(row=r, column=CB, value='POSTERGACIÓN IVA EN CUOTAS (D.S. 420/997 MH)')
-    ws.cell(row=r, column=CM, value='Cód')
-    ws.cell(row=r, column=CN, value='Imp. Determinado')
-    ws.cell(row=r, column=CO, value='+/-')
-    r += 1
-    r = _wl(ws, r, L_POST_CUOTAS, cod, cc)
-
-    # --- IMPUESTO A LA RENTA ---
-    r = _g(ws, r, 'IMPUESTO A LA RENTA D.L. 824/74')
-    r = _b(ws, r, 'RETENCIONES')
-    r = _h(ws, r, d_label=None, f_label='Impuesto Determinado', a_label='Línea', b_label='Descripción')
-    r = _wl(ws, r, L_RET, cod, cc)
-
-    # --- PPM ---
-    r = _b(ws, r, 'PPM')
-    r = _ppm_subheader(ws, r)
-
-    # Line 69: special 15-column layout
-    r = _ppm_line69(ws, r, cod, cc)
-
-    # Line 70: standard 1-code
-    r = _ln(ws, r, 70, '1ra Cat. Art. 84 a) tasa 3%, reintegro préstamo tasa 0%', None, 156, '+', cod, cc)
-
-    # Lines 71-73: multi-column
-    for num, desc, cq, ca, op in L_PPM[2:5]:  # lines 71, 72, 73
-        codes = PPM_MULTI.get(num)
-        if codes:
-            r = _ppm_multi_line(ws, r, num, desc, codes, cod, cc)
-        else:
-            r = _ln(ws, r, num, desc, cq, ca, op, cod, cc)
+def _suelta(ws, r, num, desc, cq, ca, op, formula, cc):
+    """Fila con código de remanente: cq en I sin valor, ca en M/N con fórmula opcional (líneas 117, 127, 132)."""
+    _fill_row(ws, r)
+    if num is not None:
+        ws.cell(row=r, column=CA, value=num).font = F8
+    ws.cell(row=r, column=CA).fill = FE; ws.cell(row=r, column=CA).alignment = AC
+    desc_cols = DESC_2CODE if cq is not None else DESC_1CODE
+    ws.merge_cells(start_row=r, start_column=desc_cols[0], end_row=r, end_column=desc_cols[1])
+    ws.cell(row=r, column=CB, value=desc).font = F8
+    ws.cell(row=r, column=CB).fill = FW; ws.cell(row=r, column=CB).alignment = AL
+    if cq is not None:
+        ws.cell(row=r, column=CI, value=cq).font = F7C
+        ws.cell(row=r, column=CI).fill = FB; ws.cell(row=r, column=CI).alignment = AC
+        cc[cq] = f"{get_column_letter(CJ)}{r}"
+    ws.cell(row=r, column=CM, value=ca).font = F7C
+    ws.cell(row=r, column=CM).fill = FB; ws.cell(row=r, column=CM).alignment = AC
+    cc[ca] = f"{get_column_letter(CN)}{r}"
+    if formula:
+        _fv(ws, r, CN, _FORMULAS[ca](cc))
+    if op:
+        ws.cell(row=r, column=CO, value=op).font = F9B
+        ws.cell(row=r, column=CO).fill = FE; ws.cell(row=r, column=CO).alignment = AC
+    return r + 1
 
-    # Lines 74-79: standard layout
-    for num, desc, cq, ca, op in L_PPM[5:]:
-        r = _ln(ws, r, num, desc, cq, ca, op, cod, cc)
 
-    # Línea 80: SUB TOTAL
+def _formula_80(cc):
+    """Línea 80: 89 más las líneas 51 a 79 según su signo."""
     line80_parts = []
     ref_89 = cc.get(89)
     if ref_89:
         line80_parts.append(ref_89)
-    for _, _, _, ca, op in L_POST_51:
-        ref = cc.get(ca)
-        if ref and op in ('+', '-'):
-            line80_parts.append(f"{op}{ref}")
-    for _, _, _, ca, op in L_POST_CUOTAS:
-        ref = cc.get(ca)
-        if ref and op in ('+', '-'):
-            line80_parts.append(f"{op}{ref}")
-    for _, _, _, ca, op in L_RET:
-        ref = cc.get(ca)
-        if ref and op in ('+', '-'):
-            line80_parts.append(f"{op}{ref}")
-    for _, _, _, ca, op in L_PPM:
-        ref = cc.get(ca)
-        if ref and op in ('+', '-'):
-            line80_parts.append(f"{op}{ref}")
+    for lines in (L_POST_51, L_POST_CUOTAS, L_RET, L_PPM):
+        for _, _, _, ca, op in lines:
+            ref = cc.get(ca)
+            if ref and op in ('+', '-'):
+                line80_parts.append(f"{op}{ref}")
     formula_80 = "=" + "".join(line80_parts)
     if formula_80.startswith("=+"):
         formula_80 = "=" + formula_80[2:]
-    r = _fl(ws, r, 80, 'Sub total impuesto determinado anverso (Suma de las líneas 50 a 78)',
-            595, formula_80, '=', cc, bold=True)
-
-    # --- TRIBUTACIÓN SIMPLIFICADA ---
-    r = _g(ws, r, 'SISTEMA DE TRIBUTACIÓN SIMPLIFICADA DEL IVA, ART. 29 D.L. 825')
-    r = _h(ws, r, d_label=None, f_label='Impuesto Determinado')
-    r = _wl(ws, r, L_TRIB_SIMP, cod, cc)
-
-    # --- IMPUESTO ADICIONAL ART. 37 ---
-    r = _g(ws, r, 'IMPUESTO ADICIONAL ART. 37 D.L. 825')
-    r = _h(ws, r, d_label=None, f_label='Impuesto Determinado')
-    r = _wl(ws, r, L_ART37, cod, cc)
-
-    # Línea 91 Art37: dual codes (549 remanente / 550 impuesto)
-    art37_formula = _bf(L_ART37, cc)
-    inner = art37_formula[1:]
-    r = _dual(ws, r, 91, 'Remanente crédito impuesto Art.37 para período siguiente',
-              549, f'=IF(({inner})>=0,{inner},0)',
-              550, f'=IF(({inner})<0,ABS({inner}),0)', '+', cc)
-
-    # --- IMPUESTO ADICIONAL ART. 42 ---
-    r = _g(ws, r, 'IMPUESTO ADICIONAL ART. 42 D.L. 825')
-    r = _h2(ws, r, 'DÉBITOS', None, 'Débito')
-    r = _wl(ws, r, L_ART42_DEB, cod, cc)
-    r = _fl(ws, r, 100, 'Total Débitos Art. 42 DL 825', 602, _bf(L_ART42_DEB, cc), '=', cc, bold=True)
-
-    r = _h2(ws, r, 'CRÉDITOS', 'Total Crédito Recargado Facturas Recibidas', 'Crédito Imputable del Periodo')
-    r = _wl(ws, r, L_ART42_CRED, cod, cc)
-    r = _fl(ws, r, 111, 'Total créditos Art.42 DL 825', 603, _bf(L_ART42_CRED, cc), '=', cc, bold=True)
-
-    # Línea 112: dual codes (507 remanente / 506 impuesto)
-    ref_602 = cc.get(602, '0')
-    ref_603 = cc.get(603, '0')
-    r = _dual(ws, r, 112, 'Remanente crédito Imp. Adic. Art.42 para período siguiente',
-              507, f'=IF({ref_602}>{ref_603},{ref_602}-{ref_603},0)',
-              506, f'=IF({ref_603}>{ref_602},{ref_603}-{ref_602},0)', '+', cc)
-
-    # --- CAMBIO DE SUJETO ---
-    r = _g(ws, r, 'CAMBIO DE SUJETO D.L. 825')
-    r = _b(ws, r, 'ANTICIPO CAMBIO DE SUJETO (CONTRIBUYENTES RETENIDOS)')
-    r = _h(ws, r, d_label=None, f_label='Monto')
-    r = _wl(ws, r, L_ANTICIPO_CS, cod, cc)
-    r = _fl(ws, r, 116, 'Total de Anticipo', 543, _bf(L_ANTICIPO_CS, cc), '=', cc, bold=True)
-
-    # Línea 117: dual codes (573 remanente / 598 anticipo)
-    ref_543 = cc.get(543, '0')
-    _fill_row(ws, r)
-    ws.cell(row=r, column=CA, value=117).font = F8
-    ws.cell(row=r, column=CA).fill = FE; ws.cell(row=r, column=CA).alignment = AC
-    ws.merge_cells(start_row=r, start_column=DESC_2CODE[0], end_row=r, end_column=DESC_2CODE[1])
-    ws.cell(row=r, column=CB, value='Remanente Anticipos Cambio Sujeto para período siguiente').font = F8
-    ws.cell(row=r, column=CB).fill = FW; ws.cell(row=r, column=CB).alignment = AL
-    ws.cell(row=r, column=CI, value=573).font = F7C
-    ws.cell(row=r, column=CI).fill = FB; ws.cell(row=r, column=CI).alignment = AC
-    cc[573] = f"{get_column_letter(CJ)}{r}"
-    ws.cell(row=r, column=CM, value=598).font = F7C
-    ws.cell(row=r, column=CM).fill = FB; ws.cell(row=r, column=CM).alignment = AC
-    cc[598] = f"{get_column_letter(CN)}{r}"
-    _fv(ws, r, CN, f'=IF({ref_543}<0,ABS({ref_543}),0)')
-    ws.cell(row=r, column=CO, value='-').font = F9B
-    ws.cell(row=r, column=CO).fill = FE; ws.cell(row=r, column=CO).alignment = AC
-    r += 1
-
-    # CAMBIO DE SUJETO (AGENTE RETENEDOR)
-    r = _b(ws, r, 'CAMBIO DE SUJETO (AGENTE RETENEDOR)')
-    r = _wl(ws, r, L_CS_AGENTE, cod, cc)
-
-    # CAMBIO ESPECIAL DE SUJETO
-    r = _b(ws, r, 'CAMBIO ESPECIAL DE SUJETO (Inciso 7º, Art. 3º D.L. 825)')
-    r = _wl(ws, r, L_CS_ESPECIAL, cod, cc)
-    r = _fl(ws, r, 126, 'Monto neto de IVA retenido en el período', 103, _bf(L_CS_ESPECIAL, cc), '=', cc, bold=True)
+    return formula_80
 
-    # Línea 127: remanente ajuste
-    _fill_row(ws, r)
-    ws.cell(row=r, column=CA, value=127).font = F8
-    ws.cell(row=r, column=CA).fill = FE; ws.cell(row=r, column=CA).alignment = AC
-    ws.merge_cells(start_row=r, start_column=DESC_1CODE[0], end_row=r, end_column=DESC_1CODE[1])
-    ws.cell(row=r, column=CB, value='Remanente de ajuste para el próximo período').font = F8
-    ws.cell(row=r, column=CB).fill = FW; ws.cell(row=r, column=CB).alignment = AL
-    ws.cell(row=r, column=CM, value=104).font = F7C
-    ws.cell(row=r, column=CM).fill = FB; ws.cell(row=r, column=CM).alignment = AC
-    cc[104] = f"{get_column_letter(CN)}{r}"
-    ref_103 = cc.get(103, '0')
-    _fv(ws, r, CN, f'=IF({ref_103}<0,ABS({ref_103}),0)')
-    ws.cell(row=r, column=CO, value='=').font = F9B
-    ws.cell(row=r, column=CO).fill = FE; ws.cell(row=r, column=CO).alignment = AC
-    r += 1
-
-    # IVA POR VENTA REMOTA
-    r = _b(ws, r, 'IVA POR LA VENTA REMOTA DE BIENES CORPORALES MUEBLES (Art. 3° bis e inciso final del art. 4°, D.L. 825)')
-    r = _wl(ws, r, L_VENTA_REMOTA, cod, cc)
-    r = _fl(ws, r, 131, 'Monto neto de IVA del período', 814, _bf(L_VENTA_REMOTA, cc), '=', cc, bold=True)
-
-    # Línea 132: remanente venta remota
-    _fill_row(ws, r)
-    ws.cell(row=r, column=CA, value=132).font = F8
-    ws.cell(row=r, column=CA).fill = FE; ws.cell(row=r, column=CA).alignment = AC
-    ws.merge_cells(start_row=r, start_column=DESC_1CODE[0], end_row=r, end_column=DESC_1CODE[1])
-    ws.cell(row=r, column=CB, value='Remanente de ajuste para el próximo período').font = F8
-    ws.cell(row=r, column=CB).fill = FW; ws.cell(row=r, column=CB).alignment = AL
-    ws.cell(row=r, column=CM, value=815).font = F7C
-    ws.cell(row=r, column=CM).fill = FB; ws.cell(row=r, column=CM).alignment = AC
-    cc[815] = f"{get_column_letter(CN)}{r}"
-    ref_814 = cc.get(814, '0')
-    _fv(ws, r, CN, f'=IF({ref_814}<0,ABS({ref_814}),0)')
-    ws.cell(row=r, column=CO, value='=').font = F9B
-    ws.cell(row=r, column=CO).fill = FE; ws.cell(row=r, column=CO).alignment = AC
-    r += 1
 
-    # IMPUESTO SUSTITUTIVO
-    r = _b(ws, r, 'IMPUESTO SUSTITUTIVO RETENIDO POR RÉGIMEN TRIBUTARIO ESPECIAL A COMERCIANTES DE FERIAS LIBRES')
-    r = _ln(ws, r, 133, 'Impuesto sustitutivo retenido por régimen tributario especial a comerciantes de ferias libres',
-            None, 816, '=', cod, cc)
-
-    # --- CRÉDITOS ESPECIALES ---
-    r = _g(ws, r, 'CRÉDITOS ESPECIALES')
-    r = _h(ws, r, 'Base / Remanente Anterior', 'Crédito del Período')
-    r = _wl(ws, r, L_CRED_ESP, cod, cc)
-
-    # --- LÍNEA 140: TOTAL DETERMINADO ---
+def _formula_140(cc):
+    """Línea 140: 595, impuestos adicionales, cambio de sujeto y créditos especiales."""
     ref_595 = cc.get(595, '0')
     ref_409 = cc.get(409, '0')
     ref_549 = cc.get(549, '0')
     ref_507 = cc.get(507, '0')
-    ref_543_2 = cc.get(543, '0')
+    ref_543 = cc.get(543, '0')
     parts_140 = [ref_595, f"+{ref_409}", f"+{ref_549}", f"+{ref_507}"]
-    parts_140.append(f"+IF({ref_543_2}>0,{ref_543_2},0)")
+    parts_140.append(f"+IF({ref_543}>0,{ref_543},0)")
     # Cambio de sujeto agente retenedor: usar solo código 596 (retención neta),
     # NO los componentes individuales (39, 554, 736, 597) que ya están sumados en 596.
     ref_596 = cc.get(596)
     if ref_596:
         parts_140.append(f"+{ref_596}")
-    ref_103_2 = cc.get(103, '0')
-    parts_140.append(f"+IF({ref_103_2}>0,{ref_103_2},0)")
-    ref_814_2 = cc.get(814, '0')
-    parts_140.append(f"+IF({ref_814_2}>0,{ref_814_2},0)")
+    ref_103 = cc.get(103, '0')
+    parts_140.append(f"+IF({ref_103}>0,{ref_103},0)")
+    ref_814 = cc.get(814, '0')
+    parts_140.append(f"+IF({ref_814}>0,{ref_814},0)")
     ref_816 = cc.get(816, '0')
     parts_140.append(f"+{ref_816}")
     for _, _, _, ca, op in L_CRED_ESP:
@@ -1069,60 +523,211 @@ def _write_f29(wb, codigos, enc):
     formula_140 = "=" + "".join(parts_140)
     if formula_140.startswith("=+"):
         formula_140 = "=" + formula_140[2:]
-    r = _fl(ws, r, 140, 'TOTAL DETERMINADO', 547, formula_140, '=', cc, bold=True)
+    return formula_140
+
+
+def _mayor(a, b):
+    """Fórmula de a − b si a > b, si no 0 (remanentes de las líneas 50 y 112)."""
+    return lambda cc: f"=IF({cc.get(a, '0')}>{cc.get(b, '0')},{cc.get(a, '0')}-{cc.get(b, '0')},0)"
+
+
+def _negativo(code):
+    """Fórmula del valor absoluto de `code` si es negativo (remanentes de las líneas 117, 127 y 132)."""
+    return lambda cc: f"=IF({cc.get(code, '0')}<0,ABS({cc.get(code, '0')}),0)"
+
+
+def _art37(cc):
+    return _bf(L_ART37, cc)[1:]
+
+
+# Fórmula de cada código calculado de FILAS_F29, a partir del mapa cc de las filas ya escritas
+_FORMULAS = {
+    538: lambda cc: _bf(L_DEB_GENERA, cc),
+    537: lambda cc: _bf(ALL_CRED_LINES, cc),
+    77: _mayor(537, 538),
+    89: _mayor(538, 537),
+    595: _formula_80,
+    549: lambda cc: f"=IF(({_art37(cc)})>=0,{_art37(cc)},0)",
+    550: lambda cc: f"=IF(({_art37(cc)})<0,ABS({_art37(cc)}),0)",
+    602: lambda cc: _bf(L_ART42_DEB, cc),
+    603: lambda cc: _bf(L_ART42_CRED, cc),
+    507: _mayor(602, 603),
+    506: _mayor(603, 602),
+    543: lambda cc: _bf(L_ANTICIPO_CS, cc),
+    598: _negativo(543),
+    103: lambda cc: _bf(L_CS_ESPECIAL, cc),
+    104: _negativo(103),
+    814: lambda cc: _bf(L_VENTA_REMOTA, cc),
+    815: _negativo(814),
+    547: _formula_140,
+    91: lambda cc: f"={cc.get(547, '0')}",
+    94: lambda cc: f"={cc.get(91, '0')}+{cc.get(92, '0')}+{cc.get(93, '0')}",
+}
 
-    # --- REMANENTE CRÉDITOS ESPECIALES ---
-    r = _g(ws, r, 'REMANENTE CRÉDITOS ESPECIALES')
-    r = _h(ws, r, d_label=None, f_label='Remanente', g_label=None)
-    r = _wl(ws, r, L_REM_CRED_ESP, cod, cc)
 
-    # --- TOTAL A PAGAR ---
-    ref_547 = cc.get(547, '0')
-    r = _fl(ws, r, 147, 'TOTAL A PAGAR EN PLAZO LEGAL', 91, f'={ref_547}', '=', cc, bold=True)
-    r = _ln(ws, r, 148, 'Más IPC', None, 92, '+', cod, cc)
-    r = _ln(ws, r, 149, 'Más Intereses y multas', None, 93, '+', cod, cc)
+def _write_f29(wb, codigos, enc):
+    """Renderiza la hoja F29 en wb.active fila a fila según FILAS_F29 y devuelve el mapa código → celda."""
+    titulo, periodo = _titulos_f29(enc)
+    ws = wb.active
+    ws.title = titulo
 
-    # Condonación
-    _fill_row(ws, r)
-    ws.cell(row=r, column=CA).fill = FE; ws.cell(row=r, column=CA).alignment = AC
-    ws.merge_cells(start_row=r, start_column=DESC_1CODE[0], end_row=r, end_column=DESC_1CODE[1])
-    ws.cell(row=r, column=CB, value='Condonación').font = F8
-    ws.cell(row=r, column=CB).fill = FW; ws.cell(row=r, column=CB).alignment = AL
-    ws.cell(row=r, column=CM, value=60).font = F7C
-    ws.cell(row=r, column=CM).fill = FB; ws.cell(row=r, column=CM).alignment = AC
-    cc[60] = f"{get_column_letter(CN)}{r}"
-    r += 1
+    for letter, width in COL_WIDTHS:
+        ws.column_dimensions[letter].width = width
 
-    # Línea 150: TOTAL CON RECARGO
-    ref_91 = cc.get(91, '0')
-    ref_92 = cc.get(92, '0')
-    ref_93 = cc.get(93, '0')
-    r = _fl(ws, r, 150, 'TOTAL A PAGAR CON RECARGO', 94, f'={ref_91}+{ref_92}+{ref_93}', '=', cc, bold=True)
+    cod = codigos
+    cc = {}
+    r = 1
+    for tipo, *args in FILAS_F29:
+        if tipo == "titulo":
+            ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=NCOLS)
+            ws.cell(row=r, column=1, value='DECLARACIÓN MENSUAL Y PAGO SIMULTÁNEO DE IMPUESTOS - FORMULARIO 29').font = F14B
+            ws.cell(row=r, column=1).alignment = AC
+            r += 1
+        elif tipo == "periodo":
+            ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=NCOLS)
+            ws.cell(row=r, column=1, value=periodo).font = F10
+            ws.cell(row=r, column=1).alignment = AC
+            for c in range(1, NCOLS + 1):
+                ws.cell(row=r, column=c).fill = FB
+            r += 1
+        elif tipo == "g":
+            r = _g(ws, r, *args)
+        elif tipo == "b":
+            r = _b(ws, r, *args)
+        elif tipo == "h":
+            r = _h(ws, r, **args[0])
+        elif tipo == "h2":
+            r = _h2(ws, r, *args)
+        elif tipo == "linea":
+            r = _ln(ws, r, *args, cod, cc)
+        elif tipo == "total":
+            num, desc, ca = args
+            r = _fl(ws, r, num, desc, ca, _FORMULAS[ca](cc), '=', cc, bold=True)
+        elif tipo == "doble":
+            num, desc, code1, code2, op = args
+            r = _dual(ws, r, num, desc, code1, _FORMULAS[code1](cc), code2, _FORMULAS[code2](cc), op, cc)
+        elif tipo == "suelta":
+            r = _suelta(ws, r, *args, cc)
+        elif tipo == "ppm_h":
+            r = _ppm_subheader(ws, r)
+        elif tipo == "ppm69":
+            r = _ppm_line69(ws, r, cod, cc)
+        elif tipo == "ppm_multi":
+            r = _ppm_multi_line(ws, r, *args, cod, cc)
+        else:
+            raise ValueError(f"Tipo de fila desconocido en FILAS_F29: {tipo!r}")
+    return cc
 
 
 # ============================================================
-# Hoja 2: Detalle de documentos
+# Hoja 1 compilada: esqueleto renderizado una vez por proceso
 # ============================================================
+# Todo lo que _write_f29 produce es fijo salvo el título, la fila 2 y las
+# celdas de valor que vienen de `codigos`. El layout compilado guarda las
+# celdas ya estilizadas (StyleArray) y las tablas de estilos del workbook
+# donde se renderizó; cada F29 nuevo copia esas tablas y solo parcha valores.
+
+_TABLAS_ESTILO = ("_fonts", "_fills", "_borders", "_alignments", "_protections", "_number_formats")
+_FILA_PERIODO = 2
+_LAYOUT = None
+
+
+class _CodigosMuestra(dict):
+    """Responde 1 para cualquier código: revela qué celdas se llenan desde codigos."""
+
+    def get(self, key, default=None):
+        return 1
+
+
+class _LayoutF29:
+    def __init__(self):
+        wb = openpyxl.Workbook()
+        self.cc = _write_f29(wb, {}, {})
+        ws = wb.active
+        wb.active = wb.create_sheet()
+        _write_f29(wb, _CodigosMuestra(), {})
+        muestra = wb.active
+
+        self.celdas = [(r, c, cell.value, cell._style, isinstance(cell, MergedCell))
+                       for (r, c), cell in ws._cells.items()]
+        self.merged = " ".join(str(m) for m in ws.merged_cells.ranges)
+        # Fórmulas del esqueleto ({celda: "=..."}): no dependen de los códigos
+        self.formulas = {f"{get_column_letter(c)}{r}": cell.value for (r, c), cell in ws._cells.items()
+                         if cell.data_type == "f"}
+        # Celdas de valor: vacías en el esqueleto, con 1 al renderizar la muestra
+        por_celda = {coord: code for code, coord in self.cc.items()}
+        self.entradas = []
+        for (r, c), cell in muestra._cells.items():
+            if cell.value == 1 and ws._cells[(r, c)].value is None:
+                code = por_celda[f"{get_column_letter(c)}{r}"]
+                self.entradas.append((code, r, c, cell._style))
+        self.tablas = {t: list(getattr(wb, t)) for t in _TABLAS_ESTILO}
+        impresos = {f"{get_column_letter(c)}{r}": value for r, c, value, _, _ in self.celdas}
+        difs = diferencias_layout(self.cc, self.formulas, [code for code, *_ in self.entradas], impresos)
+        if difs:
+            raise RuntimeError("INDICE_CODIGOS no coincide con _write_f29: " + "; ".join(difs[:5]))
+
+
+def _layout_compilado():
+    global _LAYOUT
+    if _LAYOUT is None:
+        _LAYOUT = _LayoutF29()
+    return _LAYOUT
+
+
+def _valores_f29(codigos):
+    """
+    Resultado de cada fórmula de la hoja F29, {celda: valor}: las fórmulas
+    evaluadas sobre las celdas de entrada llenas con `codigos`, tal como las
+    recalcularía Excel.
+    """
+    from scripts.verificar_f29 import evaluar_celdas
+    lay = _layout_compilado()
+    celdas = dict(lay.formulas)
+    for code, *_ in lay.entradas:
+        v = codigos.get(code) or 0
+        celdas[CELDAS_CODIGOS[code]] = float(v) if isinstance(v, Decimal) else v  # Excel guarda doubles
+    return evaluar_celdas(celdas, lay.formulas)
+
+
+def _write_f29_compilado(wb, codigos, enc):
+    """Equivalente a _write_f29 usando el esqueleto compilado; devuelve el mapa cc."""
+    if any(len(getattr(wb, t)) > 2 for t in _TABLAS_ESTILO):
+        # El workbook ya registró estilos propios: los índices no calzarían
+        return _write_f29(wb, codigos, enc)
+    lay = _layout_compilado()
+    for t in _TABLAS_ESTILO:
+        setattr(wb, t, IndexedList(lay.tablas[t]))
+
+    titulo, periodo = _titulos_f29(enc)
+    ws = wb.active
+    ws.title = titulo
+    for letter, width in COL_WIDTHS:
+        ws.column_dimensions[letter].width = width
 
-LINEAS_INFO = {
-    "linea_1":  {"linea": "1",  "cod_cant": 585, "cod_monto": 20,  "nombre": "Facturas de Exportación", "seccion": "debito"},
-    "linea_2":  {"linea": "2",  "cod_cant": 586, "cod_monto": 142, "nombre": "Ventas/Servicios Exentos del Giro", "seccion": "debito"},
-    "linea_5":  {"linea": "5",  "cod_cant": 515, "cod_monto": 587, "nombre": "Facturas de Compra (Serv. Digitales Extranjeros)", "seccion": "debito"},
-    "linea_7":  {"linea": "7",  "cod_cant": 503, "cod_monto": 502, "nombre": "Facturas Afectas del Giro", "seccion": "debito"},
-    "linea_9":  {"linea": "9",  "cod_cant": 716, "cod_monto": 717, "nombre": "Ventas Activo Fijo (No del Giro)", "seccion": "debito"},
-    "linea_10": {"linea": "10", "cod_cant": 110, "cod_monto": 111, "nombre": "Boletas", "seccion": "debito"},
-    "linea_11": {"linea": "11", "cod_cant": 758, "cod_monto": 759, "nombre": "Boletas Electrónicas / POS", "seccion": "debito"},
-    "linea_12": {"linea": "12", "cod_cant": 512, "cod_monto": 513, "nombre": "Notas de Débito Emitidas", "seccion": "debito"},
-    "linea_13": {"linea": "13", "cod_cant": 509, "cod_monto": 510, "nombre": "Notas de Crédito Emitidas", "seccion": "debito"},
-    "linea_27": {"linea": "27", "cod_cant": 584, "cod_monto": 562, "nombre": "Internas Exentas sin Derecho a CF", "seccion": "credito"},
-    "linea_28": {"linea": "28", "cod_cant": 519, "cod_monto": 520, "nombre": "Facturas Recibidas del Giro + FC Emitidas", "seccion": "credito"},
-    "linea_29": {"linea": "29", "cod_cant": 761, "cod_monto": 762, "nombre": "Facturas Supermercados/Comercios", "seccion": "credito"},
-    "linea_31": {"linea": "31", "cod_cant": 524, "cod_monto": 525, "nombre": "Facturas Activo Fijo", "seccion": "credito"},
-    "linea_32": {"linea": "32", "cod_cant": 527, "cod_monto": 528, "nombre": "Notas de Crédito Recibidas / NC por Cambio de Sujeto", "seccion": "credito"},
-    "linea_33": {"linea": "33", "cod_cant": 531, "cod_monto": 532, "nombre": "Notas de Débito Recibidas", "seccion": "credito"},
-    "linea_60": {"linea": "60", "cod_cant": None, "cod_monto": 48,  "nombre": "Impuesto Único 2da Categoría (Sueldos)", "seccion": "retencion"},
-    "linea_61": {"linea": "61", "cod_cant": None, "cod_monto": 151, "nombre": "Retención Honorarios Art. 42 N°2", "seccion": "retencion"},
-}
+    cells = ws._cells
+    for r, c, value, style, merged in lay.celdas:
+        if merged:
+            cell = MergedCell(ws, r, c)
+            cell._style = copy(style)
+        else:
+            cell = Cell(ws, r, c, value, copy(style))
+        cells[(r, c)] = cell
+    cells[(_FILA_PERIODO, 1)].value = periodo
+    for code, r, c, style in lay.entradas:
+        v = codigos.get(code)
+        if v:
+            cells[(r, c)] = Cell(ws, r, c, v, copy(style))
+    # Lo que haría ws._add_cell: sin _current_row, iter_rows() no ve celdas y append() escribe en la fila 1
+    ws._current_row = max(r for r, _ in cells)
+    # Los bordes de las celdas combinadas ya vienen en las MergedCell copiadas
+    ws.merged_cells = MultiCellRange(lay.merged)
+    return dict(lay.cc)
+
+
+# ============================================================
+# Hoja 2: Detalle de documentos
+# ============================================================
 
 COLUMNAS_VENTAS = ["N° Doc", "Fecha", "RUT", "Razón Social", "Descripción", "Neto", "IVA", "Exento", "Total"]
 COLUMNAS_COMPRAS = ["N° Doc", "Fecha", "RUT", "Razón Social", "Descripción", "Neto", "IVA", "Total"]
@@ -1139,6 +744,13 @@ def _get_columnas(seccion, lk):
 
 
 def _get_doc_values(doc, seccion, lk):
+    if isinstance(doc, Documento):
+        # Alias ya resueltos al compactar
+        if seccion == "debito":
+            return [doc.numero, doc.fecha, doc.rut, doc.razon_social, doc.descripcion,
+                    doc.neto, doc.iva, doc.exento, doc.total]
+        return [doc.numero, doc.fecha, doc.rut, doc.razon_social, doc.descripcion,
+                doc.neto, doc.iva, doc.total]
     if lk == "linea_61":
         return [doc.get("numero", ""), doc.get("fecha", ""), doc.get("rut", ""),
                 doc.get("razon_social", ""), doc.get("descripcion", ""),
@@ -1159,7 +771,45 @@ def _get_doc_values(doc, seccion, lk):
             doc.get("neto", 0), doc.get("iva", 0), doc.get("total", 0)]
 
 
-def _write_detalle(wb, datos, codigos=None):
+# Estilos compartidos de la hoja de detalle (uno por workbook, no uno por celda)
+F10B = Font(name="Arial", size=10, bold=True)
+F9BW = Font(name="Arial", size=9, bold=True, color="FFFFFF")
+F7BR = Font(name="Arial", size=7, bold=True, color="CC0000")
+F8BWARN = Font(name="Arial", size=8, bold=True, color="856404")
+FWARN = PatternFill(start_color="FFF3CD", end_color="FFF3CD", fill_type="solid")
+FILL_SECCION = {
+    seccion: PatternFill(start_color=color, end_color=color, fill_type="solid")
+    for seccion, color in (("debito", "E65100"), ("credito", "2E7D32"),
+                           ("retencion", "1565C0"), ("", "333333"))
+}
+DETALLE_COL_WIDTHS = [4, 14, 12, 20, 30, 30, 14, 14, 14, 14]
+DETALLE_NCOLS = 10
+ORDEN_DETALLE = ["linea_1", "linea_2", "linea_5", "linea_7", "linea_9",
+                 "linea_10", "linea_11", "linea_12", "linea_13",
+                 "linea_27", "linea_28", "linea_29", "linea_31", "linea_32", "linea_33",
+                 "linea_60", "linea_61"]
+
+
+def _titulo_linea_detalle(lk, info, n_docs):
+    return (f"LÍNEA {info.get('linea', '?')} — {info.get('nombre', lk)} — "
+            f"Cód. {info.get('cod_cant', '?')}/{info.get('cod_monto', '?')} — "
+            f"{n_docs} documento(s)")
+
+
+def _aviso_faltantes(info, codigos, actual):
+    """Texto de advertencia si se declararon más documentos que los identificados."""
+    cod_cant = info.get("cod_cant")
+    if not (cod_cant and codigos):
+        return None
+    declared = codigos.get(cod_cant, 0)
+    if declared > 0 and actual < declared:
+        return (f"Se declararon {declared} documentos (cód. {cod_cant}) pero solo se "
+                f"identificaron {actual}. Faltan {declared - actual} documento(s).")
+    return None
+
+
+def _write_detalle(wb, datos, codigos=None, totales=None):
+    """totales: dict opcional que recibe {celda: suma} de cada fórmula SUM de totales."""
     docs = datos.get("documentos", {})
     if not docs:
         ws = wb.create_sheet(title="Detalle Documentos")
@@ -1167,26 +817,18 @@ def _write_detalle(wb, datos, codigos=None):
         return
 
     ws = wb.create_sheet(title="Detalle Documentos")
-    for i, w in enumerate([4, 14, 12, 20, 30, 30, 14, 14, 14, 14], 1):
+    for i, w in enumerate(DETALLE_COL_WIDTHS, 1):
         ws.column_dimensions[get_column_letter(i)].width = w
 
     r = 1
-    ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=10)
+    ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=DETALLE_NCOLS)
     c = ws.cell(row=r, column=1, value="DETALLE DE DOCUMENTOS POR LÍNEA DEL F29")
-    c.font = Font(name="Arial", size=10, bold=True); c.fill = FB; c.alignment = AC
-    for ci in range(1, 11):
+    c.font = F10B; c.fill = FB; c.alignment = AC
+    for ci in range(1, DETALLE_NCOLS + 1):
         ws.cell(row=r, column=ci).fill = FB
     r += 2
 
-    WHITE = "FFFFFF"
-    FILL_W = PatternFill(start_color=WHITE, end_color=WHITE, fill_type="solid")
-
-    orden = ["linea_1", "linea_2", "linea_5", "linea_7", "linea_9",
-             "linea_10", "linea_11", "linea_12", "linea_13",
-             "linea_27", "linea_28", "linea_29", "linea_31", "linea_32", "linea_33",
-             "linea_60", "linea_61"]
-
-    for lk in orden:
+    for lk in ORDEN_DETALLE:
         if lk not in docs or not docs[lk]:
             continue
 
@@ -1195,17 +837,12 @@ def _write_detalle(wb, datos, codigos=None):
         doc_list = docs[lk]
         columnas = _get_columnas(seccion, lk)
 
-        header = (f"LÍNEA {info.get('linea', '?')} — {info.get('nombre', lk)} — "
-                  f"Cód. {info.get('cod_cant', '?')}/{info.get('cod_monto', '?')} — "
-                  f"{len(doc_list)} documento(s)")
-        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=10)
-        color = {"debito": "E65100", "credito": "2E7D32", "retencion": "1565C0"}.get(seccion, "333333")
-        fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
-        font_w = Font(name="Arial", size=9, bold=True, color=WHITE)
-        for ci in range(1, 11):
+        ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=DETALLE_NCOLS)
+        fill = FILL_SECCION.get(seccion, FILL_SECCION[""])
+        for ci in range(1, DETALLE_NCOLS + 1):
             ws.cell(row=r, column=ci).fill = fill
-            ws.cell(row=r, column=ci).font = font_w
-        ws.cell(row=r, column=1, value=header)
+            ws.cell(row=r, column=ci).font = F9BW
+        ws.cell(row=r, column=1, value=_titulo_linea_detalle(lk, info, len(doc_list)))
         r += 1
 
         ws.cell(row=r, column=1, value="#").font = F8B
@@ -1216,10 +853,11 @@ def _write_detalle(wb, datos, codigos=None):
         r += 1
 
         first_data = r
+        sumas = {}
         for i, doc in enumerate(doc_list, 1):
             values = _get_doc_values(doc, seccion, lk)
-            alt = FL if i % 2 == 0 else FILL_W
-            ws.cell(row=r, column=1, value=i).font = Font(name="Arial", size=7)
+            alt = FL if i % 2 == 0 else FW
+            ws.cell(row=r, column=1, value=i).font = F7
             ws.cell(row=r, column=1).fill = alt; ws.cell(row=r, column=1).alignment = AC
             for ci, val in enumerate(values, 2):
                 cell = ws.cell(row=r, column=ci, value=val)
@@ -1227,9 +865,10 @@ def _write_detalle(wb, datos, codigos=None):
                 is_monto = ci - 2 >= N_TEXT_COLS
                 if is_monto and isinstance(val, (int, float)):
                     cell.number_format = NF
-                    cell.font = Font(name="Arial", size=7); cell.alignment = AR
+                    cell.font = F7; cell.alignment = AR
+                    sumas[ci] = sumas.get(ci, 0) + val
                 else:
-                    cell.font = Font(name="Arial", size=7); cell.alignment = AL
+                    cell.font = F7; cell.alignment = AL
             r += 1
         last_data = r - 1
 
@@ -1242,29 +881,174 @@ def _write_detalle(wb, datos, codigos=None):
             if is_monto:
                 col_letter = get_column_letter(ci)
                 ws.cell(row=r, column=ci, value=f"=SUM({col_letter}{first_data}:{col_letter}{last_data})")
+                if totales is not None:
+                    totales[f"{col_letter}{r}"] = sumas.get(ci, 0)
                 ws.cell(row=r, column=ci).number_format = NF
-                ws.cell(row=r, column=ci).font = Font(name="Arial", size=7, bold=True, color="CC0000")
+                ws.cell(row=r, column=ci).font = F7BR
                 ws.cell(row=r, column=ci).alignment = AR
             else:
                 ws.cell(row=r, column=ci).font = F8B
         r += 1
 
-        cod_cant = info.get("cod_cant")
-        if cod_cant and codigos:
-            declared = codigos.get(cod_cant, 0)
-            actual = len(doc_list)
-            if declared > 0 and actual < declared:
-                fill_warn = PatternFill(start_color="FFF3CD", end_color="FFF3CD", fill_type="solid")
-                font_warn = Font(name="Arial", size=8, bold=True, color="856404")
-                ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=10)
-                ws.cell(row=r, column=1,
-                        value=f"Se declararon {declared} documentos (cód. {cod_cant}) pero solo se identificaron {actual}. Faltan {declared - actual} documento(s).").font = font_warn
-                for ci in range(1, 11):
-                    ws.cell(row=r, column=ci).fill = fill_warn
-                r += 1
+        aviso = _aviso_faltantes(info, codigos, len(doc_list))
+        if aviso:
+            ws.merge_cells(start_row=r, start_column=1, end_row=r, end_column=DETALLE_NCOLS)
+            ws.cell(row=r, column=1, value=aviso).font = F8BWARN
+            for ci in range(1, DETALLE_NCOLS + 1):
+                ws.cell(row=r, column=ci).fill = FWARN
+            r += 1
         r += 1
 
 
+# ============================================================
+# Hoja 2 en streaming (workbook write-only)
+# ============================================================
+# Para meses con cientos de miles de documentos: las filas se escriben al
+# archivo temporal de openpyxl apenas se generan, con StyleArray precalculados
+# por workbook en vez de asignar Font/PatternFill celda a celda.
+
+def _estilo(ws, font=None, fill=None, alignment=None, number_format=None, border=None):
+    """StyleArray registrado en el workbook de ws, para reutilizar en _celda."""
+    c = Cell(ws)
+    if font: c.font = font
+    if fill: c.fill = fill
+    if alignment: c.alignment = alignment
+    if number_format: c.number_format = number_format
+    if border: c.border = border
+    return c._style
+
+
+def _celda(ws, valor=None, estilo=None):
+    """Celda suelta para ws.append en write-only (fila/columna las fija el writer)."""
+    return Cell(ws, 1, 1, valor, estilo)
+
+
+def _filas_detalle(datos, codigos, estilo, totales=None):
+    """
+    Filas de la hoja de detalle, en orden: ([(valor, estilo), ...], combinada).
+    `estilo(**formato)` registra un estilo y devuelve cómo referirlo (StyleArray
+    en openpyxl, índice xf en xlsx_directo); `combinada` = fila combinada A:J.
+    totales: dict opcional; recibe {celda: suma} de cada SUM de la fila de
+    totales antes de entregar esa fila.
+    """
+    docs = datos.get("documentos", {})
+    if not docs:
+        yield [("Sin documentos individuales.", estilo(font=F8B))], False
+        return
+
+    s_titulo = estilo(font=F10B, fill=FB, alignment=AC)
+    s_azul = estilo(fill=FB)
+    s_cab = estilo(font=F8B, fill=FE, alignment=AC)
+    s_tot = estilo(fill=FE)
+    s_tot_txt = estilo(font=F8B, fill=FE)
+    s_tot_monto = estilo(font=F7BR, fill=FE, alignment=AR, number_format=NF)
+    s_warn = estilo(font=F8BWARN, fill=FWARN)
+    s_warn_fill = estilo(fill=FWARN)
+    # Por paridad de fila: (índice, texto, monto numérico)
+    s_datos = {
+        par: (estilo(font=F7, fill=alt, alignment=AC),
+              estilo(font=F7, fill=alt, alignment=AL),
+              estilo(font=F7, fill=alt, alignment=AR, number_format=NF))
+        for par, alt in ((0, FL), (1, FW))
+    }
+
+    def fila_llena(valor, s, s_resto):
+        return [(valor, s)] + [(None, s_resto)] * (DETALLE_NCOLS - 1)
+
+    yield fila_llena("DETALLE DE DOCUMENTOS POR LÍNEA DEL F29", s_titulo, s_azul), True
+    yield [], False
+    r = 3
+
+    for lk in ORDEN_DETALLE:
+        if lk not in docs or not docs[lk]:
+            continue
+
+        info = LINEAS_INFO.get(lk, {})
+        seccion = info.get("seccion", "")
+        doc_list = docs[lk]
+        columnas = _get_columnas(seccion, lk)
+
+        s_seccion = estilo(font=F9BW, fill=FILL_SECCION.get(seccion, FILL_SECCION[""]))
+        yield fila_llena(_titulo_linea_detalle(lk, info, len(doc_list)), s_seccion, s_seccion), True
+        yield [(cn, s_cab) for cn in ["#"] + columnas], False
+        r += 2
+
+        first_data = r
+        n = 0
+        sumas = [0] * len(columnas)
+        for n, doc in enumerate(doc_list, 1):
+            s_idx, s_txt, s_monto = s_datos[n % 2]
+            fila = [(n, s_idx)]
+            for ci, val in enumerate(_get_doc_values(doc, seccion, lk)):
+                es_monto = ci >= N_TEXT_COLS and isinstance(val, (int, float))
+                fila.append((val, s_monto if es_monto else s_txt))
+                if es_monto and totales is not None:
+                    sumas[ci] += val
+            yield fila, False
+            r += 1
+        last_data = r - 1
+
+        fila = [(None, s_tot), ("TOTAL", s_tot_txt)]
+        for ci in range(3, len(columnas) + 2):
+            if ci - 2 >= N_TEXT_COLS:
+                col_letter = get_column_letter(ci)
+                fila.append((f"=SUM({col_letter}{first_data}:{col_letter}{last_data})", s_tot_monto))
+                if totales is not None:
+                    totales[f"{col_letter}{r}"] = sumas[ci - 2]
+            else:
+                fila.append((None, s_tot_txt))
+        yield fila, False
+        r += 1
+
+        aviso = _aviso_faltantes(info, codigos, n)
+        if aviso:
+            yield fila_llena(aviso, s_warn, s_warn_fill), True
+            r += 1
+        yield [], False
+        r += 1
+
+
+def _write_detalle_streaming(wb, datos, codigos=None, totales=None):
+    """
+    Misma hoja que _write_detalle, escrita fila a fila en un workbook write-only.
+    Devuelve la cantidad de filas escritas (la hoja write-only no la expone).
+    """
+    ws = wb.create_sheet(title="Detalle Documentos")
+    if datos.get("documentos", {}):
+        for i, w in enumerate(DETALLE_COL_WIDTHS, 1):
+            ws.column_dimensions[get_column_letter(i)].width = w
+
+    r = filas = 0
+    for fila, combinada in _filas_detalle(datos, codigos, lambda **f: _estilo(ws, **f), totales):
+        r += 1
+        if fila:
+            ws.append([_celda(ws, v, estilo=s) for v, s in fila])
+            filas = r  # como max_row: sin contar filas vacías al final
+        else:
+            ws.append([])
+        if combinada:
+            ws.merged_cells.add(f"A{r}:{get_column_letter(DETALLE_NCOLS)}{r}")
+    return filas
+
+
+def _volcar_hoja(origen, wb):
+    """Copia una hoja ya renderizada (mismas tablas de estilos) a una hoja write-only de wb."""
+    ws = wb.create_sheet(title=origen.title)
+    for letter, dim in origen.column_dimensions.items():
+        if dim.width:
+            ws.column_dimensions[letter].width = dim.width
+    filas = {}
+    for (r, c), cell in origen._cells.items():
+        filas.setdefault(r, {})[c] = cell
+    for r in range(1, origen.max_row + 1):
+        fila = filas.get(r, {})
+        ws.append([_celda(ws, fila[c].value, estilo=fila[c]._style) if c in fila else None
+                   for c in range(1, max(fila, default=0) + 1)])
+    for rango in origen.merged_cells.ranges:
+        ws.merged_cells.add(str(rango))
+    return ws
+
+
 # ============================================================
 # Hoja 3: Alertas
 # ============================================================
@@ -1296,12 +1080,14 @@ def _write_alertas(wb, codigos, datos):
     if codigos.get(596, 0) > 0:
         alertas.append(("CAMBIO SUJETO", f"Retención cambio de sujeto: {fp(codigos[596])}. IVA retenido por FC de servicios digitales extranjeros."))
     if codigos.get(151, 0) > 0:
-        alertas.append(("HONORARIOS", f"Retención: {fp(codigos[151])}. Tasa 2026: 15,25%."))
+        anio = enc.get("periodo_anio", 2026)
+        tasa = f"{tasa_honorarios(anio):.2f}".replace(".", ",")
+        alertas.append(("HONORARIOS", f"Retención: {fp(codigos[151])}. Tasa {anio}: {tasa}%."))
     if codigos.get(504, 0) > 0:
         alertas.append(("REMANENTE ANT.", f"Remanente CF arrastrado: {fp(codigos[504])}. Verificar vs código 77 del F29 anterior."))
     has_afectas = codigos.get(503, 0) > 0 or codigos.get(110, 0) > 0
     has_exentas = codigos.get(585, 0) > 0 or codigos.get(586, 0) > 0
-    if has_afectas and has_exentas:
+    if has_afectas and has_exentas and "prorrateo" not in datos:
         alertas.append(("PRORRATEO", "Ventas afectas + exentas/exportación. Verificar prorrateo de CF de uso común."))
 
     for nota in notas:
@@ -1329,21 +1115,215 @@ def _write_alertas(wb, codigos, datos):
         r += 1
 
 
+# ============================================================
+# Instrumentación por etapa
+# ============================================================
+# generar_f29_excel(..., metricas=callback) llama al callback al terminar cada
+# etapa con un dict: etapa, segundos y, según la etapa, filas/celdas/codigos/
+# bytes; con medir_memoria=True agrega memoria_bytes (neto retenido) y
+# memoria_pico_bytes (pico sobre el inicio de la etapa) de tracemalloc.
+# Ver scripts/metricas_f29.py para exportarlas como logs u OpenMetrics.
+
+ETAPAS = ("calcular", "f29", "detalle", "alertas", "save")
+MOTORES = ("openpyxl", "xml")
+
+
+class _Medidor:
+    """Mide etapas para el callback `metricas`; sin callback no hace nada."""
+
+    def __init__(self, metricas=None, medir_memoria=False):
+        self.metricas = metricas
+        self.memoria = bool(metricas) and medir_memoria
+        self._inicio_tracemalloc = False
+
+    def __enter__(self):
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._inicio_tracemalloc = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._inicio_tracemalloc:
+            tracemalloc.stop()
+
+    @contextmanager
+    def etapa(self, nombre):
+        evento = {"etapa": nombre}
+        if self.metricas is None:
+            yield evento
+            return
+        if self.memoria:
+            tracemalloc.reset_peak()
+            antes = tracemalloc.get_traced_memory()[0]
+        inicio = time.perf_counter()
+        yield evento
+        evento["segundos"] = time.perf_counter() - inicio
+        if self.memoria:
+            actual, pico = tracemalloc.get_traced_memory()
+            evento["memoria_bytes"] = actual - antes
+            evento["memoria_pico_bytes"] = pico - antes
+        self.metricas(evento)
+
+
+def _conteo_hoja(ws):
+    return {"filas": ws.max_row, "celdas": len(ws._cells)}
+
+
+def _posicion(destino):
+    """Posición inicial de un archivo abierto, para medir lo escrito; None si no se puede."""
+    if isinstance(destino, (str, os.PathLike)):
+        return None
+    try:
+        return destino.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+def _bytes_escritos(ev, destino, inicio):
+    if isinstance(destino, (str, os.PathLike)):
+        if os.path.exists(destino):
+            ev["bytes"] = os.path.getsize(destino)
+    elif inicio is not None:
+        ev["bytes"] = destino.tell() - inicio
+
+
+# Fórmula sin resultado tal como la escribe openpyxl: <f>...</f><v /> (o <v></v>)
+_FORMULA_SIN_VALOR = re.compile(rb"<f>([^<]*)</f>(?:<v ?/>|<v></v>)")
+
+
+def _numero_xml(valor):
+    """Texto de <v> para un número: bool como 1/0, Decimal sin exponente, float con repr."""
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, int):
+        return str(valor)
+    if isinstance(valor, Decimal):
+        return format(valor, "f")
+    return repr(float(valor))
+
+
+def _poner_valores(xml, valores):
+    """Agrega a cada fórmula de una hoja el resultado de `valores` ({celda: valor})."""
+    partes, pos = [], 0
+    for m in _FORMULA_SIN_VALOR.finditer(xml):
+        inicio = xml.rfind(b'<c r="', 0, m.start()) + 6
+        ref = xml[inicio:xml.index(b'"', inicio)].decode()
+        if valores.get(ref) is not None:
+            partes.append(xml[pos:m.start()])
+            partes.append(b"<f>%s</f><v>%s</v>" % (m.group(1), _numero_xml(valores[ref]).encode()))
+            pos = m.end()
+    partes.append(xml[pos:])
+    return b"".join(partes)
+
+
+def _guardar_con_valores(wb, destino, valores):
+    """
+    wb.save con los resultados de las fórmulas en cada celda (openpyxl no los
+    escribe): guarda en memoria y reescribe las hojas de `valores` ({número
+    de hoja: {celda: valor}}) al copiar el zip a destino.
+    """
+    wb.calculation.fullCalcOnLoad = False
+    buf = io.BytesIO()
+    wb.save(buf)
+    with zipfile.ZipFile(buf) as origen, zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as zf:
+        for info in origen.infolist():
+            contenido = origen.read(info)
+            n = re.fullmatch(r"xl/worksheets/sheet(\d+)\.xml", info.filename)
+            if n and valores.get(int(n.group(1))):
+                contenido = _poner_valores(contenido, valores[int(n.group(1))])
+            zf.writestr(info, contenido, zipfile.ZIP_DEFLATED)
+
+
 # ============================================================
 # Función principal
 # ============================================================
 
-def generar_f29_excel(datos, output_path):
-    codigos = calcular_f29(datos)
-    enc = datos.get("encabezado", {})
-    wb = openpyxl.Workbook()
-    _write_f29(wb, codigos, enc)
-    _write_detalle(wb, datos, codigos)
-    _write_alertas(wb, codigos, datos)
-    wb.save(output_path)
+def generar_f29_excel(datos, output_path, layout_compilado=False, detalle_streaming=False,
+                      metricas=None, medir_memoria=False, motor="openpyxl", cachear_formulas=False):
+    """
+    Calcula el F29 y escribe el Excel de 3 hojas en output_path: una ruta o un
+    archivo binario abierto (BytesIO, socket.makefile("wb"), respuesta HTTP).
+    El destino no necesita seek: el zip se escribe de corrido.
+
+    layout_compilado: renderiza la hoja F29 desde el esqueleto compilado (se
+    arma una vez por proceso) y solo escribe los valores; mismo resultado,
+    mucho menos trabajo por workbook en lotes.
+    detalle_streaming: workbook write-only; la hoja de detalle se escribe fila
+    a fila con memoria constante sin importar la cantidad de documentos.
+    metricas: callable(evento) llamado al terminar cada etapa (ETAPAS) con su
+    duración y conteos; medir_memoria=True agrega la memoria de tracemalloc
+    (más lento: usar para diagnosticar, no en cada corrida).
+    motor: "openpyxl" o "xml". "xml" escribe el XML del xlsx directo al zip
+    (xlsx_directo): mismo contenido celda por celda, con el layout compilado y
+    el detalle en streaming siempre; ignora las dos opciones anteriores.
+    cachear_formulas: guarda junto a cada fórmula su resultado y no pide
+    recalcular al abrir: en la hoja F29, cada fórmula evaluada con
+    verificar_f29.evaluar_celdas sobre las celdas de entrada (los códigos);
+    en el detalle, las sumas de cada columna. Visores, apps y lectores como
+    openpyxl(data_only=True) ven los totales sin motor de planillas. Con motor="openpyxl" el guardado hace una pasada
+    más sobre el zip; con "xml" no cuesta nada extra.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"motor desconocido: {motor!r} (opciones: {', '.join(MOTORES)})")
+    inicio = _posicion(output_path)
+    with _Medidor(metricas, medir_memoria) as medidor:
+        with medidor.etapa("calcular") as ev:
+            codigos = calcular_f29(datos)
+            ev["codigos"] = len(codigos)
+        if motor == "xml":
+            from scripts.xlsx_directo import escribir_xlsx
+            return escribir_xlsx(datos, codigos, output_path, medidor, inicio, cachear_formulas)
+        enc = datos.get("encabezado", {})
+        write_f29 = _write_f29_compilado if layout_compilado else _write_f29
+        totales = {} if cachear_formulas else None
+        if detalle_streaming:
+            # F29 y Alertas son hojas chicas: se renderizan normal y se vuelcan,
+            # compartiendo las tablas de estilos con el workbook write-only.
+            borrador = openpyxl.Workbook()
+            wb = openpyxl.Workbook(write_only=True)
+            with medidor.etapa("f29") as ev:
+                write_f29(borrador, codigos, enc)
+                # Después de write_f29: la versión compilada reemplaza las tablas
+                for t in _TABLAS_ESTILO:
+                    setattr(wb, t, getattr(borrador, t))
+                _volcar_hoja(borrador.worksheets[0], wb)
+                ev.update(_conteo_hoja(borrador.worksheets[0]))
+            with medidor.etapa("detalle") as ev:
+                ev["filas"] = _write_detalle_streaming(wb, datos, codigos, totales)
+            with medidor.etapa("alertas") as ev:
+                _write_alertas(borrador, codigos, datos)
+                _volcar_hoja(borrador.worksheets[1], wb)
+                ev.update(_conteo_hoja(borrador.worksheets[1]))
+        else:
+            wb = openpyxl.Workbook()
+            with medidor.etapa("f29") as ev:
+                write_f29(wb, codigos, enc)
+                ev.update(_conteo_hoja(wb.worksheets[0]))
+            with medidor.etapa("detalle") as ev:
+                _write_detalle(wb, datos, codigos, totales)
+                ev.update(_conteo_hoja(wb.worksheets[1]))
+            with medidor.etapa("alertas") as ev:
+                _write_alertas(wb, codigos, datos)
+                ev.update(_conteo_hoja(wb.worksheets[2]))
+        with medidor.etapa("save") as ev:
+            if cachear_formulas:
+                _guardar_con_valores(wb, output_path, {1: _valores_f29(codigos), 2: totales})
+            else:
+                wb.save(output_path)
+            _bytes_escritos(ev, output_path, inicio)
     return codigos
 
 
+def generar_f29_bytes(datos, **opciones):
+    """
+    generar_f29_excel en memoria: devuelve (codigos, bytes del xlsx) sin pasar
+    por disco. Con motor="xml" tampoco usa archivos temporales internos.
+    """
+    buf = io.BytesIO()
+    codigos = generar_f29_excel(datos, buf, **opciones)
+    return codigos, buf.getvalue()
+
+
 if __name__ == "__main__":
     datos_ejemplo = {
         "encabezado": {
@@ -0,0 +1,266 @@
+"""
+historial_f29.py — Historial local de códigos F29 por RUT y período (SQLite).
+
+Guarda el resultado de calcular_f29 de cada cliente y mes en una base SQLite
+con llave primaria (rut, anio, mes, codigo) en una tabla WITHOUT ROWID (las
+filas viven ordenadas por esa llave) y un índice (codigo, anio, mes). Así
+"los remanentes del último mes de este RUT" y "el código X de todos los
+clientes en el período Y" son búsquedas por índice, de milisegundos, en vez
+de abrir miles de xlsx.
+
+Las escrituras van en lotes, en una transacción: guardar un período
+reemplaza todos sus códigos (una rectificación no deja códigos viejos). La
+base usa WAL, así el lote puede escribir mientras otros procesos consultan.
+
+Uso:
+    from scripts.historial_f29 import HistorialF29
+    hist = HistorialF29("historial.db")
+    hist.registrar(datos, codigos)                       # o hist.generar_f29_excel(datos, ruta)
+    (anio, mes), cod = hist.ultimo("78.033.706-0", antes_de=(2026, 1))
+    hist.por_periodo(77, 2025, 12)                       # {rut: valor} de toda la cartera
+
+    python -m scripts.historial_f29 historial.db importar archivo/*.xlsx
+    python -m scripts.historial_f29 historial.db rut 78033706-0 --codigos 77 506
+    python -m scripts.historial_f29 historial.db codigo 77 2025-12
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import sys
+
+from scripts.calculo_f29 import calcular_f29, generar_f29_excel, periodo_datos
+
+# Códigos que se arrastran al mes siguiente (ver periodos_f29.ARRASTRES)
+CODIGOS_ARRASTRE = (77, 506, 550, 724)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS codigos (
+    rut    TEXT    NOT NULL,
+    anio   INTEGER NOT NULL,
+    mes    INTEGER NOT NULL,
+    codigo INTEGER NOT NULL,
+    valor  NUMERIC NOT NULL,
+    PRIMARY KEY (rut, anio, mes, codigo)
+) WITHOUT ROWID;
+-- Con valor al final el índice cubre "código X de todos en el período Y" sin ir a la tabla
+CREATE INDEX IF NOT EXISTS codigos_por_codigo ON codigos (codigo, anio, mes, valor);
+CREATE TABLE IF NOT EXISTS declaraciones (
+    rut         TEXT    NOT NULL,
+    anio        INTEGER NOT NULL,
+    mes         INTEGER NOT NULL,
+    archivo     TEXT,
+    actualizado TEXT    NOT NULL,
+    PRIMARY KEY (rut, anio, mes)
+) WITHOUT ROWID;
+"""
+
+# Nombre por defecto de lote_f29.nombre_archivo_f29: F29-<RUT>-<AAAAMM>.xlsx
+_NOMBRE_ARCHIVO = re.compile(r"F29-([0-9]{6,9}[0-9kK])-(\d{4})(\d{2})\.xlsx$")
+
+
+def normalizar_rut(rut):
+    """RUT como 12345678-9: sin puntos ni ceros a la izquierda, K mayúscula."""
+    limpio = re.sub(r"[^0-9K]", "", str(rut or "").upper()).lstrip("0")
+    if len(limpio) < 2:
+        raise ValueError(f"RUT inválido: {rut!r}")
+    return f"{limpio[:-1]}-{limpio[-1]}"
+
+
+class HistorialF29:
+    """Historial en `ruta` (se crea si no existe; ":memory:" para pruebas)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta if ruta == ":memory:" else os.path.expanduser(ruta)
+        self.con = sqlite3.connect(self.ruta)
+        if self.ruta != ":memory:":
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute("PRAGMA synchronous=NORMAL")
+            self.con.execute("PRAGMA cache_size=-65536")  # 64 MB: los lotes grandes tocan muchas páginas
+        self.con.executescript(_ESQUEMA)
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------- escritura ----------------
+
+    def guardar_muchos(self, registros):
+        """
+        Guarda en una transacción un iterable de (rut, anio, mes, codigos) o
+        (rut, anio, mes, codigos, archivo). Cada período reemplaza lo que
+        hubiera guardado. Devuelve cuántos períodos guardó.
+        """
+        ahora = datetime.datetime.now().isoformat(timespec="seconds")
+        periodos, filas = [], []
+        for rut, anio, mes, codigos, *archivo in registros:
+            rut = normalizar_rut(rut)
+            periodos.append((rut, anio, mes, archivo[0] if archivo else None, ahora))
+            filas.extend((rut, anio, mes, int(code), valor) for code, valor in codigos.items()
+                         if isinstance(valor, (int, float)))
+        with self.con:
+            self.con.executemany("DELETE FROM codigos WHERE rut = ? AND anio = ? AND mes = ?",
+                                 [p[:3] for p in periodos])
+            self.con.executemany(
+                "INSERT INTO codigos VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (rut, anio, mes, codigo) DO UPDATE SET valor = excluded.valor", filas)
+            self.con.executemany(
+                "INSERT INTO declaraciones VALUES (?, ?, ?, ?, ?) ON CONFLICT (rut, anio, mes) "
+                "DO UPDATE SET archivo = excluded.archivo, actualizado = excluded.actualizado", periodos)
+        return len(periodos)
+
+    def guardar(self, rut, anio, mes, codigos, archivo=None):
+        self.guardar_muchos([(rut, anio, mes, codigos, archivo)])
+
+    def registrar(self, datos, codigos=None, archivo=None):
+        """Guarda el período de `datos` (RUT y mes del encabezado); calcula los códigos si no vienen."""
+        if codigos is None:
+            codigos = calcular_f29(datos)
+        rut = normalizar_rut(datos.get("encabezado", {}).get("rut"))
+        self.guardar(rut, *periodo_datos(datos), codigos, archivo)
+        return codigos
+
+    def generar_f29_excel(self, datos, output_path, **opciones):
+        """generar_f29_excel y registro del resultado en el historial."""
+        codigos = generar_f29_excel(datos, output_path, **opciones)
+        archivo = os.fspath(output_path) if isinstance(output_path, (str, os.PathLike)) else None
+        self.registrar(datos, codigos, archivo)
+        return codigos
+
+    # ---------------- consultas ----------------
+
+    def codigos(self, rut, anio, mes, solo=None):
+        """{código: valor} de un período ({} si no está). solo: esos códigos, con 0 si faltan."""
+        rut = normalizar_rut(rut)
+        if solo is None:
+            filas = self.con.execute(
+                "SELECT codigo, valor FROM codigos WHERE rut = ? AND anio = ? AND mes = ?", (rut, anio, mes))
+            return dict(filas)
+        solo = list(solo)
+        filas = self.con.execute(
+            f"SELECT codigo, valor FROM codigos WHERE rut = ? AND anio = ? AND mes = ? "
+            f"AND codigo IN ({','.join('?' * len(solo))})", (rut, anio, mes, *solo))
+        return {**dict.fromkeys(solo, 0), **dict(filas)}
+
+    def ultimo(self, rut, antes_de=None, solo=CODIGOS_ARRASTRE):
+        """
+        ((anio, mes), codigos) del último período guardado del RUT, anterior a
+        `antes_de` (anio, mes) si se indica; None si no hay. Por defecto trae
+        los códigos que se arrastran (77, 506, 550, 724); solo=None = todos.
+        """
+        rut = normalizar_rut(rut)
+        if antes_de is None:
+            fila = self.con.execute(
+                "SELECT anio, mes FROM declaraciones WHERE rut = ? ORDER BY anio DESC, mes DESC LIMIT 1",
+                (rut,)).fetchone()
+        else:
+            fila = self.con.execute(
+                "SELECT anio, mes FROM declaraciones WHERE rut = ? AND (anio < ? OR (anio = ? AND mes < ?)) "
+                "ORDER BY anio DESC, mes DESC LIMIT 1", (rut, antes_de[0], antes_de[0], antes_de[1])).fetchone()
+        if fila is None:
+            return None
+        return tuple(fila), self.codigos(rut, *fila, solo=solo)
+
+    def por_periodo(self, codigo, anio, mes):
+        """{rut: valor} del código en el período, para todos los clientes que lo tienen."""
+        return dict(self.con.execute(
+            "SELECT rut, valor FROM codigos WHERE codigo = ? AND anio = ? AND mes = ?", (codigo, anio, mes)))
+
+    def serie(self, rut, codigo, desde=None, hasta=None):
+        """[((anio, mes), valor), ...] del código para el RUT, en orden; desde/hasta: (anio, mes) inclusive."""
+        desde, hasta = desde or (0, 0), hasta or (9999, 12)
+        filas = self.con.execute(
+            # +codigo: recorrer la llave primaria del RUT, no el índice del código en toda la cartera
+            "SELECT anio, mes, valor FROM codigos WHERE rut = ? AND +codigo = ? "
+            "AND anio * 100 + mes BETWEEN ? AND ? ORDER BY anio, mes",
+            (normalizar_rut(rut), codigo, desde[0] * 100 + desde[1], hasta[0] * 100 + hasta[1]))
+        return [((anio, mes), valor) for anio, mes, valor in filas]
+
+    def periodos(self, rut):
+        """[(anio, mes), ...] guardados del RUT, en orden."""
+        return [tuple(f) for f in self.con.execute(
+            "SELECT anio, mes FROM declaraciones WHERE rut = ? ORDER BY anio, mes", (normalizar_rut(rut),))]
+
+
+def importar_archivos(historial, archivos, workers=None, lote=1000):
+    """
+    Carga al historial F29 ya generados, leídos con lector_f29. El RUT y el
+    período salen del nombre por defecto (F29-<RUT>-<AAAAMM>.xlsx).
+    Devuelve (importados, [(archivo, error), ...]).
+    """
+    from scripts.lector_f29 import leer_varios
+    validos, errores = [], []
+    for archivo in archivos:
+        m = _NOMBRE_ARCHIVO.search(os.path.basename(archivo))
+        if m:
+            validos.append((archivo, m.groups()))
+        else:
+            errores.append((archivo, "el nombre no sigue F29-<RUT>-<AAAAMM>.xlsx"))
+    nombres = dict(validos)
+    importados, pendientes = 0, []
+    for archivo, codigos, error in leer_varios([a for a, _ in validos], workers):
+        if error:
+            errores.append((archivo, error))
+            continue
+        rut, anio, mes = nombres[archivo]
+        pendientes.append((rut, int(anio), int(mes), codigos, archivo))
+        if len(pendientes) >= lote:
+            importados += historial.guardar_muchos(pendientes)
+            pendientes = []
+    importados += historial.guardar_muchos(pendientes)
+    return importados, errores
+
+
+def _periodo_arg(texto):
+    anio, mes = texto.split("-")
+    return int(anio), int(mes)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Historial SQLite de códigos F29 por RUT y período.")
+    p.add_argument("base", help="Archivo SQLite (se crea si no existe)")
+    sub = p.add_subparsers(dest="comando", required=True)
+    imp = sub.add_parser("importar", help="Cargar F29 .xlsx ya generados")
+    imp.add_argument("archivos", nargs="+")
+    imp.add_argument("-w", "--workers", type=int, default=None)
+    por_rut = sub.add_parser("rut", help="Códigos de un RUT (último período o --periodo AAAA-MM)")
+    por_rut.add_argument("rut")
+    por_rut.add_argument("--periodo", type=_periodo_arg)
+    por_rut.add_argument("--codigos", type=int, nargs="+")
+    por_cod = sub.add_parser("codigo", help="Un código en todos los clientes para un período")
+    por_cod.add_argument("codigo", type=int)
+    por_cod.add_argument("periodo", type=_periodo_arg, help="AAAA-MM")
+    args = p.parse_args(argv)
+
+    with HistorialF29(args.base) as hist:
+        if args.comando == "importar":
+            importados, errores = importar_archivos(hist, args.archivos, args.workers)
+            for archivo, error in errores:
+                print(f"ERROR  {archivo}: {error}", file=sys.stderr)
+            print(f"{importados} períodos importados, {len(errores)} con error")
+            return 1 if errores else 0
+        if args.comando == "rut":
+            if args.periodo:
+                periodo, codigos = args.periodo, hist.codigos(args.rut, *args.periodo, solo=args.codigos)
+            else:
+                encontrado = hist.ultimo(args.rut, solo=args.codigos)
+                if encontrado is None:
+                    print(f"Sin períodos para {args.rut}", file=sys.stderr)
+                    return 1
+                periodo, codigos = encontrado
+            print(f"{periodo[0]}-{periodo[1]:02d}", " ".join(f"{c}={v}" for c, v in sorted(codigos.items())))
+            return 0
+        for rut, valor in sorted(hist.por_periodo(args.codigo, *args.periodo).items()):
+            print(rut, valor)
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+honorarios_f29.py — Retención de boletas de honorarios (línea 61, código 151; línea 64, código 155).
+
+Calcula bruto → retención → líquido de cada boleta de documentos["linea_61"]
+con la tasa del año de emisión de la boleta (calculo_f29.tasa_honorarios:
+15,25% en 2026, 16% en 2027, 17% desde 2028), no la del período. Las boletas
+con "prestamo_solidario": true retienen además el 3% del Art. 42 N°2, que va
+al código 155 (retenciones["prestamo_solidario_retencion"]).
+
+Las boletas cuya retención declarada no cuadra con la tasa quedan en una nota
+para la hoja "Alertas y Notas"; el código 151 se calcula con la retención
+correcta. Con NumPy los montos de todas las boletas se calculan de una vez;
+sin NumPy, boleta por boleta.
+
+Uso:
+    from scripts.honorarios_f29 import calcular_honorarios
+    datos = calcular_honorarios(datos)      # llena retencion/liquido y el código 155
+    codigos = calcular_f29(datos)           # código 151 = suma de retenciones
+
+    python -m scripts.honorarios_f29 datos.json -o datos_honorarios.json
+"""
+
+import argparse
+import json
+import re
+import sys
+
+from scripts.calculo_f29 import (
+    TASA_PRESTAMO_SOLIDARIO, ColumnasDocumentos, Documento, calcular_f29, datos_desde_json,
+    formato_peso, periodo_datos, recalcular_totales, tasa_honorarios,
+)
+
+try:
+    import numpy as np
+except ImportError:  # sin NumPy: boleta por boleta
+    np = None
+
+_ANIO = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+
+
+def _anio(fecha, defecto):
+    """Año de una fecha "2026-01-15", "15/01/2026" o date/datetime; `defecto` si no se puede leer."""
+    if hasattr(fecha, "year"):
+        return fecha.year
+    m = _ANIO.search(str(fecha or ""))
+    return int(m.group(1)) if m else defecto
+
+
+def _anios(fechas, defecto):
+    """Año de cada fecha; las fechas se repiten mucho en un mes, así que se lee cada una una vez."""
+    por_fecha = {f: _anio(f, defecto) for f in set(fechas)}
+    return [por_fecha[f] for f in fechas]
+
+
+def _montos(brutos, tasas):
+    """round(bruto × tasa / 100) de cada boleta; tasas en %."""
+    if np is None:
+        return [int(b * t / 100 + 0.5) if b > 0 else -int(-b * t / 100 + 0.5) for b, t in zip(brutos, tasas)]
+    arr = np.asarray(brutos, dtype=float)
+    m = np.sign(arr) * np.floor(np.abs(arr) * np.asarray(tasas, dtype=float) / 100 + 0.5)
+    return m.astype(np.int64)
+
+
+def retenciones_boletas(brutos, anios, prestamo=None):
+    """
+    (retención, retención 3%) de cada boleta a partir de su bruto y año de
+    emisión. prestamo: marcas del 3% Art. 42 N°2 por boleta (None = ninguna).
+    Con NumPy son arrays de int64; sin NumPy, listas.
+    """
+    por_anio = {a: tasa_honorarios(a) for a in set(anios)}
+    retencion = _montos(brutos, [por_anio[a] for a in anios])
+    if prestamo is None or not any(prestamo):
+        return retencion, [0] * len(brutos) if np is None else np.zeros(len(brutos), dtype=np.int64)
+    return retencion, _montos(brutos, [TASA_PRESTAMO_SOLIDARIO if p else 0.0 for p in prestamo])
+
+
+def _porcentaje(tasa):
+    return f"{tasa:.2f}%".replace(".", ",")
+
+
+def _campos(doc, folio):
+    """(bruto, fecha, retención declarada, folio, 3%) de una boleta dict o Documento."""
+    if isinstance(doc, Documento):
+        return doc.neto, doc.fecha, doc.iva, doc.numero or folio, bool(doc.prestamo_solidario)
+    g = doc.get
+    bruto = g("bruto")
+    retencion = g("retencion")
+    return (g("neto", 0) if bruto is None else bruto, g("fecha"),
+            g("iva") if retencion is None else retencion, g("numero", folio), bool(g("prestamo_solidario")))
+
+
+def _boleta(doc, bruto, retencion, prestamo):
+    """Boleta con retención y líquido (bruto − retención − 3%) calculados, del mismo tipo que `doc`."""
+    liquido = bruto - retencion - prestamo
+    if isinstance(doc, Documento):
+        return Documento(doc.numero, doc.fecha, doc.rut, doc.razon_social, doc.descripcion,
+                         doc.neto, retencion, doc.exento, liquido, doc.tipo_doc, doc.prestamo_solidario)
+    nueva = {**doc, "retencion": retencion, "liquido": liquido}
+    if prestamo or "retencion_prestamo" in doc:
+        nueva["retencion_prestamo"] = prestamo
+    return nueva
+
+
+def calcular_honorarios(datos, tolerancia=1, max_folios=5):
+    """
+    Copia de `datos` con retención y líquido de cada boleta de
+    documentos["linea_61"] calculados con la tasa de su año (campo fecha; sin
+    fecha, el año del período). El código 151 sale de las boletas en
+    calcular_f29 y el 155 de retenciones["prestamo_solidario_retencion"]; en
+    modo códigos se fijan datos["codigos"][151] y [155] y se corrigen los
+    totales (595, 547, 91, 94).
+
+    Las boletas que traían una retención a más de `tolerancia` pesos de la
+    calculada se informan en una nota (hasta `max_folios` folios). Una
+    retención 0 o ausente cuenta como no declarada, en dict y en Documento
+    (que guarda 0 si la boleta no la traía), igual que el IUSC en iusc_f29.
+    """
+    docs = datos.get("documentos", {}).get("linea_61")
+    nuevo = dict(datos)
+    if not docs:
+        return nuevo
+    anio_periodo = periodo_datos(datos)[0]
+
+    if isinstance(docs, ColumnasDocumentos):
+        cols = docs.columnas
+        n = len(docs)
+        brutos = next((cols[c] for c in ("bruto", "neto") if c in cols), [0] * n)
+        fechas = cols.get("fecha")
+        anios = _anios(fechas, anio_periodo) if fechas is not None else [anio_periodo] * n
+        declaradas = cols.get("retencion", cols.get("iva"))
+        folios = cols.get("numero", range(1, n + 1))
+        retencion, prestamo = retenciones_boletas(brutos, anios, cols.get("prestamo_solidario"))
+        extra = {"retencion_prestamo": prestamo} if any(prestamo) else {}
+        liquido = [b - r - p for b, r, p in zip(brutos, retencion, prestamo)] if np is None else \
+            np.asarray(brutos) - retencion - prestamo
+        nuevos_docs = ColumnasDocumentos({**cols, "retencion": retencion, "liquido": liquido, **extra})
+    else:
+        docs = list(docs)
+        brutos, fechas, declaradas, folios, marcas = zip(*(_campos(d, i) for i, d in enumerate(docs, 1)))
+        anios = _anios(fechas, anio_periodo)
+        retencion, prestamo = retenciones_boletas(brutos, anios, marcas)
+        nuevos_docs = [_boleta(d, b, int(r), int(p)) for d, b, r, p in zip(docs, brutos, retencion, prestamo)]
+    nuevo["documentos"] = {**datos["documentos"], "linea_61": nuevos_docs}
+
+    total, total_prestamo = int(sum(retencion)), int(sum(prestamo))
+    nuevo["retenciones"] = {**datos.get("retenciones", {}), "prestamo_solidario_retencion": total_prestamo}
+    if "linea_61" in datos.get("agregados", {}):
+        agregados = dict(datos["agregados"])
+        agregados["linea_61"] = {**agregados["linea_61"], "iva": total}
+        nuevo["agregados"] = agregados
+    if "codigos" in nuevo:
+        nuevo["codigos"] = recalcular_totales(nuevo["codigos"], {151: total, 155: total_prestamo})
+
+    if declaradas is not None:
+        desviadas = [(folio, anio) for folio, anio, d, r in zip(folios, anios, declaradas, retencion)
+                     if d and abs(d - r) > tolerancia]
+        if desviadas:
+            lista = ", ".join(f"{folio} ({_porcentaje(tasa_honorarios(anio))})"
+                              for folio, anio in desviadas[:max_folios])
+            mas = "…" if len(desviadas) > max_folios else ""
+            nuevo["notas"] = list(nuevo.get("notas", [])) + [(
+                "HONORARIOS",
+                f"{len(desviadas)} boleta(s) con retención distinta a la tasa de su año: {lista}{mas}. "
+                f"Se usa la calculada (código 151 = {formato_peso(total)}).")]
+    return nuevo
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Calcula la retención de las boletas de honorarios de un F29.")
+    p.add_argument("datos", help="JSON con los datos del F29 (documentos['linea_61'] con bruto y fecha)")
+    p.add_argument("--tolerancia", type=int, default=1, help="Pesos de diferencia tolerados por boleta")
+    p.add_argument("-o", "--salida", help="Guardar los datos con las retenciones calculadas en este JSON")
+    args = p.parse_args(argv)
+
+    with open(args.datos, encoding="utf-8") as f:
+        datos = calcular_honorarios(datos_desde_json(json.load(f)), tolerancia=args.tolerancia)
+    codigos = calcular_f29(datos)
+    boletas = datos.get("documentos", {}).get("linea_61") or []
+    print(f"{len(boletas)} boletas, código 151 = {formato_peso(codigos.get(151, 0))}, "
+          f"código 155 = {formato_peso(codigos.get(155, 0))}")
+    for tipo, msg in datos.get("notas", []):
+        if tipo == "HONORARIOS":
+            print(f"  - {msg}")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=1, default=lambda o: o.a_dict())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+incremental_f29.py — Recálculo incremental del F29 al llegar o anularse documentos.
+
+Mantiene los totales por línea y el grafo de dependencias entre códigos
+(502 → 538 → 89 → 595 → 547 → 91, 520 → 537 → 77, 563 → 62 → 723 → 595, ...).
+Cada documento agregado o quitado actualiza los totales de su línea y
+recalcula solo los códigos que dependen de ella: trabajo constante por evento,
+sin volver a recorrer los documentos del mes.
+
+Uso:
+    from scripts.incremental_f29 import CalculadoraF29Incremental
+    calc = CalculadoraF29Incremental(datos)
+    cambios = calc.agregar_documento("linea_7", {"neto": 100000, "iva": 19000})
+    calc.codigos[89], calc.codigos[91]
+"""
+
+from scripts.calculo_f29 import (
+    ALL_CRED_LINES, CAMPOS_AGREGADOS, L_DEB_GENERA, L_RET,
+    LINEAS_BASE_PPM, LINEAS_DOC_CREDITO, LINEAS_DOC_DEBITO, LINEAS_DOC_RETENCION, LINEAS_DOC_SIN_CREDITO,
+    _base_ppm, _codigo_linea_retencion, _codigos_linea_credito, _codigos_linea_debito,
+    _codigos_linea_sin_credito, _ppm_determinado, _sence, _subtotal_595, _total_547,
+    agregar_documentos, calcular_f29, montos_documento, suma_signada,
+)
+
+
+def _signados(lines):
+    return tuple(ca for _, _, _, ca, op in lines if op in ('+', '-'))
+
+
+# Códigos derivados, en orden topológico: código → (códigos de los que depende, fórmula).
+# Las fórmulas son las mismas funciones de calculo_f29 que usa calcular_f29; `p` es datos["ppm"].
+DERIVADOS = [
+    (538, _signados(L_DEB_GENERA), lambda cod, p: suma_signada(cod, L_DEB_GENERA)),
+    (511, (519, 524), lambda cod, p: cod[519] + cod[524]),
+    (514, (520, 525), lambda cod, p: cod[520] + cod[525]),
+    (537, _signados(ALL_CRED_LINES), lambda cod, p: suma_signada(cod, ALL_CRED_LINES)),
+    (89, (538, 537), lambda cod, p: max(cod[538] - cod[537], 0)),
+    (77, (538, 537), lambda cod, p: max(cod[537] - cod[538], 0)),
+    (68, (563, 115), lambda cod, p: _ppm_determinado(cod[563], cod[115], p.get("suspension"))[0]),
+    (62, (563, 115), lambda cod, p: _ppm_determinado(cod[563], cod[115], p.get("suspension"))[1]),
+    (723, (721, 722, 62), lambda cod, p: _sence(cod[721], cod[722], cod[62])[0]),
+    (724, (721, 722, 62), lambda cod, p: _sence(cod[721], cod[722], cod[62])[1]),
+    (595, (89, 62, 723) + tuple(ca for _, _, _, ca, _ in L_RET), lambda cod, p: _subtotal_595(cod)),
+    (547, (595, 549, 507, 596), lambda cod, p: _total_547(cod)),
+    (91, (547,), lambda cod, p: cod[547]),
+    (94, (91,), lambda cod, p: cod[91]),
+]
+
+_LINEAS_BASE_PPM = {lk for lk, _, _ in LINEAS_BASE_PPM}
+
+
+class CalculadoraF29Incremental:
+    """
+    Estado vivo de un F29 en modo cálculo (datos sin "codigos").
+
+    `codigos` siempre coincide con calcular_f29 sobre los documentos vigentes.
+    agregar_documento / quitar_documento devuelven {código: valor nuevo} con
+    los códigos que cambiaron.
+    """
+
+    def __init__(self, datos):
+        if "codigos" in datos:
+            raise ValueError("El cálculo incremental requiere datos desglosados, no 'codigos'")
+        self._v = datos.get("ventas", {})
+        self._c = datos.get("compras", {})
+        self._ret = datos.get("retenciones", {})
+        self._ppm = datos.get("ppm", {})
+        self._sin_derecho = datos.get("prorrateo", {}).get("sin_derecho", {})
+        docs = datos.get("documentos", {})
+        self.agregados = {lk: dict(a) for lk, a in datos.get("agregados", {}).items()}
+        self.agregados.update(agregar_documentos(
+            {lk: d for lk, d in docs.items() if lk not in self.agregados}))
+        self.codigos = calcular_f29(datos)
+
+        # Qué códigos hoja depende de cada línea y a quién afecta cada código
+        self._por_linea = {}
+        for linea in LINEAS_DOC_DEBITO:
+            self._por_linea.setdefault(linea[2], []).append(("debito", linea))
+        for linea in LINEAS_DOC_CREDITO:
+            self._por_linea.setdefault(linea[2], []).append(("credito", linea))
+        for linea in LINEAS_DOC_SIN_CREDITO:
+            self._por_linea.setdefault(linea[2], []).append(("sin_credito", linea))
+        for linea in LINEAS_DOC_RETENCION:
+            self._por_linea.setdefault(linea[1], []).append(("retencion", linea))
+        self._dependientes = {}
+        for code, deps, _ in DERIVADOS:
+            for dep in deps:
+                self._dependientes.setdefault(dep, set()).add(code)
+
+    def agregar_documento(self, lk, doc):
+        return self._aplicar(lk, doc, 1)
+
+    def quitar_documento(self, lk, doc):
+        """Quita un documento previamente agregado (anulado, rechazado o reemplazado)."""
+        return self._aplicar(lk, doc, -1)
+
+    def _aplicar(self, lk, doc, signo):
+        agg = self.agregados.get(lk)
+        if agg is None:
+            if signo < 0:
+                raise ValueError(f"No hay documentos en {lk} para quitar")
+            agg = self.agregados[lk] = dict.fromkeys(("cant",) + CAMPOS_AGREGADOS, 0)
+        agg["cant"] += signo
+        for campo, monto in montos_documento(doc, lk).items():
+            agg[campo] += signo * monto
+        if agg["cant"] <= 0:
+            del self.agregados[lk]  # sin documentos: la línea vuelve a ventas/compras
+        return self._propagar(self._recalcular_linea(lk))
+
+    def _recalcular_linea(self, lk):
+        nuevos = {}
+        for tipo, linea in self._por_linea.get(lk, ()):
+            if tipo == "debito":
+                nuevos[linea[0]], nuevos[linea[1]] = _codigos_linea_debito(
+                    self.agregados, self._v, self._c, *linea[2:])
+            elif tipo == "credito":
+                nuevos[linea[0]], nuevos[linea[1]] = _codigos_linea_credito(
+                    self.agregados, self._c, self._sin_derecho, *linea[2:])
+            elif tipo == "sin_credito":
+                nuevos[linea[0]], nuevos[linea[1]] = _codigos_linea_sin_credito(
+                    self.agregados, self._c, *linea[2:])
+            else:
+                nuevos[linea[0]] = _codigo_linea_retencion(self.agregados, self._ret, *linea[1:])
+        if lk in _LINEAS_BASE_PPM:
+            nuevos[563] = _base_ppm(self.agregados, self._v, self._ppm)
+        cambios = {k: val for k, val in nuevos.items() if self.codigos.get(k) != val}
+        self.codigos.update(cambios)
+        return cambios
+
+    def _propagar(self, cambios):
+        afectados = set()
+        for code in cambios:
+            afectados |= self._dependientes.get(code, set())
+        for code, _, formula in DERIVADOS:
+            if code not in afectados:
+                continue
+            valor = formula(self.codigos, self._ppm)
+            if self.codigos.get(code) != valor:
+                self.codigos[code] = cambios[code] = valor
+                afectados |= self._dependientes.get(code, set())
+        return cambios
@@ -0,0 +1,231 @@
+"""
+indice_f29.py — Índice de códigos del F29: línea, sección, signo y celda de cada código.
+
+FILAS_F29 es la tabla de filas de la hoja (encabezados, líneas, totales)
+armada con las tablas de calculo_f29: generar_f29._write_f29 la renderiza y
+este módulo la recorre al importar para armar un mapa inmutable código →
+InfoCodigo, sin openpyxl ni renderizar la hoja. Los validadores, el lector y
+el evaluador buscan ahí en O(1) la celda o el signo de un código.
+generar_f29 comprueba al compilar el layout que el índice coincide con la
+hoja renderizada.
+
+Uso:
+    from scripts.indice_f29 import INDICE_CODIGOS, CELDAS_CODIGOS
+    info = INDICE_CODIGOS[538]
+    info.linea, info.seccion, info.signo, info.celda      # 23, 'DÉBITOS Y VENTAS', '=', 'N30'
+    CELDAS_CODIGOS[77]                                    # celda del valor del código 77
+    CODIGO_POR_CELDA["N30"]                               # 538
+"""
+
+from collections import namedtuple
+from types import MappingProxyType
+
+from scripts.calculo_f29 import (
+    L_ANTICIPO_CS, L_ART37, L_ART42_CRED, L_ART42_DEB, L_CRED_ESP, L_CRED_IEPD, L_CRED_IMP, L_CRED_INT,
+    L_CRED_OTROS, L_CRED_REM, L_CRED_SIN, L_CS_AGENTE, L_CS_ESPECIAL, L_DEB_GENERA, L_DEB_INFO, L_POST_51,
+    L_POST_CUOTAS, L_PPM, L_REM_CRED_ESP, L_RET, L_TRIB_SIMP, L_VENTA_REMOTA, PPM_LINE69_CODES, PPM_MULTI,
+)
+
+# celda: valor del código ("N23"); celda_codigo: celda donde está impreso el
+# código ("M23"); entrada: el valor viene de `codigos`; calculado: es fórmula.
+InfoCodigo = namedtuple("InfoCodigo", "codigo linea descripcion seccion subseccion signo "
+                                      "celda celda_codigo entrada calculado")
+
+_COLUMNAS = "ABCDEFGHIJKLMNO"
+
+
+def _lineas(lines):
+    return tuple(("linea", *line) for line in lines)
+
+
+def _lineas_ppm():
+    """Líneas 70 a 79: las de PPM_MULTI con varios pares código/valor, el resto estándar."""
+    filas = [("linea", *L_PPM[1])]
+    for num, desc, cq, ca, op in L_PPM[2:5]:
+        filas.append(("ppm_multi", num, desc, PPM_MULTI[num]) if num in PPM_MULTI else ("linea", num, desc, cq, ca, op))
+    return tuple(filas) + _lineas(L_PPM[5:])
+
+
+# Filas de la hoja F29, en orden: (tipo, *argumentos). generar_f29._write_f29
+# las renderiza y _planificar ubica con ellas cada código: una sola tabla
+# define el layout. Tipos:
+#   titulo, periodo          filas 1 y 2
+#   g / b (texto)            encabezado de sección / subsección
+#   h (etiquetas de _h), h2 (descripción, cantidad, monto), ppm_h: encabezados de columnas
+#   linea (num, desc, cq, ca, op)             cantidad en I/J, monto en M/N
+#   total (num, desc, ca)                     fórmula en N (generar_f29._FORMULAS[ca])
+#   doble (num, desc, cod1, cod2, op)         fórmulas en J y N
+#   suelta (num, desc, cq, ca, op, formula)   cq sin valor en I/J; ca en M/N, fórmula si `formula`
+#   ppm69, ppm_multi (num, desc, códigos)     filas PPM con varios pares código/valor
+FILAS_F29 = (
+    ("titulo",),
+    ("periodo",),
+
+    ("g", 'DÉBITOS Y VENTAS'),
+    ("b", 'VENTAS Y/O SERVICIOS PRESTADOS'),
+    ("b", 'INFORMACIÓN DE INGRESOS'),
+    ("h", {"d_label": 'Cantidad de Documentos', "f_label": 'Monto Neto', "g_label": None}),
+    *_lineas(L_DEB_INFO),
+    ("h", {"d_label": 'Cantidad de Documentos', "f_label": 'Débito', "b_label": 'GENERA DÉBITO'}),
+    *_lineas(L_DEB_GENERA),
+    ("total", 23, 'TOTAL DÉBITOS', 538),
+
+    ("g", 'CRÉDITOS Y COMPRAS'),
+    ("b", 'COMPRAS Y/O SERVICIOS UTILIZADOS'),
+    ("h", {"d_label": 'Con Derecho a Crédito', "f_label": 'Sin Derecho a Crédito', "g_label": None}),
+    ("linea", 24, 'IVA por documentos electrónicos recibidos', 511, 514, None),
+    ("b", 'SIN DERECHO A CRÉDITO FISCAL'),
+    ("h", {"d_label": 'Cantidad de Documentos', "f_label": 'Monto Neto', "g_label": None}),
+    *_lineas(L_CRED_SIN),
+    ("b", 'CON DERECHO A CRÉDITO FISCAL'),
+    ("b", 'INTERNAS'),
+    ("h", {"d_label": 'Cantidad de Documentos', "f_label": 'Crédito, Recuperación y Reintegro'}),
+    *_lineas(L_CRED_INT),
+    ("b", 'IMPORTACIONES'),
+    *_lineas(L_CRED_IMP),
+    *_lineas(L_CRED_REM),
+    ("b", 'LEY 20.765'),
+    ("h", {"d_label": 'M3 Comprados con Derecho a Crédito', "f_label": 'Componentes del Impuesto'}),
+    *_lineas(L_CRED_IEPD),
+    *_lineas(L_CRED_OTROS),
+    ("total", 49, 'TOTAL CRÉDITOS', 537),
+
+    ("h2", 'POSTERGACIÓN DE IVA', 'Remanente CF', 'Impuesto Determinado'),
+    ("doble", 50, 'Remanente de crédito fiscal para el período siguiente', 77, 89, '+'),
+    *_lineas(L_POST_51),
+    ("h2", 'POSTERGACIÓN IVA EN CUOTAS (D.S. 420/997 MH)', None, 'Imp. Determinado'),
+    *_lineas(L_POST_CUOTAS),
+
+    ("g", 'IMPUESTO A LA RENTA D.L. 824/74'),
+    ("b", 'RETENCIONES'),
+    ("h", {"d_label": None, "f_label": 'Impuesto Determinado'}),
+    *_lineas(L_RET),
+    ("b", 'PPM'),
+    ("ppm_h",),
+    ("ppm69",),
+    *_lineas_ppm(),
+    ("total", 80, 'Sub total impuesto determinado anverso (Suma de las líneas 50 a 78)', 595),
+
+    ("g", 'SISTEMA DE TRIBUTACIÓN SIMPLIFICADA DEL IVA, ART. 29 D.L. 825'),
+    ("h", {"d_label": None, "f_label": 'Impuesto Determinado'}),
+    *_lineas(L_TRIB_SIMP),
+
+    ("g", 'IMPUESTO ADICIONAL ART. 37 D.L. 825'),
+    ("h", {"d_label": None, "f_label": 'Impuesto Determinado'}),
+    *_lineas(L_ART37),
+    ("doble", 91, 'Remanente crédito impuesto Art.37 para período siguiente', 549, 550, '+'),
+
+    ("g", 'IMPUESTO ADICIONAL ART. 42 D.L. 825'),
+    ("h2", 'DÉBITOS', None, 'Débito'),
+    *_lineas(L_ART42_DEB),
+    ("total", 100, 'Total Débitos Art. 42 DL 825', 602),
+    ("h2", 'CRÉDITOS', 'Total Crédito Recargado Facturas Recibidas', 'Crédito Imputable del Periodo'),
+    *_lineas(L_ART42_CRED),
+    ("total", 111, 'Total créditos Art.42 DL 825', 603),
+    ("doble", 112, 'Remanente crédito Imp. Adic. Art.42 para período siguiente', 507, 506, '+'),
+
+    ("g", 'CAMBIO DE SUJETO D.L. 825'),
+    ("b", 'ANTICIPO CAMBIO DE SUJETO (CONTRIBUYENTES RETENIDOS)'),
+    ("h", {"d_label": None, "f_label": 'Monto'}),
+    *_lineas(L_ANTICIPO_CS),
+    ("total", 116, 'Total de Anticipo', 543),
+    ("suelta", 117, 'Remanente Anticipos Cambio Sujeto para período siguiente', 573, 598, '-', True),
+    ("b", 'CAMBIO DE SUJETO (AGENTE RETENEDOR)'),
+    *_lineas(L_CS_AGENTE),
+    ("b", 'CAMBIO ESPECIAL DE SUJETO (Inciso 7º, Art. 3º D.L. 825)'),
+    *_lineas(L_CS_ESPECIAL),
+    ("total", 126, 'Monto neto de IVA retenido en el período', 103),
+    ("suelta", 127, 'Remanente de ajuste para el próximo período', None, 104, '=', True),
+    ("b", 'IVA POR LA VENTA REMOTA DE BIENES CORPORALES MUEBLES (Art. 3° bis e inciso final del art. 4°, D.L. 825)'),
+    *_lineas(L_VENTA_REMOTA),
+    ("total", 131, 'Monto neto de IVA del período', 814),
+    ("suelta", 132, 'Remanente de ajuste para el próximo período', None, 815, '=', True),
+    ("b", 'IMPUESTO SUSTITUTIVO RETENIDO POR RÉGIMEN TRIBUTARIO ESPECIAL A COMERCIANTES DE FERIAS LIBRES'),
+    ("linea", 133, 'Impuesto sustitutivo retenido por régimen tributario especial a comerciantes de ferias libres',
+     None, 816, '='),
+
+    ("g", 'CRÉDITOS ESPECIALES'),
+    ("h", {"d_label": 'Base / Remanente Anterior', "f_label": 'Crédito del Período'}),
+    *_lineas(L_CRED_ESP),
+    ("total", 140, 'TOTAL DETERMINADO', 547),
+
+    ("g", 'REMANENTE CRÉDITOS ESPECIALES'),
+    ("h", {"d_label": None, "f_label": 'Remanente', "g_label": None}),
+    *_lineas(L_REM_CRED_ESP),
+
+    ("total", 147, 'TOTAL A PAGAR EN PLAZO LEGAL', 91),
+    ("linea", 148, 'Más IPC', None, 92, '+'),
+    ("linea", 149, 'Más Intereses y multas', None, 93, '+'),
+    ("suelta", None, 'Condonación', None, 60, None, False),
+    ("total", 150, 'TOTAL A PAGAR CON RECARGO', 94),
+)
+
+
+def _planificar():
+    """Recorre FILAS_F29 y anota la celda, sección y signo de cada código que la hoja ubica."""
+    codigos = {}
+    seccion = subseccion = None
+    for fila, (tipo, *args) in enumerate(FILAS_F29, 1):
+
+        def codigo(code, columna, num, desc, signo, entrada=True, calculado=False):
+            """Código impreso en `columna` con su valor en la columna siguiente."""
+            col = _COLUMNAS.index(columna)
+            codigos[code] = InfoCodigo(code, num, desc, seccion, subseccion, signo,
+                                       f"{_COLUMNAS[col + 1]}{fila}", f"{columna}{fila}", entrada, calculado)
+
+        if tipo == "g":
+            seccion, subseccion = args[0], None
+        elif tipo == "b":
+            subseccion = args[0]
+        elif tipo == "linea":
+            num, desc, cq, ca, op = args
+            if cq is not None:
+                codigo(cq, "I", num, desc, op)
+            if ca is not None:
+                codigo(ca, "M", num, desc, op)
+        elif tipo == "total":
+            num, desc, ca = args
+            codigo(ca, "M", num, desc, "=", entrada=False, calculado=True)
+        elif tipo == "doble":
+            num, desc, code1, code2, op = args
+            codigo(code1, "I", num, desc, op, entrada=False, calculado=True)
+            codigo(code2, "M", num, desc, op, entrada=False, calculado=True)
+        elif tipo == "suelta":
+            num, desc, cq, ca, op, formula = args
+            if cq is not None:
+                codigo(cq, "I", num, desc, op, entrada=False)
+            codigo(ca, "M", num, desc, op, entrada=False, calculado=formula)
+        elif tipo in ("ppm69", "ppm_multi"):
+            num, desc, codes = (L_PPM[0][0], L_PPM[0][1], PPM_LINE69_CODES) if tipo == "ppm69" else args
+            primera = _COLUMNAS.index("C" if tipo == "ppm69" else "E")
+            for i, code in enumerate(codes):
+                calculado = tipo == "ppm69" and i == len(codes) - 1
+                codigo(code, _COLUMNAS[primera + 2 * i], num, desc, "+", entrada=not calculado, calculado=calculado)
+    return codigos
+
+
+INDICE_CODIGOS = MappingProxyType(_planificar())
+CELDAS_CODIGOS = MappingProxyType({code: info.celda for code, info in INDICE_CODIGOS.items()})
+CODIGO_POR_CELDA = MappingProxyType({info.celda: code for code, info in INDICE_CODIGOS.items()})
+
+
+def diferencias_layout(cc, formulas=(), entradas=(), impresos=None):
+    """
+    Diferencias entre el índice y una hoja renderizada: cc ({código: celda} de
+    _write_f29), celdas con fórmula, códigos de entrada e impresos ({celda:
+    valor} de las celdas donde la hoja escribe cada código). Lista vacía si calzan.
+    """
+    difs = [f"código {code}: índice {CELDAS_CODIGOS.get(code)}, hoja {celda}"
+            for code, celda in cc.items() if CELDAS_CODIGOS.get(code) != celda]
+    difs += [f"código {code}: no está en la hoja" for code in INDICE_CODIGOS if code not in cc]
+    if formulas:
+        difs += [f"código {code}: calculado={info.calculado}, hoja con fórmula={info.celda in formulas}"
+                 for code, info in INDICE_CODIGOS.items() if info.calculado != (info.celda in formulas)]
+    if entradas:
+        entradas = set(entradas)
+        difs += [f"código {code}: entrada={info.entrada} en el índice"
+                 for code, info in INDICE_CODIGOS.items() if info.entrada != (code in entradas)]
+    if impresos is not None:
+        difs += [f"código {code}: la hoja no lo imprime en {info.celda_codigo}"
+                 for code, info in INDICE_CODIGOS.items() if impresos.get(info.celda_codigo) != code]
+    return difs
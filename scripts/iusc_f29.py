@@ -0,0 +1,199 @@
+"""
+iusc_f29.py — Impuesto Único de Segunda Categoría (línea 60, código 48) desde las rentas.
+
+Calcula el IUSC de cada liquidación con la tabla mensual del Art. 43 N° 1
+LIR: tramos en UTM con su factor y cantidad a rebajar, que se pasan a pesos
+con la UTM del período (la entrega quien llama: no hay valores de UTM
+incluidos). El impuesto de cada renta es renta × factor − rebaja del tramo
+que la contiene, redondeado al peso.
+
+El tramo se busca en la lista ordenada de límites: con NumPy, un
+searchsorted para todas las rentas a la vez; sin NumPy, bisect por renta.
+Miles de trabajadores se calculan en milisegundos.
+
+Uso:
+    from scripts.iusc_f29 import calcular_iusc, TablaIUSC
+    datos = calcular_iusc(datos, utm={(2026, 1): valor_utm_enero})   # llena documentos["linea_60"]
+    codigos = calcular_f29(datos)                                    # código 48 = suma del IUSC
+
+    tabla = TablaIUSC.desde_utm(valor_utm)
+    tabla.impuesto(2_500_000), tabla.impuestos(rentas)
+
+    python -m scripts.iusc_f29 datos.json --utm 68000 -o datos_iusc.json
+"""
+
+import argparse
+import json
+import math
+import sys
+from bisect import bisect_left
+
+from scripts.calculo_f29 import (
+    ColumnasDocumentos, Documento, calcular_f29, datos_desde_json, formato_peso, periodo_datos,
+    recalcular_totales,
+)
+
+try:
+    import numpy as np
+except ImportError:  # sin NumPy: bisect por renta
+    np = None
+
+# Tabla mensual del Impuesto Único (Art. 43 N° 1 LIR), en UTM:
+# (renta desde, factor, cantidad a rebajar). Cada tramo va hasta el "desde" del siguiente.
+TRAMOS_UTM = (
+    (0, 0.0, 0.0),
+    (13.5, 0.04, 0.54),
+    (30, 0.08, 1.74),
+    (50, 0.135, 4.49),
+    (70, 0.23, 11.14),
+    (90, 0.304, 17.8),
+    (120, 0.35, 23.32),
+    (310, 0.40, 38.82),
+)
+
+
+class TablaIUSC:
+    """
+    Tabla del IUSC de un período en pesos. desde: límite inferior de cada
+    tramo (el primero 0; una renta igual a un límite queda en el tramo de
+    abajo, como en la tabla del SII), con su factor y rebaja.
+    """
+
+    def __init__(self, desde, factores, rebajas):
+        if not (len(desde) == len(factores) == len(rebajas)) or not desde or desde[0] != 0:
+            raise ValueError("La tabla necesita el mismo número de límites, factores y rebajas, desde 0")
+        if any(a >= b for a, b in zip(desde, desde[1:])):
+            raise ValueError("Los límites de los tramos deben ser crecientes")
+        self.desde = list(desde)
+        self.factores = list(factores)
+        self.rebajas = list(rebajas)
+        if np is not None:
+            self._np = (np.asarray(self.desde, dtype=float), np.asarray(self.factores, dtype=float),
+                        np.asarray(self.rebajas, dtype=float))
+
+    @classmethod
+    def desde_utm(cls, utm):
+        """Tabla del mes con la UTM `utm` (pesos), redondeada al centavo como la publica el SII."""
+        if not utm or utm <= 0:
+            raise ValueError(f"Valor de UTM inválido: {utm!r}")
+        return cls([round(d * utm, 2) for d, _, _ in TRAMOS_UTM],
+                   [f for _, f, _ in TRAMOS_UTM],
+                   [round(r * utm, 2) for _, _, r in TRAMOS_UTM])
+
+    def impuesto(self, renta):
+        """IUSC en pesos de una renta tributable mensual."""
+        i = max(bisect_left(self.desde, renta) - 1, 0)
+        return max(math.floor(renta * self.factores[i] - self.rebajas[i] + 0.5), 0)
+
+    def impuestos(self, rentas):
+        """
+        IUSC de muchas rentas. Con NumPy un array de int64 si `rentas` es un
+        array, si no una lista; sin NumPy siempre una lista.
+        """
+        if np is None:
+            return [self.impuesto(r) for r in rentas]
+        desde, factores, rebajas = self._np
+        arr = np.asarray(rentas, dtype=float)
+        i = np.searchsorted(desde, arr, side="left") - 1
+        np.maximum(i, 0, out=i)
+        imp = np.maximum(np.floor(arr * factores[i] - rebajas[i] + 0.5), 0).astype(np.int64)
+        return imp if isinstance(rentas, np.ndarray) else imp.tolist()
+
+
+def tabla_periodo(datos, utm=None):
+    """
+    Tabla del período de `datos`. utm: valor de la UTM del mes, o
+    {(anio, mes): valor} como en periodos_f29; si no se pasa, datos["utm"].
+    """
+    utm = datos.get("utm") if utm is None else utm
+    if isinstance(utm, dict):
+        utm = utm.get(periodo_datos(datos))
+    if utm is None:
+        anio, mes = periodo_datos(datos)
+        raise ValueError(f"Falta el valor de la UTM de {mes:02d}/{anio} para calcular el IUSC")
+    return TablaIUSC.desde_utm(utm)
+
+
+def _renta(doc):
+    """Renta tributable de una liquidación: renta_tributable si viene; si no, el bruto."""
+    if isinstance(doc, Documento):
+        return doc.neto
+    base = doc.get("renta_tributable")
+    return base if base is not None else doc.get("bruto", doc.get("neto", 0)) or 0
+
+
+def _con_iusc(doc, iusc):
+    if isinstance(doc, Documento):
+        copia = Documento(*(getattr(doc, c) for c in Documento.__slots__))
+        copia.iva = iusc
+        return copia
+    return {**doc, "iusc": iusc}
+
+
+def calcular_iusc(datos, utm=None, tabla=None):
+    """
+    Copia de `datos` con el IUSC de cada liquidación de documentos["linea_60"]
+    calculado desde su renta tributable (campo renta_tributable o, si no
+    viene, bruto). El código 48 sale de esos documentos en calcular_f29; en
+    modo códigos se fija datos["codigos"][48] y se corrigen los totales (595,
+    547, 91, 94). Si una liquidación traía otro IUSC, se agrega una nota para
+    la hoja "Alertas y Notas".
+
+    tabla: TablaIUSC ya armada; si no, se arma con la UTM (ver tabla_periodo).
+    """
+    tabla = tabla or tabla_periodo(datos, utm)
+    docs = datos.get("documentos", {}).get("linea_60")
+    nuevo = dict(datos)
+    if not docs:
+        return nuevo
+
+    if isinstance(docs, ColumnasDocumentos):
+        cols = docs.columnas
+        base = next((cols[c] for c in ("renta_tributable", "bruto", "neto") if c in cols), [0] * len(docs))
+        previos = cols.get("iusc", cols.get("iva"))
+        impuestos = tabla.impuestos(base)
+        nuevos_docs = ColumnasDocumentos({**cols, "iusc": impuestos})
+    else:
+        docs = list(docs)
+        previos = [d.get("iusc", d.get("iva")) for d in docs]
+        impuestos = tabla.impuestos([_renta(d) for d in docs])
+        nuevos_docs = [_con_iusc(d, int(v)) for d, v in zip(docs, impuestos)]
+    nuevo["documentos"] = {**datos["documentos"], "linea_60": nuevos_docs}
+
+    total = int(sum(impuestos))
+    if "codigos" in nuevo:
+        nuevo["codigos"] = recalcular_totales(nuevo["codigos"], {48: total})
+    if previos is not None:
+        distintos = sum(1 for p, v in zip(previos, impuestos) if p and int(p) != int(v))
+        if distintos:
+            nuevo["notas"] = list(nuevo.get("notas", [])) + [(
+                "IUSC",
+                f"{distintos} liquidación(es) traían un IUSC distinto al de la tabla del período; "
+                f"se usa el calculado (total {formato_peso(total)}).")]
+    return nuevo
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Calcula el IUSC (línea 60) de las liquidaciones de un F29.")
+    p.add_argument("datos", help="JSON con los datos del F29 (documentos['linea_60'] con bruto o renta_tributable)")
+    p.add_argument("--utm", type=float, help="Valor de la UTM del período (por defecto, datos['utm'])")
+    p.add_argument("-o", "--salida", help="Guardar los datos con el IUSC calculado en este JSON")
+    args = p.parse_args(argv)
+
+    with open(args.datos, encoding="utf-8") as f:
+        datos = datos_desde_json(json.load(f))
+    try:
+        datos = calcular_iusc(datos, utm=args.utm)
+    except ValueError as e:
+        print(f"ERROR  {e}", file=sys.stderr)
+        return 1
+    liquidaciones = datos.get("documentos", {}).get("linea_60") or []
+    print(f"{len(liquidaciones)} liquidaciones, código 48 = {formato_peso(calcular_f29(datos).get(48, 0))}")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False, indent=1, default=lambda o: o.a_dict())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+lector_f29.py — Lee los códigos de un F29 ya generado sin cargar el workbook.
+
+Abre el xlsx como zip y lee solo la hoja F29 (la primera, unos 80 KB): el
+detalle de documentos, las alertas, sharedStrings y estilos no se leen. Las
+celdas se recorren con una expresión regular sobre los bytes, varias veces
+más rápido que un parser XML (iterparse queda para XML con prefijos).
+Cada código se ubica con indice_f29 (celda del código y de su valor); una
+hoja con otro layout se recorre: cada código es un entero en una columna de
+código (C, E, G, I, K, M) y su valor está en la columna siguiente (D ... N).
+Las fórmulas toman el resultado guardado en el archivo (cachear_formulas=True,
+o un archivo que Excel volvió a guardar) y si no lo traen se evalúan con
+verificar_f29.
+
+Uso:
+    from scripts.lector_f29 import leer_codigos, leer_varios
+    cod = leer_codigos("F29-Diciembre-2025.xlsx")
+    print(cod[77], cod.get(724, 0), cod[506])
+
+    for archivo, codigos, error in leer_varios(glob.glob("archivo/**/*.xlsx", recursive=True), workers=8):
+        ...
+
+    python -m scripts.lector_f29 archivo/*.xlsx --codigos 77 506 724
+"""
+
+import argparse
+import io
+import json
+import posixpath
+import re
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import unescape
+
+from scripts.indice_f29 import CELDAS_CODIGOS, INDICE_CODIGOS
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_C, _V, _F = NS_MAIN + "c", NS_MAIN + "v", NS_MAIN + "f"
+
+# Columnas de código → columna de valor (C/D ... M/N)
+_COLUMNAS_CODIGO = {"C": "D", "E": "F", "G": "H", "I": "J", "K": "L", "M": "N"}
+
+_PRIMERA_HOJA = re.compile(rb'<(?:\w+:)?sheet\b[^>]*?\br:id="([^"]+)"')
+_RELACION = re.compile(rb'<Relationship\b[^>]*>')
+_ATRIBUTO = re.compile(rb'(\w+)="([^"]*)"')
+
+# Celda con contenido (las vacías son <c .../>): referencia (openpyxl, Excel y
+# LibreOffice la escriben primero), resto de atributos, fórmula y valor guardado
+_CELDA = re.compile(rb'<c r="([A-Z]+[0-9]+)"([^>/]*)>(?:<f[^>]*?(?:/>|>([^<]*)</f>))?(?:<v>([^<]*)</v>)?')
+_ENTIDADES = {"&quot;": '"', "&apos;": "'"}
+
+
+def _ruta_primera_hoja(zf):
+    """Parte del zip con la primera hoja, según workbook.xml y sus relaciones."""
+    m = _PRIMERA_HOJA.search(zf.read("xl/workbook.xml"))
+    if m:
+        for rel in _RELACION.findall(zf.read("xl/_rels/workbook.xml.rels")):
+            attrs = dict(_ATRIBUTO.findall(rel))
+            if attrs.get(b"Id") == m.group(1):
+                destino = attrs[b"Target"].decode()
+                return destino.lstrip("/") if destino.startswith("/") else posixpath.join("xl", destino)
+    return "xl/worksheets/sheet1.xml"
+
+
+def _numero(texto):
+    try:
+        return int(texto)
+    except ValueError:
+        v = float(texto)
+        return int(v) if v.is_integer() else v
+
+
+def _celdas(xml):
+    """
+    {celda: número o "=fórmula"} de una hoja. Solo números y fórmulas: los
+    textos (etiquetas, signos) no sirven para códigos ni cálculos.
+    """
+    celdas = {}
+    for ref, attrs, formula, v in _CELDA.findall(xml):
+        if b't="' in attrs and b't="n"' not in attrs:
+            continue  # texto, booleano o error
+        if v:
+            celdas[ref.decode()] = _numero(v)
+        elif formula:
+            celdas[ref.decode()] = "=" + unescape(formula.decode("utf-8"), _ENTIDADES)
+    return celdas
+
+
+def _celdas_xml(f):
+    """Como _celdas, con un parser XML: para hojas con prefijos de namespace (<x:c>)."""
+    celdas = {}
+    for _, el in iterparse(f):
+        if el.tag != _C:
+            continue
+        if el.get("t") in (None, "n"):
+            v = el.find(_V)
+            if v is not None and v.text:
+                celdas[el.get("r")] = _numero(v.text)
+            else:
+                formula = el.find(_F)
+                if formula is not None and formula.text:
+                    celdas[el.get("r")] = "=" + formula.text
+        el.clear()
+    return celdas
+
+
+def _ubicar_codigos(celdas):
+    """{código: celda del valor}: la del índice si la hoja tiene el layout actual; si no, recorre las columnas de código."""
+    if all(celdas.get(info.celda_codigo) == code for code, info in INDICE_CODIGOS.items()):
+        return CELDAS_CODIGOS
+    ubicacion = {}
+    for ref, valor in celdas.items():
+        # Columnas de código: una letra (C ... M) seguida de la fila
+        if type(valor) is int and ref[1].isdigit():
+            destino = _COLUMNAS_CODIGO.get(ref[0])
+            if destino:
+                ubicacion[valor] = destino + ref[1:]
+    return ubicacion
+
+
+def codigos_de_celdas(celdas):
+    """
+    {código: valor} desde las celdas de la hoja F29 ({"M23": 502, "N23": ...}).
+    Los códigos sin valor en la hoja quedan en 0.
+    """
+    ubicacion = _ubicar_codigos(celdas)
+
+    codigos, pendientes = {}, []
+    for code, ref in ubicacion.items():
+        valor = celdas.get(ref, 0)
+        if isinstance(valor, str):
+            pendientes.append(code)
+        codigos[code] = valor
+    if pendientes:
+        from scripts.verificar_f29 import evaluar_celdas
+        valores = evaluar_celdas(celdas, [ubicacion[code] for code in pendientes])
+        for code in pendientes:
+            codigos[code] = valores[ubicacion[code]]
+    return codigos
+
+
+def leer_codigos(origen):
+    """
+    {código: valor} de un F29 generado por generar_f29_excel. origen: ruta o
+    archivo binario abierto (con seek). Solo lee la hoja F29.
+    """
+    with zipfile.ZipFile(origen) as zf:
+        xml = zf.read(_ruta_primera_hoja(zf))
+    celdas = _celdas(xml)
+    if not celdas:
+        celdas = _celdas_xml(io.BytesIO(xml))
+    return codigos_de_celdas(celdas)
+
+
+def _leer_seguro(archivo):
+    try:
+        return archivo, leer_codigos(archivo), None
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, SyntaxError) as e:
+        return archivo, None, f"{type(e).__name__}: {e}"
+
+
+def leer_varios(archivos, workers=None):
+    """
+    Lee muchos archivos; entrega (archivo, codigos, error) en el mismo orden.
+    Un archivo dañado no corta la lectura: codigos=None y el error en texto.
+    workers: procesos (None o 1 = en este proceso).
+    """
+    archivos = list(archivos)
+    if not workers or workers == 1 or len(archivos) < 2:
+        yield from map(_leer_seguro, archivos)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_leer_seguro, archivos, chunksize=max(1, len(archivos) // (workers * 8)))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Lee los códigos de F29 ya generados (sin cargar el workbook).")
+    p.add_argument("archivos", nargs="+", help="Archivos .xlsx generados por generar_f29_excel")
+    p.add_argument("--codigos", type=int, nargs="+", help="Solo estos códigos (por defecto: todos)")
+    p.add_argument("-w", "--workers", type=int, default=None, help="Procesos (por defecto: uno)")
+    p.add_argument("--json", action="store_true", help="Una línea JSON por archivo")
+    args = p.parse_args(argv)
+
+    con_error = 0
+    for archivo, codigos, error in leer_varios(args.archivos, args.workers):
+        if error:
+            con_error += 1
+            print(f"ERROR  {archivo}: {error}", file=sys.stderr)
+            continue
+        if args.codigos:
+            codigos = {c: codigos.get(c, 0) for c in args.codigos}
+        if args.json:
+            print(json.dumps({"archivo": archivo, "codigos": codigos}, ensure_ascii=False))
+        else:
+            print(archivo, " ".join(f"{c}={v}" for c, v in codigos.items()))
+    return 1 if con_error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
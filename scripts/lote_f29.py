@@ -0,0 +1,214 @@
+"""
+lote_f29.py — Generación masiva de F29 en paralelo.
+
+Reparte calcular_f29 + render de las 3 hojas + wb.save de cada cliente en un
+pool de procesos y entrega los resultados a medida que terminan. Un error en
+un cliente se informa en su resultado y no detiene el resto del lote.
+
+Uso:
+    from scripts.lote_f29 import generar_f29_lote
+    for res in generar_f29_lote(lista_de_datos, "salida/", workers=8):
+        print(res["archivo"], res["error"] or res["codigos"][91])
+
+    python -m scripts.lote_f29 clientes.jsonl salida/ --workers 8
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from scripts.calculo_f29 import datos_desde_json, generar_f29_excel, periodo_datos
+
+
+def nombre_archivo_f29(datos, indice):
+    """Nombre por defecto: F29-<RUT>-<AAAAMM>.xlsx (o F29-<índice> si no hay RUT)."""
+    enc = datos.get("encabezado", {})
+    rut = re.sub(r"[^0-9kK]", "", str(enc.get("rut", "")))
+    mes = enc.get("periodo_mes", 1)
+    anio = enc.get("periodo_anio", 2026)
+    return f"F29-{rut or indice}-{anio}{mes:02d}.xlsx"
+
+
+def _generar_cliente(indice, datos, output_path, opciones, cache=None):
+    """Trabajo de un proceso del pool: nunca lanza, devuelve el error como texto."""
+    inicio = time.perf_counter()
+    generar = cache.generar_f29_excel if cache is not None else generar_f29_excel
+    try:
+        codigos = generar(datos, output_path, **opciones)
+        error = None
+    except Exception as e:
+        codigos, error = None, f"{type(e).__name__}: {e}"
+    return indice, codigos, error, time.perf_counter() - inicio
+
+
+def _resultado(indice, datos, archivo, codigos, error, segundos):
+    return {
+        "indice": indice,
+        "rut": datos.get("encabezado", {}).get("rut"),
+        "archivo": archivo,
+        "codigos": codigos,
+        "error": error,
+        "segundos": segundos,
+    }
+
+
+def generar_f29_lote(lote, output_dir, workers=None, nombre_archivo=None, en_vuelo=None,
+                     layout_compilado=True, cache=None, historial=None):
+    """
+    Genera un F29 por cada `datos` de `lote` y entrega un dict por cliente a
+    medida que terminan (no en el orden de entrada).
+
+    Cada resultado trae: indice, rut, archivo, codigos, error, segundos.
+    `error` es None si el cliente se generó bien.
+
+    workers: procesos del pool (por defecto os.cpu_count()); 0 o 1 = en serie.
+    nombre_archivo: callable (datos, indice) -> nombre del xlsx.
+    en_vuelo: máximo de clientes enviados al pool a la vez (por defecto
+        4 × workers), para no materializar lotes de miles de clientes.
+    layout_compilado: usa el esqueleto compilado de la hoja F29 (se compila
+        una vez por proceso del pool).
+    cache: CacheF29 opcional; los clientes con datos ya generados se copian
+        desde la caché sin renderizar.
+    historial: HistorialF29 opcional; los códigos de cada cliente generado se
+        guardan en él, en lotes (desde este proceso, no desde el pool). Los
+        clientes sin RUT válido se generan igual, pero no se guardan.
+    """
+    resultados = _generar_lote(lote, output_dir, workers, nombre_archivo, en_vuelo, layout_compilado, cache)
+    if historial is None:
+        yield from (res for res, _ in resultados)
+        return
+    from scripts.historial_f29 import normalizar_rut
+    pendientes = []
+    try:
+        for res, datos in resultados:
+            if not res["error"]:
+                try:
+                    rut = normalizar_rut(datos.get("encabezado", {}).get("rut"))
+                    pendientes.append((rut, *periodo_datos(datos), res["codigos"], res["archivo"]))
+                except ValueError:
+                    pass
+                if len(pendientes) >= _LOTE_HISTORIAL:
+                    historial.guardar_muchos(pendientes)
+                    pendientes = []
+            yield res
+    finally:
+        historial.guardar_muchos(pendientes)
+
+
+# Períodos por transacción al guardar en el historial
+_LOTE_HISTORIAL = 500
+
+
+def _generar_lote(lote, output_dir, workers, nombre_archivo, en_vuelo, layout_compilado, cache):
+    """generar_f29_lote sin historial: entrega (resultado, datos) a medida que terminan."""
+    os.makedirs(output_dir, exist_ok=True)
+    nombre_archivo = nombre_archivo or nombre_archivo_f29
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    opciones = {"layout_compilado": layout_compilado}
+
+    def tareas():
+        for indice, datos in enumerate(lote):
+            try:
+                archivo = os.path.join(output_dir, nombre_archivo(datos, indice))
+            except Exception as e:
+                # Encabezado inválido: se informa sin pasar por el pool
+                yield indice, datos, None, f"{type(e).__name__}: {e}"
+                continue
+            yield indice, datos, archivo, None
+
+    if workers <= 1:
+        for indice, datos, archivo, error in tareas():
+            if error:
+                yield _resultado(indice, datos, archivo, None, error, 0.0), datos
+                continue
+            _, codigos, error, seg = _generar_cliente(indice, datos, archivo, opciones, cache)
+            yield _resultado(indice, datos, archivo, codigos, error, seg), datos
+        return
+
+    en_vuelo = en_vuelo or 4 * workers
+    pendientes = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        it = tareas()
+        agotado = False
+        while pendientes or not agotado:
+            while not agotado and len(pendientes) < en_vuelo:
+                try:
+                    indice, datos, archivo, error = next(it)
+                except StopIteration:
+                    agotado = True
+                    break
+                if error:
+                    yield _resultado(indice, datos, archivo, None, error, 0.0), datos
+                    continue
+                fut = pool.submit(_generar_cliente, indice, datos, archivo, opciones, cache)
+                pendientes[fut] = (indice, datos, archivo)
+            if not pendientes:
+                break
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for fut in listos:
+                indice, datos, archivo = pendientes.pop(fut)
+                try:
+                    _, codigos, error, seg = fut.result()
+                except Exception as e:  # p.ej. BrokenProcessPool
+                    codigos, error, seg = None, f"{type(e).__name__}: {e}", 0.0
+                yield _resultado(indice, datos, archivo, codigos, error, seg), datos
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def _leer_lote(path):
+    """Lee datos desde .jsonl (uno por línea), .json (lista u objeto) o un directorio de .json."""
+    if os.path.isdir(path):
+        for nombre in sorted(os.listdir(path)):
+            if nombre.endswith(".json"):
+                yield from _leer_lote(os.path.join(path, nombre))
+        return
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for linea in f:
+                if linea.strip():
+                    yield datos_desde_json(json.loads(linea))
+            return
+        contenido = json.load(f)
+    for datos in contenido if isinstance(contenido, list) else [contenido]:
+        yield datos_desde_json(datos)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Genera F29 en lote para muchos contribuyentes.")
+    p.add_argument("entrada", help="Archivo .jsonl/.json o directorio con un .json por cliente")
+    p.add_argument("salida", help="Directorio de salida de los .xlsx")
+    p.add_argument("-w", "--workers", type=int, default=None, help="Procesos (por defecto: núcleos)")
+    p.add_argument("--cache", help="Directorio de caché de F29 ya generados")
+    p.add_argument("--historial", help="Base SQLite donde guardar los códigos de cada cliente")
+    args = p.parse_args(argv)
+
+    cache = historial = None
+    if args.cache:
+        from scripts.cache_f29 import CacheF29
+        cache = CacheF29(args.cache)
+    if args.historial:
+        from scripts.historial_f29 import HistorialF29
+        historial = HistorialF29(args.historial)
+    ok = fallidos = 0
+    inicio = time.perf_counter()
+    for res in generar_f29_lote(_leer_lote(args.entrada), args.salida, workers=args.workers, cache=cache,
+                                historial=historial):
+        if res["error"]:
+            fallidos += 1
+            print(f"ERROR  #{res['indice']} {res['rut'] or ''}: {res['error']}", file=sys.stderr)
+        else:
+            ok += 1
+            print(f"OK     #{res['indice']} {res['archivo']} ({res['segundos']:.2f}s)")
+    print(f"{ok} generados, {fallidos} con error en {time.perf_counter() - inicio:.1f}s")
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+metricas_f29.py — Métricas por etapa de generar_f29_excel para monitoreo.
+
+MetricasF29 es un callback para `generar_f29_excel(..., metricas=...)` que
+junta los eventos de cada etapa (calcular, f29, detalle, alertas, save) y los
+exporta como logs estructurados (una línea JSON por etapa) o como texto
+OpenMetrics para Prometheus y compatibles.
+
+Uso:
+    from scripts.metricas_f29 import MetricasF29
+    m = MetricasF29(rut=datos["encabezado"]["rut"])
+    generar_f29_excel(datos, ruta, metricas=m, medir_memoria=True)
+    m.registrar()                 # logging: logger "f29.metricas", nivel INFO
+    print(m.openmetrics())        # texto para un endpoint /metrics o un textfile collector
+"""
+
+import json
+import logging
+
+LOGGER = logging.getLogger("f29.metricas")
+
+# Campo del evento → (métrica OpenMetrics, ayuda)
+METRICAS = {
+    "segundos": ("f29_etapa_duracion_segundos", "Duración de la etapa de generar_f29_excel."),
+    "memoria_bytes": ("f29_etapa_memoria_bytes", "Memoria retenida al terminar la etapa (tracemalloc)."),
+    "memoria_pico_bytes": ("f29_etapa_memoria_pico_bytes", "Pico de memoria durante la etapa (tracemalloc)."),
+    "filas": ("f29_etapa_filas", "Filas escritas en la hoja de la etapa."),
+    "celdas": ("f29_etapa_celdas", "Celdas escritas en la hoja de la etapa."),
+    "codigos": ("f29_etapa_codigos", "Códigos calculados."),
+    "bytes": ("f29_etapa_archivo_bytes", "Tamaño del xlsx guardado."),
+}
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def a_openmetrics(eventos, etiquetas=None):
+    """
+    Texto OpenMetrics (gauges, terminado en "# EOF") con una serie por etapa
+    y campo medido. `etiquetas` se agregan a todas las series (p.ej. rut).
+    """
+    etiquetas = etiquetas or {}
+    lineas = []
+    for campo, (nombre, ayuda) in METRICAS.items():
+        series = [ev for ev in eventos if ev.get(campo) is not None]
+        if not series:
+            continue
+        lineas.append(f"# TYPE {nombre} gauge")
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        for ev in series:
+            pares = {**etiquetas, "etapa": ev["etapa"]}
+            texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in pares.items())
+            lineas.append(f"{nombre}{{{texto}}} {ev[campo]}")
+    lineas.append("# EOF")
+    return "\n".join(lineas) + "\n"
+
+
+def a_logs(eventos, **contexto):
+    """Una línea JSON por etapa, con el contexto (rut, período, ...) incluido."""
+    return [json.dumps({**contexto, **ev}, ensure_ascii=False, default=str) for ev in eventos]
+
+
+class MetricasF29:
+    """
+    Callback que acumula los eventos de una generación. `contexto` (rut,
+    periodo, cliente, ...) se agrega a los logs y como etiquetas OpenMetrics.
+    """
+
+    def __init__(self, **contexto):
+        self.contexto = contexto
+        self.eventos = []
+
+    def __call__(self, evento):
+        self.eventos.append(evento)
+
+    @property
+    def total_segundos(self):
+        return sum(ev.get("segundos", 0) for ev in self.eventos)
+
+    def etapa(self, nombre):
+        """Evento de la etapa `nombre`, o None si no se registró."""
+        return next((ev for ev in self.eventos if ev["etapa"] == nombre), None)
+
+    def openmetrics(self):
+        return a_openmetrics(self.eventos, self.contexto)
+
+    def logs(self):
+        return a_logs(self.eventos, **self.contexto)
+
+    def registrar(self, logger=None, nivel=logging.INFO):
+        """Emite un registro por etapa; los campos van también en `extra` para handlers JSON."""
+        logger = logger or LOGGER
+        for linea, ev in zip(self.logs(), self.eventos):
+            logger.log(nivel, linea, extra={"f29": {**self.contexto, **ev}})
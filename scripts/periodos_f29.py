@@ -0,0 +1,181 @@
+"""
+periodos_f29.py — Serie de períodos de un contribuyente con remanentes encadenados.
+
+Calcula los meses en orden cronológico y arrastra cada remanente al mes
+siguiente (77 → 504, 506 → 508, 550 → 540, 724 → 722), de modo que una
+declaración anual o una rectificación en cadena es una sola llamada. La
+cadena de cálculo es barata y secuencial; el render de los Excel se reparte
+después en paralelo con generar_f29_lote.
+
+Uso:
+    from scripts.periodos_f29 import calcular_serie, generar_serie_f29
+    for datos, codigos in calcular_serie(meses):
+        print(datos["encabezado"]["periodo_mes"], codigos[77], codigos[91])
+
+    resultados = generar_serie_f29(meses, "salida/", workers=8)
+
+    # Continuar desde el F29 ya generado del mes anterior al primero
+    from scripts.lector_f29 import leer_codigos
+    serie = calcular_serie(meses, anterior=leer_codigos("F29-Diciembre-2025.xlsx"))
+
+    python -m scripts.periodos_f29 meses_2026.jsonl salida/ --anterior F29-Diciembre-2025.xlsx
+"""
+
+import argparse
+import sys
+import time
+
+from scripts.calculo_f29 import L_ART37, L_ART42_CRED, L_ART42_DEB, calcular_f29, periodo_datos, recalcular_totales, suma_signada
+from scripts.historial_f29 import normalizar_rut
+from scripts.lote_f29 import _leer_lote, generar_f29_lote
+
+# (código que deja el mes N, código que recibe el mes N+1, llave en datos del mes N+1)
+ARRASTRES = [
+    (77, 504, ("remanente_anterior",)),
+    (506, 508, ("remanente_art42_anterior",)),
+    (550, 540, ("remanente_art37_anterior",)),
+    (724, 722, ("ppm", "remanente_sence_anterior")),
+]
+
+
+def remanente_art37(codigos):
+    """Código 550 como lo calcula la hoja (línea 91): el saldo negativo de las líneas Art. 37."""
+    if 550 in codigos:
+        return codigos[550]
+    return max(-suma_signada(codigos, L_ART37), 0)
+
+
+def remanente_art42(codigos):
+    """Código 506 como lo calcula la hoja (línea 112): 603 − 602 si es positivo."""
+    if 506 in codigos:
+        return codigos[506]
+    deb = codigos[602] if 602 in codigos else suma_signada(codigos, L_ART42_DEB)
+    cred = codigos[603] if 603 in codigos else suma_signada(codigos, L_ART42_CRED)
+    return max(cred - deb, 0)
+
+
+# Remanentes que la hoja calcula con fórmula y pueden faltar en `codigos`
+_REMANENTE = {550: remanente_art37, 506: remanente_art42}
+
+
+def _siguiente(periodo):
+    anio, mes = periodo
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def _periodo_anterior(datos):
+    anio, mes = periodo_datos(datos)
+    return (anio - 1, 12) if mes == 1 else (anio, mes - 1)
+
+
+def _validar_rut(serie):
+    """Todos los meses deben ser del mismo RUT (normalizado), o ninguno traerlo."""
+    ruts = {}
+    for datos in serie:
+        rut = datos.get("encabezado", {}).get("rut")
+        ruts.setdefault(normalizar_rut(rut) if rut else None, periodo_datos(datos))
+    if len(ruts) > 1:
+        detalle = ", ".join(f"{rut or 'sin RUT'} ({mes:02d}/{anio})" for rut, (anio, mes) in ruts.items())
+        raise ValueError(f"La serie mezcla contribuyentes: {detalle}")
+
+
+def _arrastrar(datos, codigos, utm=None):
+    """Copia de `datos` con los remanentes de `codigos` (mes anterior) cargados."""
+    valores = {destino: _REMANENTE.get(origen, lambda cod: cod.get(origen, 0))(codigos)
+               for origen, destino, _ in ARRASTRES}
+    if utm:
+        # Art. 27 D.L. 825: el remanente de CF se reajusta según la variación de la UTM
+        anterior, actual = utm.get(_periodo_anterior(datos)), utm.get(periodo_datos(datos))
+        if anterior and actual:
+            valores[504] = round(valores[504] * actual / anterior)
+
+    nuevo = dict(datos)
+    if "codigos" in nuevo:
+        nuevo["codigos"] = recalcular_totales(nuevo["codigos"], valores)
+        return nuevo
+    for _, destino, llave in ARRASTRES:
+        if len(llave) == 1:
+            nuevo[llave[0]] = valores[destino]
+        else:
+            nuevo[llave[0]] = {**nuevo.get(llave[0], {}), llave[1]: valores[destino]}
+    return nuevo
+
+
+def calcular_serie(serie, utm=None, anterior=None):
+    """
+    Calcula una serie de meses de un mismo contribuyente, encadenando los
+    remanentes. Devuelve [(datos_encadenados, codigos), ...] en orden cronológico.
+
+    El primer mes usa los remanentes que traiga; los siguientes los reciben del
+    mes anterior (lo que traigan para 504/508/540/722 se reemplaza). En modo
+    códigos se fijan esos códigos y se corrigen los totales que dependen de
+    ellos (537, 89/77, 595, 547, 91...); el resto del mes se toma tal cual.
+    utm: opcional, {(anio, mes): valor UTM} para reajustar el remanente 504.
+    anterior: opcional, códigos del mes previo al primero (p. ej. leídos de su
+    xlsx con lector_f29.leer_codigos); el primer mes también los recibe.
+    Lanza ValueError si los meses son de RUT distintos, hay meses repetidos o
+    faltan meses intermedios.
+    """
+    serie = list(serie)
+    _validar_rut(serie)
+    ordenada = sorted(serie, key=periodo_datos)
+    resultado = []
+    for datos in ordenada:
+        if not resultado and anterior is not None:
+            datos = _arrastrar(datos, anterior, utm)
+        if resultado:
+            previo_datos, previo = resultado[-1]
+            if periodo_datos(datos) == periodo_datos(previo_datos):
+                raise ValueError(f"Período repetido en la serie: {periodo_datos(datos)}")
+            if periodo_datos(datos) != _siguiente(periodo_datos(previo_datos)):
+                anio, mes = _siguiente(periodo_datos(previo_datos))
+                raise ValueError(f"Falta el período {mes:02d}/{anio} en la serie")
+            datos = _arrastrar(datos, previo, utm)
+        resultado.append((datos, calcular_f29(datos)))
+    return resultado
+
+
+def generar_serie_f29(serie, output_dir, workers=None, utm=None, anterior=None, **opciones):
+    """
+    Calcula la cadena con calcular_serie y genera el Excel de cada mes en
+    paralelo con generar_f29_lote (mismas opciones). Devuelve los resultados
+    de generar_f29_lote en orden cronológico.
+    """
+    encadenados = [datos for datos, _ in calcular_serie(serie, utm, anterior)]
+    resultados = list(generar_f29_lote(encadenados, output_dir, workers=workers, **opciones))
+    return sorted(resultados, key=lambda res: res["indice"])
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Genera los F29 de una serie de meses con remanentes encadenados.")
+    p.add_argument("entrada", help="Archivo .jsonl/.json o directorio con un .json por mes")
+    p.add_argument("salida", help="Directorio de salida de los .xlsx")
+    p.add_argument("-w", "--workers", type=int, default=None, help="Procesos (por defecto: núcleos)")
+    p.add_argument("--anterior", help="F29 .xlsx ya generado del mes previo al primero (toma sus remanentes)")
+    args = p.parse_args(argv)
+
+    inicio = time.perf_counter()
+    anterior = None
+    if args.anterior:
+        from scripts.lector_f29 import leer_codigos
+        anterior = leer_codigos(args.anterior)
+    try:
+        resultados = generar_serie_f29(_leer_lote(args.entrada), args.salida, workers=args.workers,
+                                       anterior=anterior)
+    except ValueError as e:
+        print(f"ERROR  {e}", file=sys.stderr)
+        return 1
+    fallidos = 0
+    for res in resultados:
+        if res["error"]:
+            fallidos += 1
+            print(f"ERROR  {res['archivo']}: {res['error']}", file=sys.stderr)
+        else:
+            cod = res["codigos"]
+            print(f"OK     {res['archivo']}  504={cod.get(504, 0)} 77={cod.get(77, 0)} 91={cod.get(91, 0)}")
+    print(f"{len(resultados) - fallidos} generados, {fallidos} con error en {time.perf_counter() - inicio:.1f}s")
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
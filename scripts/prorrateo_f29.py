@@ -0,0 +1,227 @@
+"""
+prorrateo_f29.py — Prorrateo del crédito fiscal de uso común (ventas afectas + exentas/exportación).
+
+Con ventas afectas y exentas en el mismo año, el IVA de las compras de uso
+común (arriendo, internet, servicios generales) solo da crédito en la
+proporción de las ventas afectas acumuladas de enero al mes que se declara
+(references/GUIA_SOFTWARE.md, sección 5). En diciembre se ajusta el año: el
+crédito del mes es el del año con la proporción anual menos el ya usado.
+
+ProrrateoAnual guarda las ventas de cada mes y el acumulado del año: agregar
+un mes (o corregirlo) es O(1), sin volver a leer los documentos de los meses
+anteriores. El resultado va a datos["prorrateo"]; calcular_f29 descuenta de
+520 y 525 el IVA no utilizable, que se informa en la nota PRORRATEO (no es
+una compra sin derecho a crédito de la línea 25: no va al código 521).
+
+El IVA de uso común sale de los documentos de linea_28 / linea_31 marcados con
+"uso_comun": true, o de datos["uso_comun"] = {"linea_28": iva, "linea_31": iva}
+(los Documento compactos no guardan la marca: usar los totales).
+
+Uso:
+    from scripts.prorrateo_f29 import ProrrateoAnual, prorratear_serie
+    prorrateo = ProrrateoAnual(2026)
+    for datos in meses_2026:                    # en orden
+        datos = prorrateo.aplicar(datos)
+        codigos = calcular_f29(datos)           # 520/525 ajustados
+
+    serie = calcular_serie(prorratear_serie(meses))   # con periodos_f29
+
+    python -m scripts.prorrateo_f29 meses_2026.jsonl
+"""
+
+import argparse
+import sys
+
+from scripts.calculo_f29 import agregar_documentos, formato_peso, periodo_datos, recalcular_totales, redondear
+
+# Líneas de ventas por destino del prorrateo: (línea, campo neto en ventas, signo)
+VENTAS_PRORRATEO = {
+    "afectas": [("linea_7", "facturas_afectas_neto", 1), ("linea_10", "boletas_neto", 1),
+                ("linea_12", "notas_debito_neto", 1), ("linea_13", "notas_credito_neto", -1)],
+    "exentas": [("linea_2", "facturas_exentas_giro_neto", 1)],
+    "exportacion": [("linea_1", "facturas_exportacion_neto", 1)],
+}
+# Líneas de crédito que se prorratean: línea → código de monto
+LINEAS_USO_COMUN = {"linea_28": 520, "linea_31": 525}
+
+
+def ventas_periodo(datos):
+    """
+    (afectas, exentas, exportacion) netas del mes, desde los documentos o
+    ventas como en calcular_f29. En modo códigos: 563 − 142 − 20, 142 y 20.
+    """
+    if "codigos" in datos:
+        cod = datos["codigos"]
+        exentas, exportacion = cod.get(142, 0), cod.get(20, 0)
+        return cod.get(563, 0) - exentas - exportacion, exentas, exportacion
+    lineas = {lk for destino in VENTAS_PRORRATEO.values() for lk, _, _ in destino}
+    v = datos.get("ventas", {})
+    agg = dict(datos.get("agregados", {}))
+    agg.update(agregar_documentos({lk: d for lk, d in datos.get("documentos", {}).items()
+                                   if lk in lineas and lk not in agg}, campos=("neto",)))
+    return tuple(sum(signo * (agg[lk]["neto"] if lk in agg else v.get(campo, 0)) for lk, campo, signo in lineas_destino)
+                 for lineas_destino in VENTAS_PRORRATEO.values())
+
+
+def uso_comun(datos):
+    """{línea: IVA de uso común del mes} desde datos["uso_comun"] o los documentos marcados."""
+    if "uso_comun" in datos:
+        return {lk: iva for lk, iva in datos["uso_comun"].items() if lk in LINEAS_USO_COMUN}
+    docs = datos.get("documentos", {})
+    totales = {}
+    for lk in LINEAS_USO_COMUN:
+        marcados = [d for d in docs.get(lk, ()) if isinstance(d, dict) and d.get("uso_comun")]
+        if marcados:
+            totales[lk] = sum(d.get("iva", 0) or 0 for d in marcados)
+    return totales
+
+
+class ProrrateoAnual:
+    """
+    Ventas y crédito de uso común de un año comercial, mes a mes.
+    exportacion_con_credito: las exportaciones cuentan como afectas (su
+    crédito se recupera, Art. 36); por defecto van solo al total, como en la
+    fórmula de la guía.
+    """
+
+    def __init__(self, anio, exportacion_con_credito=False):
+        self.anio = anio
+        self.exportacion_con_credito = exportacion_con_credito
+        self.ventas = {}      # mes → (afectas, exentas, exportacion)
+        self.credito = {}     # mes → {línea: (IVA uso común, IVA utilizado)}
+        self._acumulado = [0, 0, 0]
+
+    def registrar(self, mes, afectas, exentas=0, exportacion=0):
+        """Ventas del mes; si el mes ya estaba (rectificación) reemplaza sus montos."""
+        if not 1 <= mes <= 12:
+            raise ValueError(f"Mes inválido: {mes}")
+        previo = self.ventas.get(mes, (0, 0, 0))
+        nuevo = (afectas, exentas, exportacion)
+        self._acumulado = [a - p + n for a, p, n in zip(self._acumulado, previo, nuevo)]
+        self.ventas[mes] = nuevo
+
+    def acumulado(self, hasta_mes=None):
+        """(afectas, exentas, exportacion) de enero a `hasta_mes` (por defecto, todo lo registrado)."""
+        if hasta_mes is None or hasta_mes >= max(self.ventas, default=0):
+            return tuple(self._acumulado)
+        meses = [v for m, v in self.ventas.items() if m <= hasta_mes]
+        return tuple(sum(col) for col in zip(*meses)) if meses else (0, 0, 0)
+
+    def proporcion(self, hasta_mes=None):
+        """Fracción del CF de uso común que da crédito (1.0 sin ventas exentas ni exportación)."""
+        afectas, exentas, exportacion = self.acumulado(hasta_mes)
+        con_credito = afectas + (exportacion if self.exportacion_con_credito else 0)
+        total = afectas + exentas + exportacion
+        if total <= 0 or con_credito >= total:
+            return 1.0
+        return max(con_credito, 0) / total
+
+    def _utilizable(self, mes, lk, iva, p):
+        if mes < 12:
+            return redondear(iva * p)
+        # Ajuste anual (diciembre): crédito del año con la proporción anual menos el ya usado
+        previos = [c[lk] for m, c in self.credito.items() if m < 12 and lk in c]
+        return redondear((sum(u for u, _ in previos) + iva) * p) - sum(x for _, x in previos)
+
+    def aplicar(self, datos):
+        """
+        Registra las ventas del mes de `datos` y devuelve una copia con
+        datos["prorrateo"] = {"proporcion", "acumulado", "uso_comun", "sin_derecho"}
+        (IVA no utilizable por línea, que calcular_f29 resta de 520/525) y
+        una nota para "Alertas y Notas" con ese monto. En modo códigos ajusta
+        520/525 y los totales que dependen de ellos. Lanza ValueError si el
+        mes es de otro año.
+        """
+        anio, mes = periodo_datos(datos)
+        if anio != self.anio:
+            raise ValueError(f"El período {mes:02d}/{anio} no es del año {self.anio} del prorrateo")
+        self.registrar(mes, *ventas_periodo(datos))
+        p = self.proporcion(mes)
+        del_mes = uso_comun(datos)
+        lineas = set(del_mes)
+        if mes == 12:
+            lineas.update(lk for c in self.credito.values() for lk in c)
+
+        credito, sin_derecho = {}, {}
+        for lk in sorted(lineas):
+            iva = del_mes.get(lk, 0)
+            utilizable = self._utilizable(mes, lk, iva, p)
+            credito[lk] = (iva, utilizable)
+            sin_derecho[lk] = iva - utilizable
+        self.credito[mes] = credito
+
+        nuevo = dict(datos)
+        nuevo["prorrateo"] = {"proporcion": p, "acumulado": self.acumulado(mes),
+                              "uso_comun": del_mes, "sin_derecho": sin_derecho}
+        if lineas and p < 1:
+            ajuste = " con ajuste anual" if mes == 12 else ""
+            no_utilizable = sum(sin_derecho.values())
+            porcentaje = f"{p * 100:.2f}".replace(".", ",")
+            nuevo["notas"] = list(nuevo.get("notas", [])) + [(
+                "PRORRATEO",
+                f"Proporción acumulada enero–{mes:02d}/{anio}: {porcentaje}%{ajuste}. CF de uso común "
+                f"{formato_peso(sum(del_mes.values()))}; no utilizable {formato_peso(no_utilizable)} "
+                f"(descontado del crédito en 520/525).")]
+        if "codigos" in nuevo:
+            cod = nuevo["codigos"]
+            cambios = {ca: cod.get(ca, 0) - sin_derecho[lk]
+                       for lk, ca in LINEAS_USO_COMUN.items() if lk in sin_derecho}
+            nuevo["codigos"] = recalcular_totales(cod, cambios)
+        return nuevo
+
+    def a_dict(self):
+        """Estado serializable a JSON (para seguir el año en otra ejecución)."""
+        return {"anio": self.anio, "exportacion_con_credito": self.exportacion_con_credito,
+                "ventas": {str(m): list(v) for m, v in self.ventas.items()},
+                "credito": {str(m): {lk: list(x) for lk, x in c.items()} for m, c in self.credito.items()}}
+
+    @classmethod
+    def desde_dict(cls, estado):
+        prorrateo = cls(estado["anio"], estado.get("exportacion_con_credito", False))
+        for mes, ventas in sorted(estado.get("ventas", {}).items(), key=lambda kv: int(kv[0])):
+            prorrateo.registrar(int(mes), *ventas)
+        prorrateo.credito = {int(m): {lk: tuple(x) for lk, x in c.items()}
+                             for m, c in estado.get("credito", {}).items()}
+        return prorrateo
+
+
+def prorratear_serie(serie, exportacion_con_credito=False):
+    """
+    Aplica el prorrateo a una serie de meses en orden cronológico, con un
+    acumulado nuevo en cada enero. Devuelve la lista de datos con
+    datos["prorrateo"]; se puede pasar a periodos_f29.calcular_serie.
+    """
+    resultado, prorrateo = [], None
+    for datos in sorted(serie, key=periodo_datos):
+        anio = periodo_datos(datos)[0]
+        if prorrateo is None or prorrateo.anio != anio:
+            prorrateo = ProrrateoAnual(anio, exportacion_con_credito)
+        resultado.append(prorrateo.aplicar(datos))
+    return resultado
+
+
+def main(argv=None):
+    from scripts.lote_f29 import _leer_lote
+    from scripts.periodos_f29 import calcular_serie
+
+    p = argparse.ArgumentParser(description="Prorrateo del CF de uso común de una serie de meses.")
+    p.add_argument("entrada", help="Archivo .jsonl/.json o directorio con un .json por mes")
+    p.add_argument("--exportacion-con-credito", action="store_true",
+                   help="Contar las exportaciones como ventas con derecho a crédito")
+    args = p.parse_args(argv)
+
+    try:
+        serie = calcular_serie(prorratear_serie(_leer_lote(args.entrada), args.exportacion_con_credito))
+    except ValueError as e:
+        print(f"ERROR  {e}", file=sys.stderr)
+        return 1
+    for datos, codigos in serie:
+        anio, mes = periodo_datos(datos)
+        pro = datos["prorrateo"]
+        print(f"{mes:02d}/{anio}  proporción={pro['proporcion']:.4f}  "
+              f"no utilizable={sum(pro['sin_derecho'].values())}  520={codigos[520]} 525={codigos[525]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
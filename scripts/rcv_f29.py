@@ -0,0 +1,270 @@
+"""
+rcv_f29.py — Ingesta en streaming del Registro de Compras y Ventas (RCV) del SII.
+
+Lee los exports CSV o XLSX de ventas y compras fila a fila, clasifica cada
+documento por Tipo Doc en las líneas `linea_*` de LINEAS_INFO y acumula los
+totales por línea al vuelo (memoria acotada, sin un dict por documento).
+Opcionalmente guarda cada documento en un spool JSONL por línea en disco
+para la hoja "Detalle Documentos".
+
+Uso:
+    from scripts.rcv_f29 import ingerir_rcv
+    datos.update(ingerir_rcv(ventas="rcv_ventas.csv", compras="rcv_compras.csv",
+                             spool_dir="/tmp/f29_spool"))
+    generar_f29_excel(datos, "F29.xlsx", detalle_streaming=True)
+"""
+
+import codecs
+import csv
+import json
+import os
+import re
+import unicodedata
+
+# Tipo Doc SII → línea del F29 (ver tabla "Mapeo RCV → Códigos F29" en SKILL.md)
+TIPOS_VENTAS = {
+    33: "linea_7",    # Factura electrónica
+    34: "linea_2",    # Factura no afecta o exenta
+    39: "linea_10",   # Boleta electrónica
+    56: "linea_12",   # Nota de débito
+    61: "linea_13",   # Nota de crédito
+    110: "linea_1",   # Factura de exportación
+}
+TIPOS_COMPRAS = {
+    33: "linea_28",   # Factura recibida del giro
+    34: "linea_27",   # Factura exenta recibida (sin derecho a CF)
+    46: "linea_28",   # Factura de compra (además retención cambio de sujeto, cód. 39)
+    56: "linea_33",   # Nota de débito recibida
+    61: "linea_32",   # Nota de crédito recibida
+}
+TIPO_FACTURA_COMPRA = 46
+
+# Líneas exentas: calcular_f29 toma el monto desde "neto", pero el RCV lo trae en Monto Exento
+LINEAS_EXENTAS = {"linea_1", "linea_2", "linea_27"}
+
+# Encabezado normalizado (minúsculas, sin tildes) → campo del documento
+COLUMNAS_RCV = {
+    "tipo": ("tipo doc", "tipo documento", "tipo dte"),
+    "numero": ("folio",),
+    "fecha": ("fecha docto", "fecha documento", "fecha emision"),
+    "fecha_recepcion": ("fecha recepcion",),
+    "rut": ("rut cliente", "rut receptor", "rut proveedor", "rut emisor", "rut"),
+    "razon_social": ("razon social",),
+    "exento": ("monto exento",),
+    "neto": ("monto neto",),
+    "iva": ("monto iva", "monto iva recuperable", "iva"),
+    "total": ("monto total", "total"),
+    "iva_retenido_total": ("iva retenido total",),
+}
+_MONTOS = ("exento", "neto", "iva", "total", "iva_retenido_total")
+_MILES = re.compile(r"-?\d{1,3}(?:\.\d{3})+")
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or "")).encode("ascii", "ignore").decode()
+    return " ".join(texto.lower().replace("_", " ").split())
+
+
+def _monto(v):
+    """
+    Monto RCV a int: acepta números, '1234567', '1.234.567', '1.234.567,5',
+    '1234567.5' o vacío. El punto es de miles solo si agrupa de a tres dígitos
+    o si hay coma decimal.
+    """
+    if v is None or v == "":
+        return 0
+    if isinstance(v, (int, float)):
+        return int(v)
+    v = str(v).strip()
+    if "," in v or _MILES.fullmatch(v):
+        v = v.replace(".", "").replace(",", ".")
+    return int(float(v)) if v else 0
+
+
+def _indices(encabezado):
+    """Posición de cada campo conocido en la fila de encabezado."""
+    cols = [_normalizar(c) for c in encabezado]
+    idx = {}
+    for campo, candidatos in COLUMNAS_RCV.items():
+        for cand in candidatos:
+            if cand in cols:
+                idx[campo] = cols.index(cand)
+                break
+    if "tipo" not in idx:
+        raise ValueError(f"El archivo no tiene columna 'Tipo Doc': {encabezado}")
+    return idx
+
+
+def _detectar_encoding(path):
+    with open(path, "rb") as f:
+        muestra = f.read(1 << 16)
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(muestra, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def _filas_csv(path, encoding=None):
+    """(número de línea, fila) del CSV; la primera es el encabezado."""
+    encoding = encoding or _detectar_encoding(path)
+    with open(path, newline="", encoding=encoding) as f:
+        primera = f.readline()
+        delim = ";" if primera.count(";") >= primera.count(",") else ","
+        yield 1, next(csv.reader([primera], delimiter=delim))
+        lector = csv.reader(f, delimiter=delim)
+        for fila in lector:
+            yield lector.line_num + 1, fila
+
+
+def _filas_xlsx(path):
+    """(número de fila, fila) de la primera hoja, desde el encabezado."""
+    import openpyxl  # solo se necesita para exports en Excel
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        encontrado = False
+        for n, fila in enumerate(wb.worksheets[0].iter_rows(values_only=True), 1):
+            # Algunos exports traen filas de título antes del encabezado
+            if not encontrado:
+                if not any(_normalizar(c) in COLUMNAS_RCV["tipo"] for c in fila):
+                    continue
+                encontrado = True
+            yield n, fila
+    finally:
+        wb.close()
+
+
+def iterar_documentos(path, registro, encoding=None, omitidos=None):
+    """
+    (línea, documento) por cada fila de un export RCV (o un libro interno con
+    los mismos encabezados); registro = "ventas" o "compras". Si se entrega
+    `omitidos`, cuenta ahí los Tipo Doc sin línea ({tipo: n}) y las filas con
+    menos columnas que el encabezado (omitidos["incompletas"]).
+    Un monto que no se puede leer lanza ValueError con el archivo, la fila y
+    la columna.
+    """
+    if registro not in ("ventas", "compras"):
+        raise ValueError(f"registro debe ser 'ventas' o 'compras', no {registro!r}")
+    tipos = TIPOS_VENTAS if registro == "ventas" else TIPOS_COMPRAS
+    filas = _filas_xlsx(path) if path.lower().endswith((".xlsx", ".xlsm")) else _filas_csv(path, encoding)
+    _, encabezado = next(filas)
+    idx = _indices(encabezado)
+    n_cols = max(idx.values()) + 1
+
+    for n, fila in filas:
+        if not fila or not any(fila):
+            continue
+        if len(fila) < n_cols:
+            if omitidos is not None:
+                omitidos["incompletas"] = omitidos.get("incompletas", 0) + 1
+            continue
+        valor_tipo = fila[idx["tipo"]]
+        if valor_tipo in (None, ""):
+            continue  # filas de totales o notas al pie
+        try:
+            tipo = int(_monto(valor_tipo))
+        except ValueError:
+            continue
+        lk = tipos.get(tipo)
+        if lk is None:
+            if omitidos is not None:
+                omitidos[tipo] = omitidos.get(tipo, 0) + 1
+            continue
+        doc = {campo: fila[i] for campo, i in idx.items()}
+        for campo in _MONTOS:
+            if campo in doc:
+                try:
+                    doc[campo] = _monto(doc[campo])
+                except ValueError:
+                    raise ValueError(f"{path}, fila {n}, columna {encabezado[idx[campo]]!r}: "
+                                     f"monto inválido {doc[campo]!r}") from None
+        doc["tipo_doc"] = tipo
+        del doc["tipo"]
+        if lk in LINEAS_EXENTAS and not doc.get("neto"):
+            doc["neto"] = doc.get("exento", 0)
+        yield lk, doc
+
+
+class DocumentosSpool:
+    """Documentos de una línea guardados en JSONL; re-iterable y con len() sin cargarlos."""
+
+    def __init__(self, path, n):
+        self.path = path
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        with open(self.path, encoding="utf-8") as f:
+            for linea in f:
+                yield json.loads(linea)
+
+
+class IngestaRCV:
+    """
+    Acumula uno o más archivos RCV. Al terminar, `datos()` entrega las llaves
+    "agregados", "cambio_sujeto" y (con spool_dir) "documentos" para datos.
+    """
+
+    def __init__(self, spool_dir=None):
+        self.spool_dir = spool_dir
+        self.agregados = {}
+        self.omitidos = {}
+        self.iva_retenido_fc = 0
+        self._spool = {}
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+
+    def leer(self, path, registro, encoding=None):
+        """Procesa un export RCV; registro = "ventas" o "compras"."""
+        for lk, doc in iterar_documentos(path, registro, encoding, self.omitidos):
+            self._acumular(lk, doc)
+            if registro == "compras" and doc["tipo_doc"] == TIPO_FACTURA_COMPRA:
+                self.iva_retenido_fc += doc.get("iva_retenido_total") or doc.get("iva", 0)
+        return self
+
+    def _acumular(self, lk, doc):
+        agg = self.agregados.get(lk)
+        if agg is None:
+            agg = self.agregados[lk] = {"cant": 0, "neto": 0, "iva": 0, "exento": 0, "total": 0}
+        agg["cant"] += 1
+        agg["neto"] += doc.get("neto", 0)
+        agg["iva"] += doc.get("iva", 0)
+        agg["exento"] += doc.get("exento", 0)
+        agg["total"] += doc.get("total", 0)
+        if self.spool_dir:
+            f = self._spool.get(lk)
+            if f is None:
+                f = self._spool[lk] = open(os.path.join(self.spool_dir, f"{lk}.jsonl"), "w", encoding="utf-8")
+            f.write(json.dumps(doc, ensure_ascii=False, default=str))
+            f.write("\n")
+
+    def cerrar(self):
+        for f in self._spool.values():
+            f.close()
+
+    def datos(self):
+        """Fragmento de `datos` para generar_f29_excel / calcular_f29."""
+        self.cerrar()
+        resultado = {"agregados": {lk: dict(a) for lk, a in self.agregados.items()}}
+        if self.iva_retenido_fc:
+            resultado["cambio_sujeto"] = {"iva_retenido_total": self.iva_retenido_fc}
+        if self.spool_dir:
+            resultado["documentos"] = {
+                lk: DocumentosSpool(f.name, self.agregados[lk]["cant"]) for lk, f in self._spool.items()
+            }
+        return resultado
+
+
+def ingerir_rcv(ventas=None, compras=None, spool_dir=None, encoding=None):
+    """Lee los RCV de ventas y/o compras y devuelve el fragmento de datos (ver IngestaRCV.datos)."""
+    ingesta = IngestaRCV(spool_dir)
+    try:
+        if ventas:
+            ingesta.leer(ventas, "ventas", encoding)
+        if compras:
+            ingesta.leer(compras, "compras", encoding)
+    finally:
+        ingesta.cerrar()
+    return ingesta.datos()
@@ -0,0 +1,273 @@
+"""
+servidor_f29.py — Servidor local que mantiene el generador caliente.
+
+Recibe `datos` en JSON por HTTP en localhost o por un socket UNIX y responde
+los códigos o el xlsx, sin pagar el arranque del intérprete ni el import de
+openpyxl en cada F29. El trabajo corre en un pool de procesos precalentados
+(layout compilado listo) y la cola es acotada: si está llena responde 503.
+Con --cache los xlsx ya generados se responden desde disco sin pasar por el pool.
+
+Endpoints:
+    POST /codigos   → {"codigos": {"89": ..., "91": ...}}
+    POST /xlsx      → bytes del xlsx; los códigos van en el header X-F29-Codigos
+    GET  /salud     → {"workers": n, "en_curso": n, "cola": n[, "cache": {...}]}
+
+Uso:
+    python -m scripts.servidor_f29 --puerto 8029 --workers 4
+    python -m scripts.servidor_f29 --socket /tmp/f29.sock
+    python -m scripts.servidor_f29 --cache ~/.cache/f29 --cache-mb 1024
+
+    curl -s --data @datos.json localhost:8029/codigos
+    curl -s --data @datos.json localhost:8029/xlsx -o F29.xlsx
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+from scripts.calculo_f29 import datos_desde_json
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# ============================================================
+# Trabajo de los procesos del pool
+# ============================================================
+
+def _calentar():
+    """Inicializador del pool: importa openpyxl y compila el layout una vez por proceso."""
+    from scripts.generar_f29 import _layout_compilado
+    _layout_compilado()
+
+
+def _trabajo_codigos(datos):
+    from scripts.calculo_f29 import calcular_f29
+    return calcular_f29(datos)
+
+
+def _trabajo_xlsx(datos):
+    from scripts.generar_f29 import generar_f29_bytes
+    return generar_f29_bytes(datos, layout_compilado=True)
+
+
+def _codigos_json(codigos):
+    return {str(k): v for k, v in codigos.items()}
+
+
+# ============================================================
+# HTTP
+# ============================================================
+
+class ColaLlena(Exception):
+    pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "F29/1"
+    protocol_version = "HTTP/1.1"  # keep-alive: el ERP reutiliza la conexión
+
+    def setup(self):
+        super().setup()
+        if self.connection.family != getattr(socket, "AF_UNIX", None):
+            # Cabecera y cuerpo van en escrituras separadas: sin esto cada
+            # respuesta espera el ACK retardado (~40 ms) en keep-alive
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+    def address_string(self):
+        # En socket UNIX client_address es "" en vez de (host, puerto)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, formato, *args):
+        if self.server.verbose:
+            super().log_message(formato, *args)
+
+    def _responder(self, estado, cuerpo, tipo="application/json", headers=None):
+        if not isinstance(cuerpo, bytes):
+            cuerpo = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/salud":
+            self._responder(200, self.server.estado())
+        else:
+            self._responder(404, {"error": f"Ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        ruta = self.path.split("?", 1)[0].rstrip("/")
+        if ruta not in ("/codigos", "/xlsx"):
+            self._responder(404, {"error": f"Ruta desconocida: {self.path}"})
+            return
+        try:
+            largo = int(self.headers.get("Content-Length", 0))
+            datos = datos_desde_json(json.loads(self.rfile.read(largo)))
+            if not isinstance(datos, dict):
+                raise ValueError("se esperaba un objeto JSON")
+        except (ValueError, TypeError, AttributeError) as e:
+            self._responder(400, {"error": f"JSON inválido: {e}"})
+            return
+
+        cache = self.server.cache if ruta == "/xlsx" else None
+        llave = resultado = None
+        if cache is not None:
+            try:
+                llave = cache.clave(datos)
+            except TypeError:
+                cache = None  # sin forma canónica: se genera sin caché
+            else:
+                resultado = cache.obtener(llave)
+        trabajo = _trabajo_xlsx if ruta == "/xlsx" else _trabajo_codigos
+        try:
+            if resultado is None:
+                resultado = self.server.ejecutar(trabajo, datos)
+                if cache is not None:
+                    cache.guardar(llave, *resultado)
+        except ColaLlena:
+            self._responder(503, {"error": "Cola llena, reintentar"}, headers={"Retry-After": "1"})
+            return
+        except FuturesTimeout:
+            self._responder(504, {"error": f"Sin respuesta en {self.server.timeout_trabajo}s"})
+            return
+        except Exception as e:
+            self._responder(422, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        if ruta == "/xlsx":
+            codigos, contenido = resultado
+            self._responder(200, contenido, tipo=XLSX_MIME, headers={
+                "X-F29-Codigos": json.dumps(_codigos_json(codigos), separators=(",", ":")),
+            })
+        else:
+            self._responder(200, {"codigos": _codigos_json(resultado)})
+
+
+class _ServidorBase:
+    """Pool de procesos y cola acotada, compartidos por los servidores TCP y UNIX."""
+
+    daemon_threads = True
+
+    def _iniciar_pool(self, workers, cola, timeout_trabajo, verbose, cache):
+        self.workers = workers or os.cpu_count() or 1
+        self.capacidad = cola or 4 * self.workers
+        self.timeout_trabajo = timeout_trabajo
+        self.verbose = verbose
+        self.cache = cache
+        self._cupos = threading.BoundedSemaphore(self.capacidad)
+        self._en_curso = 0
+        self._lock = threading.Lock()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_calentar)
+        # Arranca los procesos ahora para que la primera petición no pague el import
+        for f in [self.pool.submit(_calentar) for _ in range(self.workers)]:
+            f.result()
+
+    def ejecutar(self, trabajo, datos):
+        if not self._cupos.acquire(blocking=False):
+            raise ColaLlena()
+        with self._lock:
+            self._en_curso += 1
+        try:
+            futuro = self.pool.submit(trabajo, datos)
+        except BaseException:
+            self._liberar()
+            raise
+        # El cupo se libera cuando el trabajo termina, no cuando la petición deja de esperarlo
+        futuro.add_done_callback(self._liberar)
+        try:
+            return futuro.result(timeout=self.timeout_trabajo)
+        except FuturesTimeout:
+            futuro.cancel()  # si aún no empezó, no ocupa un worker y libera el cupo ya
+            raise
+
+    def _liberar(self, futuro=None):
+        with self._lock:
+            self._en_curso -= 1
+        self._cupos.release()
+
+    def estado(self):
+        estado = {"workers": self.workers, "en_curso": self._en_curso, "cola": self.capacidad}
+        if self.cache is not None:
+            estado["cache"] = {"aciertos": self.cache.aciertos, "fallos": self.cache.fallos}
+        return estado
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+
+
+class ServidorHTTP(_ServidorBase, ThreadingHTTPServer):
+    def __init__(self, direccion, workers=None, cola=None, timeout_trabajo=60, verbose=False, cache=None):
+        self._iniciar_pool(workers, cola, timeout_trabajo, verbose, cache)
+        super().__init__(direccion, _Handler)
+
+
+class ServidorUnix(_ServidorBase, ThreadingMixIn, UnixStreamServer):
+    def __init__(self, ruta, workers=None, cola=None, timeout_trabajo=60, verbose=False, cache=None):
+        if os.path.exists(ruta):
+            os.remove(ruta)  # socket de una corrida anterior
+        self._iniciar_pool(workers, cola, timeout_trabajo, verbose, cache)
+        super().__init__(ruta, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def crear_servidor(puerto=8029, host="127.0.0.1", socket_unix=None, **opciones):
+    """
+    Crea el servidor (HTTP en host:puerto, o en el socket UNIX si se indica)
+    con su pool ya caliente. Llamar serve_forever() y, al terminar, server_close().
+    opciones: workers, cola (máximo de peticiones en curso + espera), timeout_trabajo,
+    verbose, cache (CacheF29 para /xlsx).
+    """
+    if socket_unix:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Este sistema no soporta sockets UNIX; usar --puerto")
+        return ServidorUnix(socket_unix, **opciones)
+    return ServidorHTTP((host, puerto), **opciones)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Servidor local de F29 (HTTP o socket UNIX).")
+    p.add_argument("--puerto", type=int, default=8029)
+    p.add_argument("--host", default="127.0.0.1", help="Por defecto solo localhost")
+    p.add_argument("--socket", help="Ruta de un socket UNIX (en vez de TCP)")
+    p.add_argument("-w", "--workers", type=int, default=None, help="Procesos (por defecto: núcleos)")
+    p.add_argument("--cola", type=int, default=None, help="Peticiones simultáneas antes de responder 503")
+    p.add_argument("--timeout", type=float, default=60, help="Segundos máximos por F29")
+    p.add_argument("-v", "--verbose", action="store_true", help="Log de cada petición")
+    p.add_argument("--cache", help="Directorio de caché de xlsx ya generados")
+    p.add_argument("--cache-mb", type=float, default=512, help="Tope de la caché en MB")
+    args = p.parse_args(argv)
+
+    cache = None
+    if args.cache:
+        from scripts.cache_f29 import CacheF29
+        cache = CacheF29(args.cache, max_mb=args.cache_mb)
+    servidor = crear_servidor(args.puerto, args.host, args.socket, workers=args.workers,
+                              cola=args.cola, timeout_trabajo=args.timeout, verbose=args.verbose,
+                              cache=cache)
+    donde = args.socket or f"http://{args.host}:{args.puerto}"
+    print(f"F29 escuchando en {donde} ({servidor.workers} workers, cola {servidor.capacidad})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
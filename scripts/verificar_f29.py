@@ -0,0 +1,323 @@
+"""
+verificar_f29.py — Verifica un F29 generado evaluando sus fórmulas en Python.
+
+Evalúa el subconjunto de fórmulas que emiten _bf, _dual, formula_80 y
+formula_140 (+, -, *, /, comparaciones, IF, ABS, ROUND y SUM sobre rangos)
+directamente sobre las celdas de la hoja, sin LibreOffice ni Excel, y compara
+cada código del mapa cc contra calcular_f29.
+
+Uso:
+    from scripts.verificar_f29 import verificar_f29
+    diferencias = verificar_f29("F29-Enero-2026.xlsx", datos=datos)
+    for d in diferencias:
+        print(d["codigo"], d["celda"], d["hoja"], d["calculado"])
+
+    python -m scripts.verificar_f29 F29.xlsx --datos datos.json
+"""
+
+import argparse
+import json
+import re
+import sys
+
+from scripts.calculo_f29 import redondear
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<num>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+    | (?P<rango>\$?[A-Z]{1,3}\$?\d+:\$?[A-Z]{1,3}\$?\d+)
+    | (?P<ref>\$?[A-Z]{1,3}\$?\d+)(?![A-Z(])
+    | (?P<func>[A-Z]+)\s*\(
+    | (?P<op><=|>=|<>|[-+*/(),<>=])
+    )""", re.VERBOSE)
+
+_CELDA = re.compile(r"\$?([A-Z]{1,3})\$?(\d+)")
+
+
+class FormulaNoSoportada(ValueError):
+    """La fórmula usa algo fuera del subconjunto que emite generar_f29."""
+
+
+def _col_num(letras):
+    n = 0
+    for ch in letras:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+def _col_letras(n):
+    s = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def _normalizar_ref(ref):
+    col, fila = _CELDA.fullmatch(ref).groups()
+    return f"{col}{fila}"
+
+
+def _tokens(formula):
+    pos, out = 0, []
+    texto = formula.upper()
+    while pos < len(texto):
+        m = _TOKEN.match(texto, pos)
+        if not m or m.end() == pos:
+            if texto[pos:].strip():
+                raise FormulaNoSoportada(f"No se reconoce '{formula[pos:]}' en {formula!r}")
+            break
+        kind = m.lastgroup
+        out.append((kind, m.group(kind)))
+        pos = m.end()
+    return out
+
+
+def _num(v):
+    if v is None or isinstance(v, str):
+        return 0
+    return v
+
+
+class _Parser:
+    """Descenso recursivo que compila la fórmula a una función f(leer) → valor."""
+
+    def __init__(self, formula):
+        self.formula = formula
+        self.toks = _tokens(formula)
+        self.i = 0
+
+    def _peek(self):
+        return self.toks[self.i] if self.i < len(self.toks) else (None, None)
+
+    def _take(self, valor=None):
+        tok = self._peek()
+        if valor is not None and tok[1] != valor:
+            raise FormulaNoSoportada(f"Se esperaba '{valor}' en {self.formula!r}")
+        self.i += 1
+        return tok
+
+    def compilar(self):
+        f = self._comparacion()
+        if self.i != len(self.toks):
+            raise FormulaNoSoportada(f"Sobra '{self._peek()[1]}' en {self.formula!r}")
+        return f
+
+    def _comparacion(self):
+        izq = self._suma()
+        op = self._peek()[1]
+        if op in ("<", ">", "<=", ">=", "=", "<>"):
+            self._take()
+            der = self._suma()
+            cmp = {"<": lambda a, b: a < b, ">": lambda a, b: a > b,
+                   "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b,
+                   "=": lambda a, b: a == b, "<>": lambda a, b: a != b}[op]
+            return lambda leer: cmp(_num(izq(leer)), _num(der(leer)))
+        return izq
+
+    def _suma(self):
+        f = self._producto()
+        while self._peek()[1] in ("+", "-"):
+            op = self._take()[1]
+            g = self._producto()
+            f = (lambda a, b: lambda leer: _num(a(leer)) + _num(b(leer)))(f, g) if op == "+" else \
+                (lambda a, b: lambda leer: _num(a(leer)) - _num(b(leer)))(f, g)
+        return f
+
+    def _producto(self):
+        f = self._unario()
+        while self._peek()[1] in ("*", "/"):
+            op = self._take()[1]
+            g = self._unario()
+            f = (lambda a, b: lambda leer: _num(a(leer)) * _num(b(leer)))(f, g) if op == "*" else \
+                (lambda a, b: lambda leer: _num(a(leer)) / _num(b(leer)))(f, g)
+        return f
+
+    def _unario(self):
+        op = self._peek()[1]
+        if op in ("+", "-"):
+            self._take()
+            f = self._unario()
+            return f if op == "+" else (lambda leer: -_num(f(leer)))
+        return self._primario()
+
+    def _primario(self):
+        kind, val = self._take()
+        if kind == "num":
+            n = float(val)
+            n = int(n) if n.is_integer() else n
+            return lambda leer: n
+        if kind == "ref":
+            ref = _normalizar_ref(val)
+            return lambda leer: leer(ref)
+        if kind == "op" and val == "(":
+            f = self._comparacion()
+            self._take(")")
+            return f
+        if kind == "func":
+            return self._funcion(val)
+        raise FormulaNoSoportada(f"Token inesperado '{val}' en {self.formula!r}")
+
+    def _args(self):
+        args = []
+        if self._peek()[1] == ")":
+            self._take()
+            return args
+        while True:
+            if self._peek()[0] == "rango":
+                args.append(("rango", self._take()[1]))
+            else:
+                args.append(("expr", self._comparacion()))
+            if self._take()[1] == ")":
+                return args
+            # la coma ya fue consumida por _take
+
+    def _funcion(self, nombre):
+        args = self._args()
+        exprs = [a for k, a in args if k == "expr"]
+        if nombre == "SUM":
+            partes = []
+            for kind, a in args:
+                if kind == "rango":
+                    ini, fin = a.split(":")
+                    c1, f1 = _CELDA.fullmatch(ini).groups()
+                    c2, f2 = _CELDA.fullmatch(fin).groups()
+                    refs = [f"{_col_letras(c)}{r}"
+                            for r in range(int(f1), int(f2) + 1)
+                            for c in range(_col_num(c1), _col_num(c2) + 1)]
+                    partes.append(lambda leer, refs=refs: sum(
+                        v for v in map(leer, refs) if isinstance(v, (int, float)) and not isinstance(v, bool)))
+                else:
+                    partes.append(lambda leer, a=a: _num(a(leer)))
+            return lambda leer: sum(p(leer) for p in partes)
+        if len(exprs) != len(args):
+            raise FormulaNoSoportada(f"{nombre} no acepta rangos en {self.formula!r}")
+        if nombre == "IF" and len(exprs) in (2, 3):
+            cond, si = exprs[0], exprs[1]
+            no = exprs[2] if len(exprs) == 3 else (lambda leer: False)
+            return lambda leer: si(leer) if cond(leer) else no(leer)
+        if nombre == "ABS" and len(exprs) == 1:
+            x = exprs[0]
+            return lambda leer: abs(_num(x(leer)))
+        if nombre == "ROUND" and len(exprs) in (1, 2):
+            x = exprs[0]
+            d = exprs[1] if len(exprs) == 2 else (lambda leer: 0)
+            return lambda leer: redondear(_num(x(leer)), _num(d(leer)))
+        raise FormulaNoSoportada(f"Función {nombre} no soportada en {self.formula!r}")
+
+
+_COMPILADAS = {}
+
+
+def compilar_formula(formula):
+    """Compila '=...' a una función f(leer) donde leer(celda) → valor. Con caché por texto."""
+    f = _COMPILADAS.get(formula)
+    if f is None:
+        f = _COMPILADAS[formula] = _Parser(formula[1:] if formula.startswith("=") else formula).compilar()
+    return f
+
+
+def evaluar_celdas(celdas, refs=None):
+    """
+    Evalúa todas las fórmulas de `celdas` ({"N23": valor o "=fórmula"}) y
+    devuelve {celda: valor} con los resultados (las celdas sin fórmula se copian).
+    refs: solo estas celdas y las que necesiten (el resto no se evalúa).
+    """
+    resultado = {}
+    en_curso = set()
+
+    def leer(ref):
+        if ref in resultado:
+            return resultado[ref]
+        v = celdas.get(ref)
+        if isinstance(v, str) and v.startswith("="):
+            if ref in en_curso:
+                raise FormulaNoSoportada(f"Referencia circular en {ref}")
+            en_curso.add(ref)
+            v = compilar_formula(v)(leer)
+            en_curso.discard(ref)
+        resultado[ref] = v
+        return v
+
+    for ref in celdas if refs is None else refs:
+        leer(ref)
+    return resultado
+
+
+def _celdas_hoja(ws):
+    """Números y fórmulas de la hoja; el texto (etiquetas, signos "=") no entra en los cálculos."""
+    celdas = {}
+    for fila in ws.iter_rows():
+        for cell in fila:
+            if cell.data_type == "f" or (cell.data_type == "n" and cell.value is not None):
+                celdas[cell.coordinate] = cell.value
+    return celdas
+
+
+def _celdas_f29(origen):
+    """Celdas de la hoja F29 desde una ruta/archivo .xlsx o un Workbook de openpyxl."""
+    import openpyxl
+    if isinstance(origen, openpyxl.Workbook):
+        return _celdas_hoja(origen.worksheets[0])
+    wb = openpyxl.load_workbook(origen, read_only=True)
+    try:
+        return _celdas_hoja(wb.worksheets[0])
+    finally:
+        wb.close()
+
+
+def verificar_f29(origen, codigos=None, datos=None, tolerancia=0):
+    """
+    Compara cada código de la hoja F29 (valores y fórmulas evaluadas) contra
+    calcular_f29. Devuelve una lista de diferencias, vacía si todo cuadra:
+    [{"codigo", "linea", "celda", "formula", "hoja", "calculado"}, ...].
+
+    origen: ruta o archivo .xlsx generado, o el Workbook en memoria.
+    codigos: resultado de calcular_f29; si no se pasa se calcula desde `datos`.
+    """
+    from scripts.calculo_f29 import calcular_f29
+    from scripts.indice_f29 import INDICE_CODIGOS
+    if codigos is None:
+        if datos is None:
+            raise ValueError("Se necesita `codigos` o `datos` para verificar")
+        codigos = calcular_f29(datos)
+    celdas = _celdas_f29(origen)
+    valores = evaluar_celdas(celdas)
+    diferencias = []
+    for code, info in INDICE_CODIGOS.items():
+        celda = info.celda
+        hoja = _num(valores.get(celda))
+        esperado = codigos.get(code, 0) or 0
+        if abs(hoja - esperado) > tolerancia:
+            formula = celdas.get(celda)
+            diferencias.append({
+                "codigo": code, "linea": info.linea, "celda": celda, "hoja": hoja, "calculado": esperado,
+                "formula": formula if isinstance(formula, str) and formula.startswith("=") else None,
+            })
+    return diferencias
+
+
+def main(argv=None):
+    from scripts.calculo_f29 import datos_desde_json
+    p = argparse.ArgumentParser(description="Verifica fórmulas de F29 generados contra calcular_f29.")
+    p.add_argument("archivos", nargs="+", help="Archivos .xlsx generados por generar_f29_excel")
+    p.add_argument("--datos", required=True, help="JSON con los datos usados para generarlos")
+    p.add_argument("--tolerancia", type=float, default=0)
+    args = p.parse_args(argv)
+
+    with open(args.datos, encoding="utf-8") as f:
+        datos = datos_desde_json(json.load(f))
+    con_error = 0
+    for archivo in args.archivos:
+        diferencias = verificar_f29(archivo, datos=datos, tolerancia=args.tolerancia)
+        if diferencias:
+            con_error += 1
+        for d in diferencias:
+            print(f"{archivo}: cód. {d['codigo']} línea {d['linea']} ({d['celda']}) hoja={d['hoja']} "
+                  f"calcular_f29={d['calculado']} {d['formula'] or ''}")
+    print(f"{len(args.archivos) - con_error} OK, {con_error} con diferencias")
+    return 1 if con_error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+xlsx_directo.py — Escritor del xlsx del F29 directo a XML, sin el modelo de objetos de openpyxl.
+
+Escribe las partes del paquete (hojas, sharedStrings, styles.xml, workbook)
+directo a un zip en streaming. No arma un objeto Cell por celda: la hoja F29
+sale del esqueleto compilado (_layout_compilado) y el detalle de documentos
+se escribe fila a fila desde _filas_detalle, con memoria constante.
+
+Los estilos se registran una vez por workbook en un registro con índices xf
+fijos: primero la paleta del esqueleto F29, después la del detalle y la hoja
+de alertas. openpyxl se usa solo para ese registro, para serializar
+styles.xml y el theme, y para renderizar la hoja de alertas (es chica).
+
+El resultado es celda por celda igual al de generar_f29_excel (valores,
+estilos, combinadas y anchos). Las diferencias son de empaquetado: el detalle
+usa cadenas inline, y el archivo no lleva docProps.
+
+Uso:
+    from scripts.generar_f29 import generar_f29_excel
+    generar_f29_excel(datos, "F29.xlsx", motor="xml")
+
+    from scripts.xlsx_directo import escribir_xlsx
+    escribir_xlsx(datos, codigos, "F29.xlsx")
+"""
+
+import datetime
+import re
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+import openpyxl
+from openpyxl.compat.numbers import NUMERIC_TYPES
+from openpyxl.styles.stylesheet import write_stylesheet
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.writer.theme import theme_xml
+from openpyxl.xml.functions import tostring
+
+from scripts.generar_f29 import (
+    COL_WIDTHS, DETALLE_COL_WIDTHS, DETALLE_NCOLS, _FILA_PERIODO, _TABLAS_ESTILO,
+    _bytes_escritos, _conteo_hoja, _posicion, _estilo, _filas_detalle, _layout_compilado, _numero_xml,
+    _titulos_f29, _valores_f29, _write_alertas,
+)
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT = "application/vnd.openxmlformats-officedocument."
+
+# Caracteres de control que XML 1.0 no admite (openpyxl los rechaza; aquí se quitan)
+_ILEGALES = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_CABECERA = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_INICIO_HOJA = (
+    f'<worksheet xmlns="{NS_MAIN}"><sheetPr><outlinePr summaryBelow="1" summaryRight="1"/>'
+    f'<pageSetUpPr/></sheetPr>{{dimension}}<sheetViews><sheetView workbookViewId="0"{{activa}}>'
+    f'<selection activeCell="A1" sqref="A1"/></sheetView></sheetViews>'
+    f'<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+)
+_FIN_HOJA = '<pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/></worksheet>'
+
+
+# ============================================================
+# Estilos y cadenas compartidas
+# ============================================================
+
+class _Registro:
+    """
+    Estilos (StyleArray → índice xf) y cadenas compartidas de un workbook.
+    Las tablas arrancan como copia de las del esqueleto compilado, así los
+    StyleArray del layout valen tal cual; _estilo agrega lo que falte.
+    """
+
+    def __init__(self, lay):
+        self.wb = openpyxl.Workbook()
+        for t in _TABLAS_ESTILO:
+            setattr(self.wb, t, IndexedList(lay.tablas[t]))
+        self.ws = self.wb.active
+        self.cadenas = {}
+
+    def xf(self, style):
+        return self.wb._cell_styles.add(style)
+
+    def estilo(self, **formato):
+        return self.xf(_estilo(self.ws, **formato))
+
+    def cadena(self, texto):
+        i = self.cadenas.get(texto)
+        if i is None:
+            i = self.cadenas[texto] = len(self.cadenas)
+        return i
+
+    def styles_xml(self):
+        return _CABECERA.encode() + tostring(write_stylesheet(self.wb))
+
+    def shared_strings_xml(self):
+        partes = [_CABECERA, f'<sst xmlns="{NS_MAIN}" uniqueCount="{len(self.cadenas)}">']
+        partes.extend(f"<si>{_texto(t)}</si>" for t in self.cadenas)
+        partes.append("</sst>")
+        return "".join(partes).encode("utf-8")
+
+
+def _texto(valor):
+    valor = _ILEGALES.sub("", valor)
+    if valor != valor.strip():
+        return f'<t xml:space="preserve">{escape(valor)}</t>'
+    return f"<t>{escape(valor)}</t>"
+
+
+def _celda(ref, valor, xf, registro=None, valores=None):
+    """
+    XML de una celda con las mismas reglas de tipo que openpyxl. Con `registro`
+    los textos van a sharedStrings; sin él, inline (el detalle, para no
+    acumularlos en memoria). `valores` ({celda: valor}) da el resultado
+    guardado de las fórmulas; sin él quedan vacíos, como en openpyxl.
+    """
+    s = f' s="{xf}"' if xf else ""
+    if valor is None or valor == "":
+        return f'<c r="{ref}"{s}/>'
+    if isinstance(valor, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, NUMERIC_TYPES):
+        return f'<c r="{ref}"{s}><v>{_numero_xml(valor)}</v></c>'
+    if isinstance(valor, (datetime.date, datetime.time)):
+        valor = valor.isoformat()  # el detalle trae fechas como texto; por si acaso, igual
+    else:
+        valor = str(valor)
+    if len(valor) > 1 and valor.startswith("="):
+        resultado = valores.get(ref) if valores else None
+        v = "" if resultado is None else _numero_xml(resultado)
+        return f'<c r="{ref}"{s}><f>{escape(_ILEGALES.sub("", valor[1:]))}</f><v>{v}</v></c>'
+    if registro is not None:
+        return f'<c r="{ref}"{s} t="s"><v>{registro.cadena(valor)}</v></c>'
+    return f'<c r="{ref}"{s} t="inlineStr"><is>{_texto(valor)}</is></c>'
+
+
+# ============================================================
+# Hojas
+# ============================================================
+
+def _cols(anchos):
+    cols = "".join(f'<col width="{w:g}" customWidth="1" min="{i}" max="{i}"/>'
+                   for i, w in anchos if w)
+    return f"<cols>{cols}</cols>" if cols else ""
+
+
+def _merge_cells(rangos):
+    rangos = list(rangos)
+    if not rangos:
+        return ""
+    return (f'<mergeCells count="{len(rangos)}">'
+            + "".join(f'<mergeCell ref="{r}"/>' for r in rangos) + "</mergeCells>")
+
+
+def _escribir_hoja(zf, n, filas, anchos, rangos, activa=False, dimension=None, valores=None):
+    """
+    Escribe xl/worksheets/sheet{n}.xml. `filas` es un iterable de
+    (r, [(c, valor, xf, registro), ...]); las filas se escriben a medida que llegan.
+    valores: resultados de las fórmulas para _celda; se consulta al escribir
+    cada fila, así el generador de filas puede ir llenándolo.
+    """
+    with zf.open(f"xl/worksheets/sheet{n}.xml", "w", force_zip64=True) as f:
+        f.write(_CABECERA.encode())
+        f.write(_INICIO_HOJA.format(
+            dimension=f'<dimension ref="{dimension}"/>' if dimension else "",
+            activa=' tabSelected="1"' if activa else "",
+        ).encode())
+        f.write(_cols(anchos).encode())
+        f.write(b"<sheetData>")
+        letras = {}
+        for r, celdas in filas:
+            partes = [f'<row r="{r}">']
+            for c, valor, xf, registro in celdas:
+                letra = letras.get(c) or letras.setdefault(c, get_column_letter(c))
+                partes.append(_celda(f"{letra}{r}", valor, xf, registro, valores))
+            partes.append("</row>")
+            f.write("".join(partes).encode("utf-8"))
+        f.write(b"</sheetData>")
+        f.write(_merge_cells(rangos()).encode())
+        f.write(_FIN_HOJA.encode())
+
+
+def _filas_f29(lay, registro, codigos, periodo):
+    """Celdas de la hoja F29 desde el esqueleto compilado, agrupadas por fila."""
+    por_fila = {}
+    for r, c, value, style, _ in lay.celdas:
+        por_fila.setdefault(r, {})[c] = (value, style)
+    por_fila[_FILA_PERIODO][1] = (periodo, por_fila[_FILA_PERIODO][1][1])
+    for code, r, c, style in lay.entradas:
+        v = codigos.get(code)
+        if v:
+            por_fila[r][c] = (v, style)
+    xfs = {}
+    for r in sorted(por_fila):
+        celdas = []
+        for c in sorted(por_fila[r]):
+            value, style = por_fila[r][c]
+            xf = xfs.get(style)
+            if xf is None:
+                xf = xfs[style] = registro.xf(style)
+            celdas.append((c, value, xf, registro))
+        yield r, celdas
+
+
+def _filas_hoja(ws, registro):
+    """Celdas de una hoja openpyxl ya renderizada (alertas), agrupadas por fila."""
+    por_fila = {}
+    for (r, c), cell in ws._cells.items():
+        por_fila.setdefault(r, []).append((c, cell.value, registro.xf(cell._style), registro))
+    for r in sorted(por_fila):
+        yield r, sorted(por_fila[r], key=lambda celda: celda[0])
+
+
+def _filas_detalle_xml(datos, codigos, registro, conteo, combinadas, totales=None):
+    r = 0
+    for fila, combinada in _filas_detalle(datos, codigos, registro.estilo, totales):
+        r += 1
+        if fila:
+            conteo["filas"] = r
+        yield r, [(c, v, s, None) for c, (v, s) in enumerate(fila, 1)]
+        if combinada:
+            combinadas.append(f"A{r}:{get_column_letter(DETALLE_NCOLS)}{r}")
+
+
+# ============================================================
+# Paquete
+# ============================================================
+
+def _workbook_xml(titulos, recalcular=True):
+    hojas = "".join(f'<sheet name={quoteattr(t)} sheetId="{i}" r:id="rId{i}"/>'
+                    for i, t in enumerate(titulos, 1))
+    recalculo = ' fullCalcOnLoad="1"' if recalcular else ""
+    return (f'{_CABECERA}<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><workbookPr/>'
+            f'<bookViews><workbookView activeTab="0"/></bookViews><sheets>{hojas}</sheets>'
+            f'<calcPr calcId="124519"{recalculo}/></workbook>').encode("utf-8")
+
+
+def _workbook_rels(n_hojas):
+    tipo = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+    rels = [("worksheet", f"worksheets/sheet{i}.xml") for i in range(1, n_hojas + 1)]
+    rels += [("styles", "styles.xml"), ("sharedStrings", "sharedStrings.xml"), ("theme", "theme/theme1.xml")]
+    cuerpo = "".join(f'<Relationship Id="rId{i}" Type="{tipo}{t}" Target="{destino}"/>'
+                     for i, (t, destino) in enumerate(rels, 1))
+    return f'{_CABECERA}<Relationships xmlns="{NS_PKG_REL}">{cuerpo}</Relationships>'.encode()
+
+
+def _content_types(n_hojas):
+    partes = [("/xl/workbook.xml", "spreadsheetml.sheet.main+xml"),
+              ("/xl/styles.xml", "spreadsheetml.styles+xml"),
+              ("/xl/sharedStrings.xml", "spreadsheetml.sharedStrings+xml"),
+              ("/xl/theme/theme1.xml", "theme+xml")]
+    partes += [(f"/xl/worksheets/sheet{i}.xml", "spreadsheetml.worksheet+xml") for i in range(1, n_hojas + 1)]
+    overrides = "".join(f'<Override PartName="{p}" ContentType="{CT}{t}"/>' for p, t in partes)
+    return (f'{_CABECERA}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            f'<Default Extension="xml" ContentType="application/xml"/>{overrides}</Types>').encode()
+
+
+_RELS_RAIZ = (f'{_CABECERA}<Relationships xmlns="{NS_PKG_REL}"><Relationship Id="rId1" '
+              f'Type="{NS_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>').encode()
+
+
+def escribir_xlsx(datos, codigos, output_path, medidor=None, inicio=None, cachear_formulas=False):
+    """
+    Escribe el xlsx de 3 hojas (F29, detalle, alertas) en output_path (ruta o
+    archivo binario abierto, sin necesidad de seek: cada hoja se comprime y
+    se escribe al destino a medida que se genera). `medidor` es el _Medidor
+    de generar_f29_excel: reporta las mismas etapas f29, detalle, alertas y save.
+    cachear_formulas: escribe el resultado de cada fórmula (ver generar_f29_excel).
+    """
+    if inicio is None:
+        inicio = _posicion(output_path)
+    if medidor is None:
+        from scripts.generar_f29 import _Medidor
+        medidor = _Medidor()
+    lay = _layout_compilado()
+    registro = _Registro(lay)
+    titulo, periodo = _titulos_f29(datos.get("encabezado", {}))
+
+    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with medidor.etapa("f29") as ev:
+            filas = list(_filas_f29(lay, registro, codigos, periodo))
+            ult_fila = filas[-1][0]
+            ult_col = max(c for _, celdas in filas for c, *_ in celdas)
+            _escribir_hoja(zf, 1, filas, [(i, w) for i, (_, w) in enumerate(COL_WIDTHS, 1)],
+                           lambda: lay.merged.split(), activa=True,
+                           dimension=f"A1:{get_column_letter(ult_col)}{ult_fila}",
+                           valores=_valores_f29(codigos) if cachear_formulas else None)
+            ev.update(filas=ult_fila, celdas=sum(len(celdas) for _, celdas in filas))
+
+        with medidor.etapa("detalle") as ev:
+            conteo, combinadas = {"filas": 0}, []
+            anchos = list(enumerate(DETALLE_COL_WIDTHS, 1)) if datos.get("documentos") else []
+            totales = {} if cachear_formulas else None
+            _escribir_hoja(zf, 2, _filas_detalle_xml(datos, codigos, registro, conteo, combinadas, totales),
+                           anchos, lambda: combinadas, valores=totales)
+            ev["filas"] = conteo["filas"]
+
+        with medidor.etapa("alertas") as ev:
+            _write_alertas(registro.wb, codigos, datos)
+            ws = registro.wb.worksheets[-1]
+            anchos = sorted((column_index_from_string(letra), dim.width)
+                            for letra, dim in ws.column_dimensions.items())
+            _escribir_hoja(zf, 3, _filas_hoja(ws, registro), anchos,
+                           lambda: (str(m) for m in ws.merged_cells.ranges),
+                           dimension=ws.dimensions)
+            ev.update(_conteo_hoja(ws))
+            titulos = [titulo, "Detalle Documentos", ws.title]
+
+        with medidor.etapa("save") as ev:
+            # Estilos y cadenas al final: el detalle y las alertas agregan los suyos
+            zf.writestr("xl/sharedStrings.xml", registro.shared_strings_xml())
+            zf.writestr("xl/styles.xml", registro.styles_xml())
+            zf.writestr("xl/theme/theme1.xml", theme_xml)
+            zf.writestr("xl/workbook.xml", _workbook_xml(titulos, recalcular=not cachear_formulas))
+            zf.writestr("xl/_rels/workbook.xml.rels", _workbook_rels(len(titulos)))
+            zf.writestr("_rels/.rels", _RELS_RAIZ)
+            zf.writestr("[Content_Types].xml", _content_types(len(titulos)))
+            zf.close()
+            _bytes_escritos(ev, output_path, inicio)
+    return codigos
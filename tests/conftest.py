@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+
+import pytest
+
+# Los scripts se importan como `scripts.*` desde la raíz del repo, igual que al correrlos con -m
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (línea, cantidad por cada 100 documentos, rango del neto)
+_REPARTO = [
+    ("linea_10", 55, (1_000, 60_000)),       # boletas
+    ("linea_7", 20, (50_000, 5_000_000)),    # facturas emitidas
+    ("linea_13", 2, (10_000, 500_000)),      # NC emitidas
+    ("linea_28", 18, (20_000, 3_000_000)),   # facturas recibidas
+    ("linea_32", 1, (5_000, 200_000)),       # NC recibidas
+    ("linea_61", 4, (100_000, 2_000_000)),   # honorarios
+]
+
+
+def _documentos(n_docs, rnd):
+    documentos = {}
+    for lk, por_cien, (lo, hi) in _REPARTO:
+        docs = []
+        for folio in range(1, max(n_docs * por_cien // 100, 1) + 1):
+            neto = rnd.randint(lo, hi)
+            doc = {"numero": folio, "fecha": f"2026-01-{rnd.randint(1, 31):02d}",
+                   "rut": f"{rnd.randint(1_000_000, 99_999_999)}-{rnd.choice('0123456789K')}",
+                   "razon_social": f"Empresa {folio} SpA"}
+            if lk == "linea_61":
+                ret = round(neto * 0.1525)
+                doc.update(bruto=neto, retencion=ret, liquido=neto - ret)
+            else:
+                iva = round(neto * 0.19)
+                doc.update(neto=neto, iva=iva, total=neto + iva)
+            docs.append(doc)
+        documentos[lk] = docs
+    return documentos
+
+
+@pytest.fixture(scope="session")
+def fabricar_datos():
+    """
+    Fábrica de `datos` en modo cálculo: fabricar_datos(n_docs, semilla, rut=..., mes=...)
+    con documentos en las líneas 10, 7, 13, 28, 32 y 61. Misma semilla, mismos datos.
+    """
+    def fabricar(n_docs=100, semilla=0, rut="76.543.210-K", mes=1, anio=2026):
+        return {
+            "encabezado": {"rut": rut, "razon_social": "PRUEBAS SPA", "periodo_mes": mes, "periodo_anio": anio},
+            "documentos": _documentos(n_docs, random.Random(semilla)),
+            "ppm": {"tasa": 0.25},
+        }
+    return fabricar
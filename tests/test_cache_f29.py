@@ -0,0 +1,84 @@
+"""Caché de xlsx: llaves canónicas por contenido, aciertos sin regenerar y desalojo LRU."""
+
+import datetime
+import decimal
+import io
+import os
+
+import pytest
+
+from scripts.cache_f29 import CacheF29, clave_datos
+from scripts.calculo_f29 import ColumnasDocumentos, Documento, compactar_documentos
+from scripts.generar_f29 import generar_f29_bytes
+
+
+def test_llave_canonica():
+    a = {"encabezado": {"rut": "1-9"}, "codigos": {504: 1, 89: 2}}
+    b = {"codigos": {89: 2, 504: 1}, "encabezado": {"rut": "1-9"}}
+    assert clave_datos(a, "v") == clave_datos(b, "v")
+    assert clave_datos(a, "v") != clave_datos(a, "w")
+    assert clave_datos({"codigos": {504: 1}}, "v") != clave_datos({"codigos": {"504": 1}}, "v")
+    assert clave_datos({"notas": [("A", "b")]}, "v") != clave_datos({"notas": [["A", "b"]]}, "v")
+    assert clave_datos({"x": decimal.Decimal("1.5")}, "v") != clave_datos({"x": "1.5"}, "v")
+
+
+def test_llave_de_documentos_compactos_y_columnas(fabricar_datos):
+    datos = fabricar_datos(30, semilla=1)
+    compactos = {**datos, "documentos": compactar_documentos(datos["documentos"])}
+    otro = {**datos, "documentos": compactar_documentos({**datos["documentos"],
+                                                          "linea_7": datos["documentos"]["linea_7"][:-1]})}
+    assert clave_datos(compactos, "v") != clave_datos(otro, "v")
+    assert clave_datos(compactos, "v") == clave_datos(
+        {**datos, "documentos": compactar_documentos(datos["documentos"])}, "v")
+    columnas = {"linea_7": ColumnasDocumentos({"neto": [1, 2], "iva": [0, 0]})}
+    assert clave_datos({"documentos": columnas}, "v") != clave_datos(
+        {"documentos": {"linea_7": ColumnasDocumentos({"neto": [1, 3], "iva": [0, 0]})}}, "v")
+    fecha = {"x": datetime.date(2026, 3, 1)}
+    assert clave_datos(fecha, "v") != clave_datos({"x": "2026-03-01"}, "v")
+
+
+def test_tipo_sin_forma_canonica():
+    with pytest.raises(TypeError):
+        clave_datos({"x": object()}, "v")
+
+
+def test_acierto_no_regenera(tmp_path, fabricar_datos):
+    cache = CacheF29(tmp_path / "cache")
+    datos = fabricar_datos(40, semilla=2)
+    codigos = cache.generar_f29_excel(datos, str(tmp_path / "a.xlsx"))
+    buf = io.BytesIO()
+    assert cache.generar_f29_excel(datos, buf) == codigos
+    assert (cache.aciertos, cache.fallos) == (1, 1)
+    assert buf.getvalue() == (tmp_path / "a.xlsx").read_bytes()
+    assert generar_f29_bytes(datos)[0] == codigos
+    # Con valores de fórmulas el xlsx es otro: entrada aparte
+    cache.generar_f29_excel(datos, io.BytesIO(), cachear_formulas=True)
+    assert (cache.aciertos, cache.estado()["entradas"]) == (1, 2)
+
+
+def test_datos_sin_llave_se_generan_sin_cache(tmp_path, fabricar_datos):
+    cache = CacheF29(tmp_path / "cache")
+    datos = fabricar_datos(10, semilla=3)
+    datos["extra"] = object()
+    codigos = cache.generar_f29_excel(datos, io.BytesIO())
+    assert codigos[91] == generar_f29_bytes(fabricar_datos(10, semilla=3))[0][91]
+    assert cache.estado()["entradas"] == 0
+
+
+def test_desaloja_las_menos_usadas(tmp_path):
+    cache = CacheF29(tmp_path, max_mb=2.5 / 1024)  # 2,5 KB
+    for i, llave in enumerate(("a", "b", "c")):
+        cache.guardar(llave, {91: i}, b"x" * 1000)
+        os.utime(tmp_path / f"{llave}.xlsx", (i, i))
+    cache.guardar("d", {91: 3}, b"x" * 1000)
+    assert cache.obtener("a") is None and cache.obtener("b") is None
+    assert cache.obtener("d") == ({91: 3}, b"x" * 1000)
+    cache.limpiar()
+    assert cache.estado()["entradas"] == 0
+
+
+def test_documento_compacto_en_llave_equivale_por_campos():
+    d1 = {"documentos": {"linea_7": [Documento(numero=1, neto=100, iva=19)]}}
+    d2 = {"documentos": {"linea_7": [Documento(numero=1, neto=100, iva=19)]}}
+    d3 = {"documentos": {"linea_7": [Documento(numero=1, neto=100, iva=20)]}}
+    assert clave_datos(d1, "v") == clave_datos(d2, "v") != clave_datos(d3, "v")
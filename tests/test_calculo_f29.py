@@ -0,0 +1,65 @@
+"""Cálculo de códigos con calcular_f29: agregados por línea, modelos de documento y redondeo como la hoja."""
+
+import pytest
+
+from scripts.calculo_f29 import (
+    Documento, agregar_documentos, calcular_f29, compactar_documentos, datos_desde_json, redondear,
+)
+
+
+def test_agregados_igual_a_documentos(fabricar_datos):
+    datos = fabricar_datos(300, semilla=2)
+    agregado = {**datos, "documentos": {}, "agregados": agregar_documentos(datos["documentos"])}
+    assert calcular_f29(agregado) == calcular_f29(datos)
+
+
+def test_agregados_mandan_sobre_documentos(fabricar_datos):
+    datos = fabricar_datos(100, semilla=4)
+    datos["agregados"] = {"linea_7": {"cant": 3, "neto": 1_000_000, "iva": 190_000}}
+    codigos = calcular_f29(datos)
+    assert (codigos[503], codigos[502]) == (3, 190_000)
+
+
+def test_ventas_sin_documentos():
+    codigos = calcular_f29({"ventas": {"facturas_afectas_cant": 2, "facturas_afectas_neto": 200_000},
+                            "compras": {"facturas_giro_cant": 1, "facturas_giro_iva": 19_000}})
+    assert (codigos[503], codigos[502], codigos[519], codigos[520]) == (2, 38_000, 1, 19_000)
+    assert codigos[538] == 38_000 and codigos[537] == 19_000 and codigos[89] == 19_000
+    assert codigos[91] == codigos[547] == codigos[595] == 19_000 + codigos[62]
+
+
+def test_documentos_compactos_igual_a_dicts(fabricar_datos):
+    datos = fabricar_datos(200, semilla=6)
+    compactos = {**datos, "documentos": compactar_documentos(datos["documentos"])}
+    assert all(isinstance(d, Documento) for docs in compactos["documentos"].values() for d in docs)
+    assert calcular_f29(compactos) == calcular_f29(datos)
+    assert datos_desde_json(datos, compactar=True)["documentos"] == compactos["documentos"]
+
+
+def test_documento_resuelve_alias_de_la_linea():
+    doc = Documento.desde_dict({"bruto": 1_000, "retencion": 145, "liquido": 855, "numero": 7}, "linea_61")
+    assert (doc.neto, doc.iva, doc.total) == (1_000, 145, 855)
+    assert doc["bruto"] == doc.get("neto") == 1_000 and "retencion" in doc
+    assert Documento.desde_dict(doc.a_dict()) == doc
+
+
+@pytest.mark.parametrize("x, esperado", [(0.5, 1), (1.5, 2), (2.5, 3), (-0.5, -1), (-2.5, -3), (250.5, 251),
+                                         (250.49, 250), (0.0, 0)])
+def test_redondear_como_round_de_excel(x, esperado):
+    assert redondear(x) == esperado
+
+
+def test_redondear_con_decimales():
+    assert redondear(1.005 * 1000, -1) == 1010
+    assert redondear(2.345, 2) == 2.35
+
+
+@pytest.mark.parametrize("ppm", [{"tasa": 0.25}, {"tasa": 0.25, "suspension": True}, {"tasa": 1.5}])
+def test_ppm_redondea_como_la_hoja(ppm):
+    # 100.200 × 0,25% = 250,5: la hoja (ROUND) da 251, round() de Python daría 250
+    c = calcular_f29({"ventas": {"facturas_afectas_neto": 100_200}, "ppm": ppm})
+    bruto = redondear(c[563] * c[115] / 100)
+    assert c[68] + c[62] == bruto
+    assert c[68] == (bruto if ppm.get("suspension") else 0)
+    if ppm == {"tasa": 0.25}:
+        assert c[62] == 251
@@ -0,0 +1,66 @@
+"""Conciliación RCV ↔ libro interno: llave por tipo, folio, RUT y registro, y cada tipo de discrepancia."""
+
+from scripts.calculo_f29 import compactar_documentos
+from scripts.conciliacion_f29 import conciliar
+
+
+def _doc(folio, neto, rut="11.111.111-1", **extra):
+    return {"numero": folio, "rut": rut, "neto": neto, "iva": round(neto * 0.19), "total": round(neto * 1.19),
+            **extra}
+
+
+RCV = {
+    "linea_7": [_doc(1, 100_000), _doc(2, 200_000), _doc(3, 300_000), _doc(4, 400_000), _doc(4, 400_000)],
+    "linea_28": [_doc(10, 50_000, rut="55.555.555-5")],
+}
+LIBRO = {
+    "linea_7": [_doc("0001", 100_000, rut="11111111-1"), _doc(2, 200_000 + 1_000), _doc(5, 10_000)],
+    "linea_2": [_doc(3, 300_000, tipo_doc=33)],
+    "linea_28": [_doc(10, 50_000, rut="55555555-5"), _doc(11, 1, rut="55555555-5"), _doc(11, 1, rut="55555555-5")],
+}
+
+
+def test_discrepancias_por_linea():
+    res = conciliar(RCV, LIBRO)
+    linea_7, linea_28 = res.por_linea["linea_7"], res.por_linea["linea_28"]
+    assert (linea_7["rcv"], linea_7["libro"], linea_7["coinciden"]) == (5, 3, 1)
+    assert [d["folio"] for d in linea_7["diferencia_monto"]] == ["2"]
+    assert linea_7["diferencia_monto"][0]["rcv"][0] - linea_7["diferencia_monto"][0]["libro"][0] == -1_000
+    assert [(d["folio"], d["linea_libro"]) for d in linea_7["linea_distinta"]] == [("3", "linea_2")]
+    assert [d["folio"] for d in linea_7["falta_en_libro"]] == ["4"]
+    assert [(d["folio"], d["fuente"]) for d in linea_7["duplicado"]] == [("4", "rcv")]
+    assert [d["folio"] for d in linea_7["falta_en_rcv"]] == ["5"]
+    assert linea_28["coinciden"] == 1
+    assert [d["fuente"] for d in linea_28["duplicado"]] == ["libro"]
+    assert [d["folio"] for d in linea_28["falta_en_rcv"]] == ["11"]
+    assert not res.cuadra
+
+
+def test_venta_y_compra_con_misma_llave_no_cruzan():
+    venta = {"linea_7": [_doc(9, 1_000, tipo_doc=33)]}
+    compra = {"linea_28": [_doc(9, 1_000, tipo_doc=33)]}
+    res = conciliar(venta, compra)
+    assert [d["folio"] for d in res.por_linea["linea_7"]["falta_en_libro"]] == ["9"]
+    assert [d["folio"] for d in res.por_linea["linea_28"]["falta_en_rcv"]] == ["9"]
+    assert res.por_linea["linea_7"]["linea_distinta"] == []
+
+
+def test_tolerancia_y_cuadra():
+    rcv = {"linea_7": [_doc(1, 100_000)]}
+    libro = {"linea_7": [{**_doc(1, 100_000), "iva": 19_001}]}
+    assert conciliar(rcv, libro).cuadra
+    assert not conciliar(rcv, libro, tolerancia=0).cuadra
+
+
+def test_documentos_compactos_y_pares():
+    res = conciliar(compactar_documentos(RCV), ((lk, d) for lk, docs in LIBRO.items() for d in docs))
+    assert res.resumen() == conciliar(RCV, LIBRO).resumen()
+
+
+def test_notas():
+    notas = conciliar(RCV, LIBRO).notas(max_folios=1)
+    assert {t for t, _ in notas} == {"CONCILIACIÓN"}
+    assert len(notas) == 7  # cinco tipos en la línea 7, dos en la 28
+    msg = next(m for _, m in notas if "montos distintos" in m)
+    assert msg.startswith("Línea 7: 1 documento(s)") and msg.endswith("neto -$1.000, IVA -$190")
+    assert any(m.endswith("Folios: 4") for _, m in notas)
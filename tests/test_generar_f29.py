@@ -0,0 +1,127 @@
+"""Render del xlsx: los modos y motores dan el mismo libro que el render openpyxl normal."""
+
+import io
+
+import openpyxl
+import pytest
+from openpyxl.styles import Font
+
+from scripts.generar_f29 import _layout_compilado, _write_f29, _write_f29_compilado, generar_f29_bytes
+from scripts.indice_f29 import CODIGO_POR_CELDA, INDICE_CODIGOS, diferencias_layout
+from scripts.verificar_f29 import _celdas_hoja, evaluar_celdas, verificar_f29
+
+MODOS = [
+    {"layout_compilado": True},
+    {"detalle_streaming": True},
+    {"layout_compilado": True, "detalle_streaming": True},
+    {"motor": "xml"},
+]
+
+
+@pytest.fixture(scope="module")
+def datos(fabricar_datos):
+    datos = fabricar_datos(120, semilla=1)
+    datos["ppm"] = {"tasa": 0.25, "credito_sence": 2_000}
+    datos["remanente_art37_anterior"] = 300
+    return datos
+
+
+def _libro(contenido):
+    """Por hoja: título, celdas con valor y estilo, rangos combinados y anchos de columna."""
+    wb = openpyxl.load_workbook(io.BytesIO(contenido))
+    hojas = []
+    for ws in wb.worksheets:
+        celdas = {c.coordinate: (c.value, c.number_format, repr(c.font), repr(c.fill), repr(c.alignment),
+                                 repr(c.border))
+                  for fila in ws.iter_rows() for c in fila if c.value is not None or c.has_style}
+        anchos = {k: d.width for k, d in ws.column_dimensions.items()}
+        hojas.append((ws.title, celdas, sorted(map(str, ws.merged_cells.ranges)), anchos))
+    return hojas
+
+
+@pytest.fixture(scope="module")
+def base(datos):
+    codigos, contenido = generar_f29_bytes(datos)
+    return codigos, _libro(contenido)
+
+
+@pytest.mark.parametrize("opciones", MODOS)
+def test_modos_iguales_a_openpyxl(datos, base, opciones):
+    codigos, esperado = base
+    otros, contenido = generar_f29_bytes(datos, **opciones)
+    assert otros == codigos
+    obtenido = _libro(contenido)
+    assert [h[0] for h in obtenido] == [h[0] for h in esperado]
+    for (titulo, celdas, rangos, anchos), (_, celdas2, rangos2, anchos2) in zip(esperado, obtenido):
+        distintas = sorted(k for k in celdas.keys() | celdas2.keys() if celdas.get(k) != celdas2.get(k))
+        assert not distintas, f"{titulo}: {distintas[:5]}"
+        assert rangos2 == rangos, titulo
+        assert anchos2 == anchos, titulo
+
+
+@pytest.mark.parametrize("motor", ["openpyxl", "xml"])
+@pytest.mark.parametrize("ppm", [{"tasa": 0.25}, {"tasa": 0.25, "suspension": True}, {"tasa": 1.5}])
+def test_valores_guardados_igual_a_formulas(motor, ppm):
+    datos = {"encabezado": {"rut": "76.123.456-7", "periodo_anio": 2026, "periodo_mes": 1},
+             "ventas": {"facturas_afectas_neto": 100_200, "facturas_afectas_iva": 19_038},
+             "ppm": ppm, "remanente_art37_anterior": 300}
+    codigos, contenido = generar_f29_bytes(datos, motor=motor, cachear_formulas=True)
+    ws = openpyxl.load_workbook(io.BytesIO(contenido)).worksheets[0]
+    guardados = openpyxl.load_workbook(io.BytesIO(contenido), data_only=True).worksheets[0]
+    evaluados = evaluar_celdas(_celdas_hoja(ws))
+    distintas = [(ref, guardados[ref].value, v) for ref, v in evaluados.items()
+                 if ws[ref].data_type == "f" and guardados[ref].value != v]
+    assert not distintas
+    assert verificar_f29(io.BytesIO(contenido), codigos=codigos) == []
+
+
+@pytest.mark.parametrize("motor", ["openpyxl", "xml"])
+def test_totales_del_detalle_guardados(datos, motor):
+    _, contenido = generar_f29_bytes(datos, motor=motor, cachear_formulas=True)
+    ws = openpyxl.load_workbook(io.BytesIO(contenido)).worksheets[1]
+    guardados = openpyxl.load_workbook(io.BytesIO(contenido), data_only=True).worksheets[1]
+    formulas = [c.coordinate for fila in ws.iter_rows() for c in fila if c.data_type == "f"]
+    assert formulas
+    evaluados = evaluar_celdas(_celdas_hoja(ws), formulas)
+    assert {ref: guardados[ref].value for ref in formulas} == {ref: evaluados[ref] for ref in formulas}
+
+
+def test_layout_compilado_se_arma_una_vez():
+    assert _layout_compilado() is _layout_compilado()
+
+
+def test_layout_compilado_con_estilos_propios_renderiza_normal(datos):
+    # Un workbook con estilos ya registrados no puede reutilizar los índices del esqueleto
+    codigos = {89: 1_000, 48: 2_500}
+    wb, normal = openpyxl.Workbook(), openpyxl.Workbook()
+    wb.active["A1"].font = Font(name="Courier", size=20)
+    normal.active["A1"].font = Font(name="Courier", size=20)
+    assert _write_f29_compilado(wb, codigos, datos["encabezado"]) == _write_f29(normal, codigos, datos["encabezado"])
+    valores = [(c.coordinate, c.value, repr(c.font)) for fila in wb.active.iter_rows() for c in fila]
+    assert valores == [(c.coordinate, c.value, repr(c.font)) for fila in normal.active.iter_rows() for c in fila]
+
+
+@pytest.mark.parametrize("write_f29", [_write_f29, _write_f29_compilado])
+def test_indice_coincide_con_la_hoja(write_f29):
+    wb = openpyxl.Workbook()
+    cc = write_f29(wb, {}, {})
+    ws = wb.worksheets[0]
+    formulas = {c.coordinate for fila in ws.iter_rows() for c in fila if c.data_type == "f"}
+    impresos = {c.coordinate: c.value for fila in ws.iter_rows() for c in fila if isinstance(c.value, int)}
+    entradas = [code for code, *_ in _layout_compilado().entradas]
+    assert cc == {code: info.celda for code, info in INDICE_CODIGOS.items()}
+    assert diferencias_layout(cc, formulas, entradas, impresos=impresos) == []
+    assert diferencias_layout({**cc, 538: "A1"}) == ["código 538: índice N30, hoja A1"]
+
+
+def test_indice_inmutable():
+    assert CODIGO_POR_CELDA[INDICE_CODIGOS[538].celda] == 538
+    with pytest.raises(TypeError):
+        INDICE_CODIGOS[538] = None
+    with pytest.raises(AttributeError):
+        INDICE_CODIGOS[538].celda = "A1"
+
+
+def test_motor_desconocido(datos):
+    with pytest.raises(ValueError, match="motor desconocido"):
+        generar_f29_bytes(datos, motor="pandas")
@@ -0,0 +1,79 @@
+"""Historial SQLite: RUT normalizado, último período, cartera por código, rectificaciones e importación."""
+
+import pytest
+
+from scripts.calculo_f29 import calcular_f29
+from scripts.historial_f29 import HistorialF29, importar_archivos, normalizar_rut
+from scripts.lote_f29 import generar_f29_lote
+
+
+@pytest.mark.parametrize("rut, esperado", [
+    ("76.543.210-K", "76543210-K"), ("76543210k", "76543210-K"), ("0012.345.678-5", "12345678-5"),
+    (" 1-9 ", "1-9"),
+])
+def test_normalizar_rut(rut, esperado):
+    assert normalizar_rut(rut) == esperado
+
+
+@pytest.mark.parametrize("rut", [None, "", "-", "0-"])
+def test_rut_invalido(rut):
+    with pytest.raises(ValueError):
+        normalizar_rut(rut)
+
+
+def _datos(rut, anio, mes):
+    return {"encabezado": {"rut": rut, "periodo_anio": anio, "periodo_mes": mes}}
+
+
+def test_registrar_y_consultar():
+    with HistorialF29(":memory:") as hist:
+        hist.guardar("76.543.210-K", 2025, 11, {77: 10, 506: 1, 89: 5})
+        hist.guardar("76543210-k", 2025, 12, {77: 20, 89: 7})
+        hist.guardar("12.345.678-5", 2025, 12, {77: 30})
+        hist.guardar("76543210-K", 2026, 1, {77: 40})
+
+        assert hist.ultimo("76543210K") == ((2026, 1), {77: 40, 506: 0, 550: 0, 724: 0})
+        assert hist.ultimo("76543210-K", antes_de=(2026, 1)) == ((2025, 12), {77: 20, 506: 0, 550: 0, 724: 0})
+        assert hist.ultimo("76543210-K", antes_de=(2025, 11)) is None
+        assert hist.ultimo("99.999.999-9") is None
+        assert hist.codigos("76543210-K", 2025, 11) == {77: 10, 506: 1, 89: 5}
+        assert hist.por_periodo(77, 2025, 12) == {"76543210-K": 20, "12345678-5": 30}
+        assert hist.serie("76543210-K", 77, desde=(2025, 12)) == [((2025, 12), 20), ((2026, 1), 40)]
+        assert hist.periodos("76543210-K") == [(2025, 11), (2025, 12), (2026, 1)]
+
+
+def test_rectificacion_reemplaza_el_periodo():
+    with HistorialF29(":memory:") as hist:
+        hist.guardar("1-9", 2026, 3, {77: 10, 506: 5, 89: 1})
+        hist.guardar("1-9", 2026, 3, {77: 12})
+        assert hist.codigos("1-9", 2026, 3) == {77: 12}
+        assert hist.periodos("1-9") == [(2026, 3)]
+
+
+def test_registrar_calcula_desde_datos(fabricar_datos):
+    datos = fabricar_datos(40, semilla=5, rut="76.543.210-K", mes=4)
+    with HistorialF29(":memory:") as hist:
+        codigos = hist.registrar(datos)
+        assert codigos == calcular_f29(datos)
+        assert hist.codigos("76543210-K", 2026, 4) == {c: v for c, v in codigos.items()
+                                                       if isinstance(v, (int, float))}
+        with pytest.raises(ValueError):
+            hist.registrar(_datos(None, 2026, 4), {77: 1})
+
+
+def test_lote_guarda_en_historial_e_importa(tmp_path, fabricar_datos):
+    lote = [fabricar_datos(20, semilla=i, rut=f"7{i}.000.000-{i}") for i in range(3)]
+    lote.append({**fabricar_datos(5, semilla=9), "encabezado": {"periodo_anio": 2026, "periodo_mes": 1}})
+    with HistorialF29(str(tmp_path / "historial.db")) as hist:
+        resultados = list(generar_f29_lote(lote, tmp_path, workers=0, historial=hist))
+        assert all(r["error"] is None for r in resultados)
+        assert hist.por_periodo(91, 2026, 1) == {f"7{i}000000-{i}": resultados[i]["codigos"][91]
+                                                 for i in range(3)}
+
+    # Los mismos archivos, leídos desde el xlsx: el nombre trae RUT y período
+    with HistorialF29(":memory:") as otro:
+        archivos = [r["archivo"] for r in resultados]
+        importados, errores = importar_archivos(otro, archivos)
+        assert importados == 3 and [a for a, _ in errores] == [archivos[3]]
+        assert otro.por_periodo(91, 2026, 1) == {f"7{i}000000-{i}": resultados[i]["codigos"][91]
+                                                 for i in range(3)}
@@ -0,0 +1,73 @@
+"""Honorarios (líneas 61 y 64): tasa del año de cada boleta, 3% del préstamo solidario y notas por desviación."""
+
+import pytest
+
+from scripts.calculo_f29 import ColumnasDocumentos, calcular_f29, compactar_documentos
+from scripts.honorarios_f29 import calcular_honorarios, retenciones_boletas
+
+BOLETAS = [
+    {"numero": 1, "bruto": 100_000, "fecha": "2025-12-20", "retencion": 14_500},    # 14,5% (2025)
+    {"numero": 2, "bruto": 100_000, "fecha": "2026-01-05"},                          # sin retención declarada
+    {"numero": 3, "bruto": 100_000, "fecha": "05/01/2026", "retencion": 10_000,     # desviada
+     "prestamo_solidario": True},
+    {"numero": 4, "bruto": 200_000, "retencion": 0},                                 # sin fecha: año del período
+    {"numero": 5, "bruto": 10_000, "fecha": "2028-03-01", "retencion": 1_700},      # 17% desde 2028
+]
+RETENCION = 14_500 + 15_250 + 15_250 + 30_500 + 1_700
+
+
+def _datos(boletas, **extra):
+    return {"encabezado": {"periodo_anio": 2026, "periodo_mes": 1}, "documentos": {"linea_61": boletas}, **extra}
+
+
+def test_retenciones_por_anio_y_prestamo():
+    retencion, prestamo = retenciones_boletas([100_000, 100_000, 100_000, 999], [2024, 2027, 2030, 2026],
+                                              [False, True, False, True])
+    assert list(retencion) == [13_750, 16_000, 17_000, 152]
+    assert list(prestamo) == [0, 3_000, 0, 30]
+    assert list(retenciones_boletas([1_000], [2026])[1]) == [0]
+
+
+def test_boletas_dict():
+    nuevo = calcular_honorarios(_datos(BOLETAS))
+    boletas = nuevo["documentos"]["linea_61"]
+    assert [b["retencion"] for b in boletas] == [14_500, 15_250, 15_250, 30_500, 1_700]
+    assert boletas[2]["liquido"] == 100_000 - 15_250 - 3_000 and boletas[2]["retencion_prestamo"] == 3_000
+    assert "retencion_prestamo" not in boletas[0]
+    codigos = calcular_f29(nuevo)
+    assert (codigos[151], codigos[155]) == (RETENCION, 3_000)
+    assert nuevo["notas"] == [(
+        "HONORARIOS", "1 boleta(s) con retención distinta a la tasa de su año: 3 (15,25%). "
+                      "Se usa la calculada (código 151 = $77.200).")]
+
+
+@pytest.mark.parametrize("modelo", ["documento", "columnas"])
+def test_otros_modelos_igual_a_dict(modelo):
+    if modelo == "documento":
+        boletas = compactar_documentos({"linea_61": BOLETAS})["linea_61"]
+    else:
+        boletas = ColumnasDocumentos({
+            "numero": [b["numero"] for b in BOLETAS], "bruto": [b["bruto"] for b in BOLETAS],
+            "fecha": [b.get("fecha") for b in BOLETAS], "retencion": [b.get("retencion", 0) for b in BOLETAS],
+            "prestamo_solidario": [bool(b.get("prestamo_solidario")) for b in BOLETAS]})
+    esperado = calcular_honorarios(_datos(BOLETAS))
+    nuevo = calcular_honorarios(_datos(boletas))
+    assert nuevo["notas"] == esperado["notas"]
+    codigos, codigos_dict = calcular_f29(nuevo), calcular_f29(esperado)
+    assert (codigos[151], codigos[155]) == (codigos_dict[151], codigos_dict[155])
+    assert [b["liquido"] for b in nuevo["documentos"]["linea_61"]] == \
+        [b["liquido"] for b in esperado["documentos"]["linea_61"]]
+
+
+def test_tolerancia_y_max_folios():
+    boletas = [{"numero": i, "bruto": 100_000, "fecha": "2026-01-02", "retencion": 15_251} for i in range(1, 8)]
+    assert "notas" not in calcular_honorarios(_datos(boletas))
+    notas = calcular_honorarios(_datos(boletas), tolerancia=0, max_folios=2)["notas"]
+    assert "7 boleta(s)" in notas[0][1] and "1 (15,25%), 2 (15,25%)…" in notas[0][1]
+
+
+def test_modo_codigos_corrige_totales():
+    base = calcular_f29({"ventas": {"facturas_afectas_neto": 1_000_000, "facturas_afectas_iva": 190_000}})
+    c = calcular_honorarios(_datos(BOLETAS, codigos=dict(base)))["codigos"]
+    assert (c[151], c[155]) == (RETENCION, 3_000)
+    assert c[91] == base[91] + RETENCION + 3_000
@@ -0,0 +1,70 @@
+"""Recálculo incremental: tras cada documento agregado o quitado, los códigos son los de calcular_f29."""
+
+import copy
+
+import pytest
+
+from scripts.calculo_f29 import calcular_f29
+from scripts.incremental_f29 import CalculadoraF29Incremental
+
+
+def _sin_documentos(datos, lk, n):
+    """Copia de `datos` sin los últimos `n` documentos de `lk`; devuelve (copia, quitados)."""
+    nuevo = copy.deepcopy(datos)
+    docs = nuevo["documentos"][lk]
+    quitados, nuevo["documentos"][lk] = docs[-n:], docs[:-n]
+    return nuevo, quitados
+
+
+@pytest.mark.parametrize("ppm", [{"tasa": 0.25, "credito_sence": 5_000}, {"tasa": 1.5, "suspension": True},
+                                 {"tasa": 0.25, "credito_sence": 10_000_000, "remanente_sence_anterior": 700}])
+@pytest.mark.parametrize("lk", ["linea_7", "linea_10", "linea_13", "linea_28", "linea_32", "linea_61"])
+def test_incremental_igual_a_calcular_f29(fabricar_datos, lk, ppm):
+    datos = fabricar_datos(400, semilla=3)
+    datos["ppm"] = ppm
+    n = min(len(datos["documentos"][lk]), 10)
+    parcial, quitados = _sin_documentos(datos, lk, n)
+
+    calc = CalculadoraF29Incremental(parcial)
+    for doc in quitados:
+        calc.agregar_documento(lk, doc)
+    assert calc.codigos == calcular_f29(datos)
+
+    for doc in quitados:
+        calc.quitar_documento(lk, doc)
+    assert calc.codigos == calcular_f29(parcial)
+
+
+def test_cambios_informa_solo_lo_que_cambio(fabricar_datos):
+    calc = CalculadoraF29Incremental(fabricar_datos(100, semilla=1))
+    antes = dict(calc.codigos)
+    cambios = calc.agregar_documento("linea_7", {"neto": 100_000, "iva": 19_000})
+    assert cambios == {k: v for k, v in calc.codigos.items() if antes.get(k) != v}
+    assert cambios[502] == antes[502] + 19_000 and 91 in cambios
+
+
+def test_linea_nueva_y_vaciada(fabricar_datos):
+    datos = fabricar_datos(50, semilla=2)
+    calc = CalculadoraF29Incremental(datos)
+    doc = {"neto": 1_000, "exento": 1_000}
+    calc.agregar_documento("linea_27", doc)
+    assert (calc.codigos[584], calc.codigos[562]) == (1, 1_000)
+    calc.quitar_documento("linea_27", doc)
+    assert calc.codigos == calcular_f29(datos)
+    with pytest.raises(ValueError):
+        calc.quitar_documento("linea_27", doc)
+
+
+def test_incremental_con_prorrateo(fabricar_datos):
+    datos = fabricar_datos(200, semilla=5)
+    datos["prorrateo"] = {"sin_derecho": {"linea_28": 12_345}}
+    parcial, quitados = _sin_documentos(datos, "linea_28", 10)
+    calc = CalculadoraF29Incremental(parcial)
+    for doc in quitados:
+        calc.agregar_documento("linea_28", doc)
+    assert calc.codigos == calcular_f29(datos)
+
+
+def test_incremental_rechaza_modo_codigos():
+    with pytest.raises(ValueError):
+        CalculadoraF29Incremental({"codigos": {89: 1}})
@@ -0,0 +1,78 @@
+"""IUSC (línea 60): tramos de la tabla en pesos, liquidaciones en dict, Documento y columnas, y modo códigos."""
+
+import pytest
+
+from scripts.calculo_f29 import ColumnasDocumentos, calcular_f29, compactar_documentos
+from scripts.iusc_f29 import TablaIUSC, calcular_iusc, tabla_periodo
+
+UTM = 100  # tramos en pesos = UTM × 100: 1.350, 3.000, 5.000, ...
+
+
+@pytest.mark.parametrize("renta, esperado", [
+    (0, 0), (1_350, 0),            # hasta 13,5 UTM exento, el límite incluido
+    (1_351, 0),                    # 1.351 × 4% − 54 = 0,04
+    (2_000, 26), (3_000, 66),      # 3.000 queda en el tramo de abajo...
+    (3_001, 66),                   # ...y el de arriba parte en el mismo impuesto: la tabla es continua
+    (10_000, 1_260),               # 10.000 × 30,4% − 1.780
+    (40_000, 12_118),              # último tramo: 40.000 × 40% − 3.882
+])
+def test_tramos(renta, esperado):
+    tabla = TablaIUSC.desde_utm(UTM)
+    assert tabla.impuesto(renta) == esperado
+    assert tabla.impuestos([renta]) == [esperado]
+
+
+def test_tabla_invalida():
+    with pytest.raises(ValueError):
+        TablaIUSC.desde_utm(0)
+    with pytest.raises(ValueError):
+        TablaIUSC([0, 10, 5], [0, 0.1, 0.2], [0, 1, 2])
+
+
+def test_utm_del_periodo():
+    datos = {"encabezado": {"periodo_anio": 2026, "periodo_mes": 3}}
+    assert tabla_periodo(datos, utm={(2026, 3): UTM}).desde[1] == 1_350
+    assert tabla_periodo({**datos, "utm": 200}).desde[1] == 2_700
+    with pytest.raises(ValueError, match="03/2026"):
+        tabla_periodo(datos, utm={(2026, 2): UTM})
+
+
+LIQUIDACIONES = [
+    {"nombre": "Ana", "bruto": 10_000, "iusc": 1_260},
+    {"nombre": "Beto", "bruto": 12_000, "renta_tributable": 3_000, "iusc": 0},
+    {"nombre": "Caro", "bruto": 40_000, "iusc": 12_000},
+]
+
+
+def _datos(linea_60, **extra):
+    return {"encabezado": {"periodo_anio": 2026, "periodo_mes": 3}, "documentos": {"linea_60": linea_60}, **extra}
+
+
+@pytest.mark.parametrize("modelo", ["dict", "documento", "columnas"])
+def test_codigo_48_desde_liquidaciones(modelo):
+    docs = LIQUIDACIONES
+    if modelo == "documento":
+        # Documento no guarda renta_tributable: la renta es el bruto
+        docs = compactar_documentos({"linea_60": [d for d in LIQUIDACIONES if "renta_tributable" not in d]})["linea_60"]
+    elif modelo == "columnas":
+        docs = ColumnasDocumentos({"bruto": [10_000, 12_000, 40_000], "renta_tributable": [10_000, 3_000, 40_000],
+                                   "iusc": [1_260, 0, 12_000]})
+    nuevo = calcular_iusc(_datos(docs), utm=UTM)
+    esperado = 1_260 + 12_118 + (0 if modelo == "documento" else 66)
+    assert calcular_f29(nuevo)[48] == esperado
+    # Solo Caro traía un IUSC distinto (0 no cuenta como declarado)
+    assert [n[0] for n in nuevo.get("notas", [])] == ["IUSC"]
+    assert nuevo["notas"][0][1].startswith("1 liquidación(es)")
+
+
+def test_modo_codigos_corrige_totales():
+    base = calcular_f29({"ventas": {"facturas_afectas_neto": 1_000_000, "facturas_afectas_iva": 190_000}})
+    nuevo = calcular_iusc(_datos(LIQUIDACIONES[:1], codigos=dict(base)), utm=UTM)
+    c = nuevo["codigos"]
+    assert c[48] == 1_260
+    assert (c[595], c[547], c[91]) == (base[595] + 1_260, base[547] + 1_260, base[91] + 1_260)
+
+
+def test_sin_liquidaciones_no_cambia_nada():
+    datos = _datos([], notas=[("A", "b")])
+    assert calcular_iusc(datos, utm=UTM) == datos
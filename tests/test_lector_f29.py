@@ -0,0 +1,51 @@
+"""Lectura de códigos desde el xlsx generado: ida y vuelta con ambos motores, con y sin valores guardados."""
+
+import io
+import zipfile
+
+import openpyxl
+import pytest
+
+from scripts.generar_f29 import generar_f29_bytes
+from scripts.indice_f29 import INDICE_CODIGOS
+from scripts.lector_f29 import codigos_de_celdas, leer_codigos, leer_varios
+from scripts.verificar_f29 import _celdas_hoja
+
+
+@pytest.fixture(scope="module")
+def datos(fabricar_datos):
+    datos = fabricar_datos(80, semilla=4)
+    datos["ppm"] = {"tasa": 0.25, "credito_sence": 1_000}
+    return datos
+
+
+@pytest.mark.parametrize("motor", ["openpyxl", "xml"])
+@pytest.mark.parametrize("cachear_formulas", [False, True])
+def test_ida_y_vuelta(datos, motor, cachear_formulas):
+    codigos, contenido = generar_f29_bytes(datos, motor=motor, cachear_formulas=cachear_formulas)
+    leidos = leer_codigos(io.BytesIO(contenido))
+    assert {code: leidos[code] for code in INDICE_CODIGOS} == {code: codigos.get(code, 0) for code in INDICE_CODIGOS}
+
+
+def test_layout_distinto_se_recorre(datos):
+    codigos, contenido = generar_f29_bytes(datos)
+    ws = openpyxl.load_workbook(io.BytesIO(contenido)).worksheets[0]
+    ws.insert_rows(1, 3)  # las celdas del índice ya no calzan (openpyxl no ajusta las fórmulas)
+    leidos = codigos_de_celdas(_celdas_hoja(ws))
+    assert {c: leidos[c] for c in (503, 502, 519, 520, 563)} == {c: codigos[c] for c in (503, 502, 519, 520, 563)}
+
+
+def test_leer_varios_aisla_errores(tmp_path, datos):
+    codigos, contenido = generar_f29_bytes(datos)
+    bueno = tmp_path / "F29.xlsx"
+    bueno.write_bytes(contenido)
+    malo = tmp_path / "malo.xlsx"
+    malo.write_bytes(b"no es un zip")
+    vacio = tmp_path / "vacio.xlsx"
+    with zipfile.ZipFile(vacio, "w") as zf:
+        zf.writestr("otro.txt", "")
+    resultados = list(leer_varios([str(bueno), str(malo), str(vacio), str(bueno)], workers=2))
+    assert [r[0] for r in resultados] == [str(bueno), str(malo), str(vacio), str(bueno)]
+    assert resultados[0][1][91] == resultados[3][1][91] == codigos[91] and resultados[0][2] is None
+    assert resultados[1][1] is None and resultados[1][2].startswith("BadZipFile")
+    assert resultados[2][1] is None and resultados[2][2].startswith("KeyError")
@@ -0,0 +1,41 @@
+"""Lote: un xlsx por cliente, en serie o en paralelo, y los errores quedan en el resultado del cliente."""
+
+import os
+
+import pytest
+
+from scripts.calculo_f29 import calcular_f29
+from scripts.lote_f29 import generar_f29_lote, nombre_archivo_f29
+
+
+def test_nombre_archivo_por_rut_y_periodo():
+    datos = {"encabezado": {"rut": "76.543.210-K", "periodo_anio": 2026, "periodo_mes": 3}}
+    assert nombre_archivo_f29(datos, 7) == "F29-76543210K-202603.xlsx"
+    assert nombre_archivo_f29({"encabezado": {"periodo_mes": 3}}, 7) == "F29-7-202603.xlsx"
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_lote_genera_cada_cliente(tmp_path, fabricar_datos, workers):
+    lote = [fabricar_datos(30, semilla=i, rut=f"7{i}.000.000-{i}") for i in range(4)]
+    resultados = sorted(generar_f29_lote(lote, tmp_path, workers=workers), key=lambda r: r["indice"])
+    assert [r["indice"] for r in resultados] == [0, 1, 2, 3]
+    for datos, res in zip(lote, resultados):
+        assert res["error"] is None
+        assert res["rut"] == datos["encabezado"]["rut"]
+        assert os.path.getsize(res["archivo"]) > 0
+        assert res["codigos"] == calcular_f29(datos)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_error_de_un_cliente_no_detiene_el_lote(tmp_path, fabricar_datos, workers):
+    malo = {"encabezado": {"rut": "1-9", "periodo_mes": "marzo"}}
+    lote = [fabricar_datos(10, semilla=1), malo, fabricar_datos(10, semilla=2, rut="77.000.000-0")]
+    resultados = {r["indice"]: r for r in generar_f29_lote(lote, tmp_path, workers=workers)}
+    assert resultados[1]["error"] and resultados[1]["codigos"] is None
+    assert resultados[0]["error"] is None and resultados[2]["error"] is None
+
+
+def test_nombre_archivo_propio(tmp_path, fabricar_datos):
+    res, = generar_f29_lote([fabricar_datos(10)], tmp_path, workers=0,
+                            nombre_archivo=lambda datos, i: f"cliente-{i}.xlsx")
+    assert res["archivo"] == os.path.join(tmp_path, "cliente-0.xlsx") and os.path.exists(res["archivo"])
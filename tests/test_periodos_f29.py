@@ -0,0 +1,94 @@
+"""Serie de períodos: cada remanente pasa al mes siguiente, en modo cálculo y en modo códigos."""
+
+import pytest
+
+from scripts.calculo_f29 import calcular_f29
+from scripts.periodos_f29 import ARRASTRES, calcular_serie, generar_serie_f29
+from scripts.verificar_f29 import verificar_f29
+
+
+def _mes(mes, ventas_neto, anio=2026):
+    return {"encabezado": {"rut": "76.123.456-7", "periodo_anio": anio, "periodo_mes": mes},
+            "ventas": {"facturas_afectas_cant": 2, "facturas_afectas_neto": ventas_neto,
+                       "facturas_afectas_iva": round(ventas_neto * 0.19)},
+            "compras": {"facturas_giro_cant": 1, "facturas_giro_iva": 285_000},
+            "ppm": {"tasa": 1, "credito_sence": 50_000}}
+
+
+@pytest.fixture
+def meses():
+    # Meses sin ventas dejan remanente de CF; el SENCE sobra cuando el PPM es chico
+    serie = [_mes(m, 1_000_000 * (m % 3)) for m in range(1, 13)]
+    serie[0]["remanente_art37_anterior"] = 300
+    serie[0]["remanente_art42_anterior"] = 700
+    return serie
+
+
+def _assert_encadenada(resultado):
+    for (_, previo), (_, actual) in zip(resultado, resultado[1:]):
+        for origen, destino, _ in ARRASTRES:
+            assert actual[destino] == previo[origen], (origen, destino)
+
+
+def test_serie_arrastra_remanentes(meses):
+    resultado = calcular_serie(list(reversed(meses)))
+    assert [d["encabezado"]["periodo_mes"] for d, _ in resultado] == list(range(1, 13))
+    _assert_encadenada(resultado)
+    enero, febrero = resultado[0][1], resultado[1][1]
+    assert enero[77] == 285_000 - 190_000 and febrero[504] == enero[77]
+    assert febrero[540] == enero[550] == 300
+    assert febrero[508] == enero[506] == 700
+    assert any(c[504] for _, c in resultado) and any(c[722] for _, c in resultado)
+
+
+def test_serie_en_modo_codigos_igual_a_datos(meses):
+    en_datos = calcular_serie(meses)
+    en_codigos = calcular_serie([{"encabezado": m["encabezado"], "codigos": calcular_f29(m)} for m in meses])
+    _assert_encadenada(en_codigos)
+    for (_, esperado), (_, obtenido) in zip(en_datos, en_codigos):
+        for code in (504, 508, 540, 722, 537, 77, 89, 723, 724, 595, 547, 91, 94):
+            assert obtenido[code] == esperado[code], code
+
+
+def test_serie_reajusta_remanente_con_utm(meses):
+    utm = {(2026, m): 60_000 + 100 * m for m in range(1, 13)}
+    resultado = calcular_serie(meses[:2], utm=utm)
+    assert resultado[1][1][504] == round(resultado[0][1][77] * utm[(2026, 2)] / utm[(2026, 1)])
+
+
+def test_serie_continua_desde_mes_anterior(meses):
+    anterior = {77: 10_000, 506: 20, 550: 30, 724: 40}
+    enero = calcular_serie(meses[:1], anterior=anterior)[0][1]
+    assert (enero[504], enero[508], enero[540], enero[722]) == (10_000, 20, 30, 40)
+
+
+def test_serie_con_mes_faltante_o_repetido(meses):
+    with pytest.raises(ValueError, match="Falta el período 03/2026"):
+        calcular_serie(meses[:2] + meses[3:])
+    with pytest.raises(ValueError, match="repetido"):
+        calcular_serie(meses[:2] + meses[1:2])
+
+
+def test_serie_acepta_el_mismo_rut_con_otro_formato(meses):
+    meses[1]["encabezado"]["rut"] = "76123456-7"
+    meses[2]["encabezado"]["rut"] = "076.123.456-7"
+    assert len(calcular_serie(meses[:3])) == 3
+
+
+def test_serie_rechaza_meses_de_otro_contribuyente(meses):
+    otro = _mes(2, 500_000)
+    otro["encabezado"]["rut"] = "77.888.999-K"
+    with pytest.raises(ValueError, match="mezcla contribuyentes: 76123456-7 .01/2026., 77888999-K .02/2026."):
+        calcular_serie(meses[:3] + [otro])
+    sin_rut = _mes(4, 0)
+    del sin_rut["encabezado"]["rut"]
+    with pytest.raises(ValueError, match="sin RUT"):
+        calcular_serie(meses[:3] + [sin_rut])
+
+
+def test_generar_serie_escribe_cada_mes_encadenado(tmp_path, meses):
+    resultados = generar_serie_f29(meses[:3], tmp_path, workers=0)
+    esperados = [c for _, c in calcular_serie(meses[:3])]
+    assert [r["codigos"] for r in resultados] == esperados
+    for r in resultados:
+        assert r["error"] is None and verificar_f29(r["archivo"], codigos=r["codigos"]) == []
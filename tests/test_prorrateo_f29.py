@@ -0,0 +1,100 @@
+"""Prorrateo del CF de uso común: proporción acumulada, ajuste anual de diciembre, estado y modo códigos."""
+
+import json
+
+import pytest
+
+from scripts.calculo_f29 import calcular_f29
+from scripts.periodos_f29 import calcular_serie
+from scripts.prorrateo_f29 import ProrrateoAnual, prorratear_serie, ventas_periodo
+
+IVA_COMUN = 190_000
+
+
+def _mes(mes, afectas, exportacion, uso_comun=IVA_COMUN, anio=2026):
+    return {"encabezado": {"periodo_anio": anio, "periodo_mes": mes},
+            "documentos": {"linea_7": [{"neto": afectas, "iva": round(afectas * 0.19)}],
+                           "linea_1": [{"neto": exportacion, "exento": exportacion}] if exportacion else [],
+                           "linea_28": [{"neto": 1_000_000, "iva": uso_comun, "uso_comun": True},
+                                        {"neto": 500_000, "iva": 95_000}]}}
+
+
+def test_proporcion_del_mes():
+    datos = ProrrateoAnual(2026).aplicar(_mes(1, 15_000_000, 12_000_000))
+    pro = datos["prorrateo"]
+    assert pro["acumulado"] == (15_000_000, 0, 12_000_000) == ventas_periodo(datos)
+    assert pro["proporcion"] == pytest.approx(15 / 27)
+    assert pro["sin_derecho"] == {"linea_28": 84_444}  # 190.000 − 105.556
+    c = calcular_f29(datos)
+    assert c[520] == IVA_COMUN + 95_000 - 84_444 and c[521] == 0
+    assert c[537] == c[520]
+    assert datos["notas"] == [(
+        "PRORRATEO", "Proporción acumulada enero–01/2026: 55,56%. CF de uso común $190.000; "
+                     "no utilizable $84.444 (descontado del crédito en 520/525).")]
+
+
+def test_redondea_como_la_hoja():
+    # 5 × 50% = 2,5: redondear da 3 de crédito (round() de Python daría 2)
+    datos = ProrrateoAnual(2026).aplicar(_mes(1, 1_000, 1_000, uso_comun=5))
+    assert datos["prorrateo"]["sin_derecho"] == {"linea_28": 2}
+
+
+def test_serie_usa_la_proporcion_anual():
+    serie = [_mes(m, 10_000_000, 10_000_000 if m % 2 else 0) for m in range(1, 13)]
+    resultado = calcular_serie(prorratear_serie(serie))
+    usado = sum(IVA_COMUN - d["prorrateo"]["sin_derecho"]["linea_28"] for d, _ in resultado)
+    # Con el ajuste de diciembre el crédito del año es el IVA del año × proporción anual (120/180)
+    assert usado == round(12 * IVA_COMUN * 120 / 180)
+    diciembre = resultado[-1][0]
+    assert diciembre["prorrateo"]["proporcion"] == pytest.approx(120 / 180)
+    assert "con ajuste anual" in diciembre["notas"][-1][1]
+    assert all(c[520] == IVA_COMUN + 95_000 - d["prorrateo"]["sin_derecho"]["linea_28"] for d, c in resultado)
+
+
+def test_ajuste_de_diciembre_sin_uso_comun_en_el_mes():
+    prorrateo = ProrrateoAnual(2026)
+    prorrateo.aplicar(_mes(1, 10_000_000, 0))                       # enero: 100%
+    prorrateo.aplicar({**_mes(12, 0, 10_000_000), "uso_comun": {}})
+    # Diciembre lleva la proporción anual (50%) al crédito de enero ya usado
+    assert prorrateo.credito[12] == {"linea_28": (0, -IVA_COMUN // 2)}
+
+
+def test_rectificar_un_mes_reemplaza_sus_ventas():
+    prorrateo = ProrrateoAnual(2026)
+    prorrateo.registrar(1, 100, 50)
+    prorrateo.registrar(2, 100)
+    prorrateo.registrar(1, 300, 0)
+    assert prorrateo.acumulado() == (400, 0, 0) and prorrateo.acumulado(1) == (300, 0, 0)
+    assert prorrateo.proporcion() == 1.0
+    with pytest.raises(ValueError):
+        prorrateo.registrar(13, 1)
+
+
+def test_estado_serializable():
+    serie = [_mes(m, 10_000_000, 5_000_000 * (m % 3)) for m in range(1, 13)]
+    prorrateo = ProrrateoAnual(2026)
+    for datos in serie[:5]:
+        prorrateo.aplicar(datos)
+    copia = ProrrateoAnual.desde_dict(json.loads(json.dumps(prorrateo.a_dict())))
+    for datos in serie[5:]:
+        assert copia.aplicar(datos)["prorrateo"] == prorrateo.aplicar(datos)["prorrateo"]
+
+
+def test_modo_codigos():
+    base = {563: 27_000_000, 20: 12_000_000, 520: 300_000, 537: 300_000, 89: 0, 77: 300_000}
+    datos = {"encabezado": {"periodo_anio": 2026, "periodo_mes": 3}, "codigos": base,
+             "uso_comun": {"linea_28": IVA_COMUN}}
+    c = ProrrateoAnual(2026).aplicar(datos)["codigos"]
+    assert c[520] == 300_000 - 84_444 and c[537] == 300_000 - 84_444
+    assert c.get(521, 0) == 0
+
+
+def test_otro_anio():
+    with pytest.raises(ValueError, match="no es del año 2025"):
+        ProrrateoAnual(2025).aplicar(_mes(3, 1, 1))
+
+
+def test_sin_ventas_exentas_no_hay_prorrateo():
+    datos = ProrrateoAnual(2026).aplicar(_mes(1, 1_000_000, 0))
+    assert datos["prorrateo"]["proporcion"] == 1.0 and datos["prorrateo"]["sin_derecho"] == {"linea_28": 0}
+    assert "notas" not in datos
@@ -0,0 +1,97 @@
+"""Ingesta del RCV: clasificación por Tipo Doc, montos en formato chileno, filas omitidas y errores con ubicación."""
+
+import openpyxl
+import pytest
+
+from scripts.calculo_f29 import calcular_f29
+from scripts.rcv_f29 import IngestaRCV, _monto, ingerir_rcv, iterar_documentos
+
+ENCABEZADO_VENTAS = "Nro;Tipo Doc;Folio;Rut cliente;Razon Social;Fecha Docto;Monto Exento;Monto Neto;Monto IVA;Monto total"
+VENTAS = [
+    "1;33;101;11.111.111-1;Cliente Uno;01/03/2026;0;1.000.000;190.000;1.190.000",
+    "2;33;102;22.222.222-2;Cliente Dos;02/03/2026;0;500000;95000;595000",
+    "3;39;1;66.666.666-6;Boleta;03/03/2026;0;10.000;1.900;11.900",
+    "4;34;103;33.333.333-3;Exenta;04/03/2026;70.000;;;70.000",
+    "5;61;5;11.111.111-1;NC;05/03/2026;0;100.000;19.000;119.000",
+    "6;52;1;44.444.444-4;Guía;06/03/2026;0;1;1;1",
+    "Totales;;;;;;;;;",
+]
+COMPRAS = [
+    "Nro;Tipo Doc;Folio;Rut proveedor;Razon Social;Fecha Docto;Monto Exento;Monto Neto;Monto IVA Recuperable;Monto Total;IVA Retenido Total",
+    "1;33;900;55.555.555-5;Proveedor;01/03/2026;0;200.000;38.000;238.000;0",
+    "2;34;901;55.555.555-5;Proveedor;01/03/2026;50.000;0;0;50.000;0",
+    "3;46;7;12.345.678-5;Vendedor;02/03/2026;0;100.000;19.000;119.000;19.000",
+]
+
+
+def _csv(tmp_path, nombre, lineas):
+    path = tmp_path / nombre
+    path.write_text("\n".join(lineas) + "\n", encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("1.234.567", 1_234_567), ("1234567", 1_234_567), ("1.234.567,5", 1_234_567), ("1234.5", 1_234),
+    ("-1.000", -1_000), ("", 0), (None, 0), (1_500.0, 1_500),
+])
+def test_monto(valor, esperado):
+    assert _monto(valor) == esperado
+
+
+def test_clasifica_ventas_por_tipo(tmp_path):
+    omitidos = {}
+    docs = list(iterar_documentos(_csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS] + VENTAS), "ventas",
+                                  omitidos=omitidos))
+    assert [lk for lk, _ in docs] == ["linea_7", "linea_7", "linea_10", "linea_2", "linea_13"]
+    assert docs[0][1]["neto"] == 1_000_000 and docs[0][1]["tipo_doc"] == 33
+    assert docs[3][1]["neto"] == 70_000  # exenta: el monto va en neto
+    assert omitidos == {52: 1}
+
+
+def test_ingesta_alimenta_calcular_f29(tmp_path):
+    datos = ingerir_rcv(ventas=_csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS] + VENTAS),
+                        compras=_csv(tmp_path, "c.csv", COMPRAS))
+    assert datos["agregados"]["linea_7"] == {"cant": 2, "neto": 1_500_000, "iva": 285_000, "exento": 0,
+                                             "total": 1_785_000}
+    assert datos["cambio_sujeto"] == {"iva_retenido_total": 19_000}
+    codigos = calcular_f29(datos)
+    assert (codigos[503], codigos[502]) == (2, 285_000)
+    assert (codigos[584], codigos[562]) == (1, 50_000)
+    assert codigos[519] == 2 and codigos[39] == 19_000
+
+
+def test_spool_guarda_documentos(tmp_path):
+    datos = ingerir_rcv(ventas=_csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS] + VENTAS), spool_dir=str(tmp_path / "spool"))
+    linea_7 = datos["documentos"]["linea_7"]
+    assert len(linea_7) == 2
+    assert [d["numero"] for d in linea_7] == ["101", "102"]
+    assert [d["numero"] for d in linea_7] == ["101", "102"]  # re-iterable
+
+
+def test_xlsx_igual_a_csv(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Registro de Ventas"])  # título antes del encabezado
+    for linea in [ENCABEZADO_VENTAS] + VENTAS:
+        ws.append(linea.split(";"))
+    wb.save(tmp_path / "v.xlsx")
+    desde_csv = ingerir_rcv(ventas=_csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS] + VENTAS))
+    assert ingerir_rcv(ventas=str(tmp_path / "v.xlsx")) == desde_csv
+
+
+def test_monto_invalido_indica_archivo_fila_y_columna(tmp_path):
+    path = _csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS, VENTAS[0], "2;33;102;2-2;Dos;02/03/2026;0;$ 2.000;380;2.380"])
+    with pytest.raises(ValueError, match=r"v\.csv, fila 3, columna 'Monto Neto': monto inválido '\$ 2\.000'"):
+        list(iterar_documentos(path, "ventas"))
+
+
+def test_filas_incompletas_se_cuentan(tmp_path):
+    ingesta = IngestaRCV()
+    ingesta.leer(_csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS, VENTAS[0], "2;33;102;2-2;Dos", VENTAS[5]]), "ventas")
+    assert ingesta.agregados["linea_7"]["cant"] == 1
+    assert ingesta.omitidos == {"incompletas": 1, 52: 1}
+
+
+def test_registro_desconocido(tmp_path):
+    with pytest.raises(ValueError, match="registro"):
+        list(iterar_documentos(_csv(tmp_path, "v.csv", [ENCABEZADO_VENTAS]), "boletas"))
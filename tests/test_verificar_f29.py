@@ -0,0 +1,70 @@
+"""Evaluador de fórmulas: el subconjunto de Excel que emite generar_f29 y la verificación contra calcular_f29."""
+
+import io
+
+import openpyxl
+import pytest
+
+from scripts.generar_f29 import generar_f29_bytes
+from scripts.indice_f29 import CELDAS_CODIGOS
+from scripts.verificar_f29 import FormulaNoSoportada, evaluar_celdas, verificar_f29
+
+
+@pytest.mark.parametrize("formula, esperado", [
+    ("=A1+B1*2", 120),
+    ("=(A1+B1)*2", 220),
+    ("=-A1+B1", -90),
+    ("=A1/4", 25),
+    ("=IF(A1>B1,A1-B1,0)", 90),
+    ("=IF(A1<B1,1)", False),
+    ("=IF(C1<0,ABS(C1),0)", 7),
+    ("=SUM(A1:C1)", 103),
+    ("=SUM(A1,B1,5)", 115),
+    ("=ROUND(A1*0.025,0)", 3),
+    ("=ROUND(2.5)", 3),
+    ("=ROUND(-2.5,0)", -3),
+    ("=A1<>B1", True),
+    ("=$A$1+D1", 100),
+])
+def test_evaluar_formulas(formula, esperado):
+    celdas = {"A1": 100, "B1": 10, "C1": -7, "D1": "texto", "E1": formula}
+    assert evaluar_celdas(celdas)["E1"] == esperado
+
+
+def test_formulas_encadenadas_y_refs():
+    celdas = {"A1": 5, "A2": "=A1*2", "A3": "=A2+A1", "B9": "=1/0"}
+    assert evaluar_celdas(celdas, refs=["A3"]) == {"A1": 5, "A2": 10, "A3": 15}
+
+
+@pytest.mark.parametrize("formula", ["=VLOOKUP(A1,B1:C2,2)", "=A1&B1", "=IF(A1:B1>0,1,0)"])
+def test_formula_fuera_del_subconjunto(formula):
+    with pytest.raises(FormulaNoSoportada):
+        evaluar_celdas({"A1": 1, "B1": 2, "C1": formula})
+
+
+def test_referencia_circular():
+    with pytest.raises(FormulaNoSoportada, match="circular"):
+        evaluar_celdas({"A1": "=B1+1", "B1": "=A1"})
+
+
+def test_xlsx_generado_cuadra(fabricar_datos):
+    datos = fabricar_datos(150, semilla=8)
+    codigos, contenido = generar_f29_bytes(datos)
+    assert verificar_f29(io.BytesIO(contenido), codigos=codigos) == []
+    assert verificar_f29(io.BytesIO(contenido), datos=datos) == []
+
+
+def test_detecta_celda_alterada(fabricar_datos):
+    codigos, contenido = generar_f29_bytes(fabricar_datos(50, semilla=9))
+    wb = openpyxl.load_workbook(io.BytesIO(contenido))
+    wb.worksheets[0][CELDAS_CODIGOS[502]] = codigos[502] + 1_000
+    difs = verificar_f29(wb, codigos=codigos)
+    # 502 y todo lo que depende de él en la hoja: 538, 89, 595, 547, 91, 94
+    assert {d["codigo"] for d in difs} >= {502, 538, 89, 595, 547, 91, 94}
+    total = next(d for d in difs if d["codigo"] == 538)
+    assert total["formula"].startswith("=") and total["hoja"] - total["calculado"] == 1_000
+
+
+def test_verificar_sin_codigos_ni_datos():
+    with pytest.raises(ValueError):
+        verificar_f29(openpyxl.Workbook())